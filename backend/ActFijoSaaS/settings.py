@@ -207,4 +207,85 @@ FIREBASE_ADMIN_CREDENTIALS_PATH = os.path.join(BASE_DIR, 'firebase_service_accou
 # not directly by the Firebase Admin SDK for sending messages.
 # For sending messages, the Admin SDK primarily uses the service account key.
 FCM_API_KEY = os.getenv('FCM_API_KEY')
-FCM_SENDER_ID = os.getenv('FCM_SENDER_ID')
\ No newline at end of file
+FCM_SENDER_ID = os.getenv('FCM_SENDER_ID')
+
+# --- CONFIGURACIÓN DE CACHÉ ---
+# En producción (varios workers de gunicorn) la caché debe ser compartida: definir REDIS_URL.
+# Sin REDIS_URL se usa la caché en memoria local (válida solo para desarrollo).
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Segundos que vive en caché el conjunto de permisos de un usuario
+# (se invalida antes si cambian sus roles o los permisos de sus roles)
+PERMISSIONS_CACHE_TIMEOUT = int(os.getenv('PERMISSIONS_CACHE_TIMEOUT', 300))
+
+# Contador de notificaciones no leídas por usuario (api.notification_counters): segundos
+# de vida de cada entrada; al expirar se vuelve a contar en la tabla.
+UNREAD_COUNT_CACHE_TIMEOUT = int(os.getenv('UNREAD_COUNT_CACHE_TIMEOUT', 3600))
+
+# Caché de resultados de reportes (api.report_cache): segundos de vida de cada entrada
+# y máximo de ids por consulta (por encima se repite la búsqueda). Cualquier cambio en
+# los activos o catálogos de la empresa la invalida antes.
+REPORT_CACHE_TIMEOUT = int(os.getenv('REPORT_CACHE_TIMEOUT', 600))
+REPORT_CACHE_MAX_IDS = int(os.getenv('REPORT_CACHE_MAX_IDS', 2000))
+
+# --- CONFIGURACIÓN DE LOGGING ---
+# Nivel de los loggers de la app ('api.*'). En producción dejar INFO/WARNING:
+# los log_debug de rutas calientes (api.log_utils) no cuestan nada si el nivel no está habilitado.
+API_LOG_LEVEL = os.getenv('API_LOG_LEVEL', 'INFO')
+# Fracción (0.0 a 1.0) de eventos DEBUG/INFO de rutas calientes que se registran
+HOT_PATH_LOG_SAMPLE_RATE = float(os.getenv('HOT_PATH_LOG_SAMPLE_RATE', '1.0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': API_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# --- EXPORTACIONES DE REPORTES EN SEGUNDO PLANO ---
+# Worker: `python manage.py process_export_jobs`. Un job PROCESANDO durante más de
+# estos minutos se considera abandonado (worker caído) y se vuelve a tomar.
+EXPORT_JOB_STALE_MINUTES = int(os.getenv('EXPORT_JOB_STALE_MINUTES', 60))
+
+# --- ENVÍO DE NOTIFICACIONES PUSH ---
+# Dispatcher: `python manage.py dispatch_outbox`. El transporte es intercambiable:
+# 'api.fcm_utils.FakeTransport' registra los mensajes sin enviarlos (desarrollo/tests).
+PUSH_TRANSPORT = os.getenv('PUSH_TRANSPORT', 'api.fcm_utils.FirebaseTransport')
+# Reintentos: backoff exponencial con jitter (segundos) y dead-letter tras PUSH_MAX_ATTEMPTS.
+# El dispatcher envía como máximo PUSH_DISPATCH_RATE mensajes por segundo.
+PUSH_RETRY_BASE_SECONDS = int(os.getenv('PUSH_RETRY_BASE_SECONDS', 30))
+PUSH_RETRY_MAX_SECONDS = int(os.getenv('PUSH_RETRY_MAX_SECONDS', 3600))
+PUSH_MAX_ATTEMPTS = int(os.getenv('PUSH_MAX_ATTEMPTS', 8))
+PUSH_DISPATCH_RATE = float(os.getenv('PUSH_DISPATCH_RATE', 50))
+# 'api.fcm_utils.HttpStubTransport' envía a un stub local (manage.py run_push_stub)
+PUSH_STUB_URL = os.getenv('PUSH_STUB_URL', 'http://127.0.0.1:8765/send')
@@ -0,0 +1,128 @@
+# api/dashboard_utils.py
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Sum
+from .models import (
+    ActivoFijo, CategoriaActivo, DashboardSnapshot, Empleado, Estado, Mantenimiento, SolicitudCompra
+)
+
+# Estados que cuentan en las tarjetas del Dashboard
+SOLICITUD_PENDIENTE = 'PENDIENTE'
+MANTENIMIENTO_EN_PROCESO = 'EN_PROGRESO'
+
+# Campo JSON del snapshot -> (FK del activo, modelo del catálogo)
+GRUPOS_ACTIVOS = {
+    'activos_por_estado': ('estado_id', Estado),
+    'activos_por_categoria': ('categoria_id', CategoriaActivo),
+}
+
+def _agrupar(activos_qs, fk):
+    campo = fk[:-len('_id')]
+    filas = activos_qs.order_by().values(fk, f'{campo}__nombre').annotate(count=Count('id'))
+    return {
+        str(fila[fk]): {'nombre': fila[f'{campo}__nombre'], 'count': fila['count']}
+        for fila in filas
+    }
+
+def _calcular(empresa_id):
+    activos_qs = ActivoFijo.objects.filter(empresa_id=empresa_id)
+    totales = activos_qs.aggregate(total=Count('id'), valor=Sum('valor_actual'))
+    datos = {
+        'total_activos': totales['total'],
+        'valor_total_activos': totales['valor'] or Decimal('0'),
+        'total_usuarios': Empleado.objects.filter(empresa_id=empresa_id).count(),
+        'solicitudes_pendientes': SolicitudCompra.objects.filter(
+            empresa_id=empresa_id, estado=SOLICITUD_PENDIENTE).count(),
+        'mantenimientos_en_proceso': Mantenimiento.objects.filter(
+            empresa_id=empresa_id, estado=MANTENIMIENTO_EN_PROCESO).count(),
+    }
+    for campo_json, (fk, _) in GRUPOS_ACTIVOS.items():
+        datos[campo_json] = _agrupar(activos_qs, fk)
+    return datos
+
+def reconstruir_snapshot(empresa_id):
+    """
+    Recalcula desde cero el snapshot de la empresa (las 7 consultas del Dashboard).
+    Bloquea la fila mientras tanto para que ningún delta concurrente se pierda.
+    """
+    with transaction.atomic():
+        snapshot = DashboardSnapshot.objects.select_for_update().filter(empresa_id=empresa_id).first()
+        if snapshot is None:
+            snapshot = DashboardSnapshot(empresa_id=empresa_id)
+        for campo, valor in _calcular(empresa_id).items():
+            setattr(snapshot, campo, valor)
+        snapshot.save()
+    return snapshot
+
+def obtener_snapshot(empresa_id):
+    """Lectura por clave primaria; el snapshot se construye la primera vez que se pide."""
+    snapshot = DashboardSnapshot.objects.filter(empresa_id=empresa_id).first()
+    if snapshot is None:
+        snapshot = reconstruir_snapshot(empresa_id)
+    return snapshot
+
+def _ajustar_grupo(grupo, modelo, catalogo_id, delta):
+    if catalogo_id is None or not delta:
+        return
+    clave = str(catalogo_id)
+    entrada = grupo.get(clave)
+    if entrada is None:
+        # Primer activo de este estado/categoría: buscar el nombre una sola vez
+        nombre = modelo.objects.filter(pk=catalogo_id).values_list('nombre', flat=True).first()
+        entrada = grupo[clave] = {'nombre': nombre, 'count': 0}
+    entrada['count'] += delta
+    if entrada['count'] <= 0:
+        del grupo[clave]
+
+def aplicar_delta(empresa_id, contadores=None, grupos=None):
+    """
+    Aplica cambios incrementales al snapshot de la empresa.
+
+    - `contadores`: {'total_activos': 1, 'valor_total_activos': Decimal('-10.00'), ...}
+    - `grupos`: {'activos_por_estado': [(estado_id, delta), ...], ...}
+
+    Si la empresa aún no tiene snapshot no hace nada: se construirá completo en la
+    primera lectura (así tampoco se recrea durante el borrado en cascada de una empresa).
+    """
+    with transaction.atomic():
+        snapshot = DashboardSnapshot.objects.select_for_update().filter(empresa_id=empresa_id).first()
+        if snapshot is None:
+            return
+        for campo, delta in (contadores or {}).items():
+            setattr(snapshot, campo, max(getattr(snapshot, campo) + delta, 0))
+        for campo_json, cambios in (grupos or {}).items():
+            modelo = GRUPOS_ACTIVOS[campo_json][1]
+            grupo = getattr(snapshot, campo_json)
+            for catalogo_id, delta in cambios:
+                _ajustar_grupo(grupo, modelo, catalogo_id, delta)
+        snapshot.save()
+
+def renombrar_en_snapshot(empresa_id, campo_json, catalogo_id, nombre):
+    """Propaga el renombrado de un Estado/Categoría al snapshot (si aparece en él)."""
+    with transaction.atomic():
+        snapshot = DashboardSnapshot.objects.select_for_update().filter(empresa_id=empresa_id).first()
+        if snapshot is None:
+            return
+        entrada = getattr(snapshot, campo_json).get(str(catalogo_id))
+        if entrada is None or entrada['nombre'] == nombre:
+            return
+        entrada['nombre'] = nombre
+        snapshot.save(update_fields=[campo_json, 'actualizado'])
+
+def _a_lista(grupo, clave_nombre):
+    # Mismo formato que el antiguo values('<campo>__nombre').annotate(count=...)
+    por_nombre = {}
+    for entrada in grupo.values():
+        por_nombre[entrada['nombre']] = por_nombre.get(entrada['nombre'], 0) + entrada['count']
+    return [{clave_nombre: nombre, 'count': count} for nombre, count in por_nombre.items()]
+
+def snapshot_a_respuesta(snapshot):
+    return {
+        'total_activos': snapshot.total_activos,
+        'total_usuarios': snapshot.total_usuarios,
+        'valor_total_activos': snapshot.valor_total_activos,
+        'activos_por_estado': _a_lista(snapshot.activos_por_estado, 'estado__nombre'),
+        'activos_por_categoria': _a_lista(snapshot.activos_por_categoria, 'categoria__nombre'),
+        'solicitudes_pendientes': snapshot.solicitudes_pendientes,
+        'mantenimientos_en_proceso': snapshot.mantenimientos_en_proceso,
+    }
@@ -0,0 +1,294 @@
+# api/depreciation_utils.py
+import calendar
+import datetime
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import ActivoFijo, DepreciacionActivo, DisposicionActivo
+from . import dashboard_utils, report_cache
+from .report_utils import iter_excel_report
+
+logger = logging.getLogger(__name__)
+
+# Métodos que se pueden calcular para toda la cartera sin datos por activo
+# (UNITS_OF_PRODUCTION necesita las unidades de cada activo y MANUAL un monto).
+BATCH_DEPRECIATION_TYPES = ('STRAIGHT_LINE', 'DECLINING_BALANCE')
+
+# Activos por transacción: los bloqueos y el UPDATE masivo se mantienen cortos
+DEPRECIATION_CHUNK_SIZE = 1000
+
+CENT = Decimal('0.01')
+
+def periodo_actual():
+    return timezone.localdate().strftime('%Y-%m')
+
+def rango_periodo(periodo):
+    """'2025-03' -> (date(2025, 3, 1), date(2025, 3, 31)). ValueError si no es AAAA-MM."""
+    try:
+        year, month = (int(parte) for parte in periodo.split('-'))
+        ultimo_dia = calendar.monthrange(year, month)[1]
+    except (AttributeError, ValueError, calendar.IllegalMonthError):
+        raise ValueError(f"Período inválido: '{periodo}'. Use el formato AAAA-MM.")
+    if len(periodo) != 7:
+        raise ValueError(f"Período inválido: '{periodo}'. Use el formato AAAA-MM.")
+    return datetime.date(year, month, 1), datetime.date(year, month, ultimo_dia)
+
+def cierre_periodo(periodo):
+    """Último instante del período ('AAAA-MM') en hora local: su `fecha_efectiva`."""
+    return timezone.make_aware(datetime.datetime.combine(rango_periodo(periodo)[1], datetime.time.max))
+
+def _meses_transcurridos(fecha_adquisicion, inicio_periodo):
+    # Meses completos de uso antes del período (el mes de compra cuenta como primer mes)
+    return (inicio_periodo.year - fecha_adquisicion.year) * 12 + inicio_periodo.month - fecha_adquisicion.month
+
+def calcular_montos(valores, vidas_utiles, fechas_adquisicion, depreciation_type, inicio_periodo, tasa=None):
+    """
+    Monto mensual a depreciar para cada activo de un lote, por columnas (listas
+    paralelas) y en Decimal, redondeado a centavos y sin pasar del valor actual.
+
+    - STRAIGHT_LINE: el valor actual se reparte en los meses de vida útil que le
+      quedan (al llegar al último mes se deprecia todo lo que queda).
+    - DECLINING_BALANCE: `tasa` anual (0-1] sobre el valor actual, prorrateada al mes.
+    """
+    if depreciation_type == 'STRAIGHT_LINE':
+        meses_restantes = [
+            max(vida * 12 - _meses_transcurridos(fecha, inicio_periodo), 1)
+            for vida, fecha in zip(vidas_utiles, fechas_adquisicion)
+        ]
+        montos = [valor / meses for valor, meses in zip(valores, meses_restantes)]
+    elif depreciation_type == 'DECLINING_BALANCE':
+        tasa_mensual = Decimal(tasa) / 12
+        montos = [valor * tasa_mensual for valor in valores]
+    else:
+        raise ValueError(f"El método {depreciation_type} no se puede ejecutar por lote.")
+    return [
+        min(monto.quantize(CENT, rounding=ROUND_HALF_UP), valor)
+        for monto, valor in zip(montos, valores)
+    ]
+
+def activos_depreciables(empresa_id, fin_periodo, categoria_id=None, departamento_id=None):
+    """Activos de la empresa con valor y vida útil, comprados hasta el período y no dados de baja."""
+    qs = ActivoFijo.objects.filter(
+        empresa_id=empresa_id, valor_actual__gt=0, vida_util__gt=0, fecha_adquisicion__lte=fin_periodo,
+    ).exclude(Exists(DisposicionActivo.objects.filter(activo_id=OuterRef('pk'))))
+    if categoria_id:
+        qs = qs.filter(categoria_id=categoria_id)
+    if departamento_id:
+        qs = qs.filter(departamento_id=departamento_id)
+    return qs
+
+def _procesar_lote(empresa_id, ids, periodo, inicio_periodo, depreciation_type, tasa, usuario, notas):
+    with transaction.atomic():
+        # Bloquear el lote: otra corrida del mismo período espera aquí y luego
+        # encuentra el historial ya creado, así que no deprecia dos veces.
+        activos = list(
+            ActivoFijo.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+            .only('id', 'empresa_id', 'valor_actual', 'vida_util', 'fecha_adquisicion')
+        )
+        ya_depreciados = set(
+            DepreciacionActivo.objects.filter(activo_id__in=ids, periodo=periodo).values_list('activo_id', flat=True)
+        )
+        pendientes = [activo for activo in activos if activo.pk not in ya_depreciados]
+        montos = calcular_montos(
+            [activo.valor_actual for activo in pendientes],
+            [activo.vida_util for activo in pendientes],
+            [activo.fecha_adquisicion for activo in pendientes],
+            depreciation_type, inicio_periodo, tasa,
+        )
+
+        # Rige desde el cierre del período, aunque la corrida se registre después
+        fecha_efectiva = cierre_periodo(periodo)
+        historial, actualizados = [], []
+        for activo, monto in zip(pendientes, montos):
+            if monto <= 0:
+                continue
+            valor_anterior = activo.valor_actual
+            activo.valor_actual = valor_anterior - monto
+            actualizados.append(activo)
+            historial.append(DepreciacionActivo(
+                empresa_id=empresa_id, activo_id=activo.pk, periodo=periodo, fecha_efectiva=fecha_efectiva,
+                valor_anterior=valor_anterior, valor_nuevo=activo.valor_actual, monto_depreciado=monto,
+                depreciation_type=depreciation_type, notas=notas, realizado_por=usuario,
+            ))
+
+        DepreciacionActivo.objects.bulk_create(historial)
+        ActivoFijo.objects.bulk_update(actualizados, ['valor_actual'])
+        total = sum((registro.monto_depreciado for registro in historial), Decimal('0'))
+        if total:
+            # bulk_update no dispara post_save: ajustar el Dashboard aquí
+            dashboard_utils.aplicar_delta(empresa_id, contadores={'valor_total_activos': -total})
+    return len(historial), len(ya_depreciados), total
+
+def ejecutar_depreciacion_lote(empresa_id, periodo, depreciation_type, tasa=None, categoria_id=None,
+                               departamento_id=None, usuario=None, notas=None, chunk_size=DEPRECIATION_CHUNK_SIZE):
+    """
+    Deprecia el período `periodo` ('AAAA-MM') para los activos de la empresa
+    (todos, o los de una categoría/departamento). Recorre la cartera por lotes de
+    `chunk_size` en orden de pk, cada uno en su propia transacción, con bulk_create
+    del historial y bulk_update de `valor_actual`.
+
+    Idempotente por período: los activos que ya tienen depreciación de ese período
+    se omiten (y la restricción única activo+periodo lo garantiza en la BD).
+    """
+    if depreciation_type not in BATCH_DEPRECIATION_TYPES:
+        raise ValueError(f"El método {depreciation_type} no se puede ejecutar por lote.")
+    if depreciation_type == 'DECLINING_BALANCE' and not (tasa is not None and Decimal(0) < Decimal(tasa) <= Decimal(1)):
+        raise ValueError("La tasa de depreciación debe estar entre 0 y 1 (ej: 0.2 para 20%).")
+    inicio_periodo, fin_periodo = rango_periodo(periodo)
+
+    activos_qs = activos_depreciables(empresa_id, fin_periodo, categoria_id, departamento_id).order_by('pk')
+    resumen = {
+        'periodo': periodo, 'depreciation_type': depreciation_type,
+        'depreciados': 0, 'omitidos_ya_depreciados': 0, 'monto_total': Decimal('0'),
+    }
+    ultimo_pk = None
+    while True:
+        lote_qs = activos_qs if ultimo_pk is None else activos_qs.filter(pk__gt=ultimo_pk)
+        ids = list(lote_qs.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        ultimo_pk = ids[-1]
+        depreciados, omitidos, total = _procesar_lote(
+            empresa_id, ids, periodo, inicio_periodo, depreciation_type, tasa, usuario, notas
+        )
+        resumen['depreciados'] += depreciados
+        resumen['omitidos_ya_depreciados'] += omitidos
+        resumen['monto_total'] += total
+
+    if resumen['depreciados']:
+        report_cache.bump_version(empresa_id)
+    logger.info(
+        f"Depreciación por lote {periodo} ({depreciation_type}) empresa {empresa_id}: "
+        f"{resumen['depreciados']} activos, {resumen['monto_total']} total, "
+        f"{resumen['omitidos_ya_depreciados']} ya depreciados."
+    )
+    return resumen
+
+
+# --- Proyección de cronogramas de depreciación ---
+
+PROYECCION_COLUMNS = [
+    ('codigo_interno', 'Código'),
+    ('nombre', 'Activo'),
+    ('anio', 'Año'),
+    ('valor_inicial', 'Valor inicial'),
+    ('depreciacion', 'Depreciación'),
+    ('valor_final', 'Valor final'),
+]
+PROYECCION_CHUNK_SIZE = 2000  # Activos proyectados por pasada
+
+def validar_parametros_proyeccion(depreciation_type, tasa=None, unidades_por_anio=None,
+                                  total_unidades_estimadas=None, monto_anual=None):
+    """Lanza ValueError si faltan los datos que el método necesita."""
+    if depreciation_type not in dict(DepreciacionActivo.DEPRECIATION_TYPE_CHOICES):
+        raise ValueError('Tipo de depreciación inválido.')
+    if depreciation_type == 'DECLINING_BALANCE' and not (tasa is not None and Decimal(0) < tasa <= Decimal(1)):
+        raise ValueError("La tasa de depreciación debe estar entre 0 y 1 (ej: 0.2 para 20%).")
+    if depreciation_type == 'UNITS_OF_PRODUCTION' and not (
+        unidades_por_anio and total_unidades_estimadas and unidades_por_anio > 0 and total_unidades_estimadas > 0
+    ):
+        raise ValueError('Para UNIDADES DE PRODUCCIÓN se requieren unidades_por_anio y total_unidades_estimadas positivos.')
+    if depreciation_type == 'MANUAL' and not (monto_anual and monto_anual > 0):
+        raise ValueError('Para la proyección MANUAL se requiere un monto_anual positivo.')
+
+def proyectar_cronogramas(valores, vidas_utiles, fechas_adquisicion, depreciation_type, inicio, tasa=None,
+                          unidades_por_anio=None, total_unidades_estimadas=None, monto_anual=None):
+    """
+    Cronograma año por año (año calendario) de cada activo, desde el mes `inicio`
+    hasta el final de su vida útil: lista de [(año, valor_inicial, depreciación, valor_final), ...]
+    por activo.
+
+    Se calcula por columnas: cada pasada avanza un año para todos los activos a la vez
+    sobre listas paralelas de Decimal (valor en libros y meses de vida restantes).
+    El primer año se prorratea por los meses que quedan desde `inicio` y en el último
+    mes de vida se deprecia todo el saldo, igual que la corrida por lote.
+
+    - STRAIGHT_LINE: valor actual / meses restantes, por mes.
+    - DECLINING_BALANCE: `tasa` anual sobre el valor en libros al inicio de cada año.
+    - UNITS_OF_PRODUCTION: fracción `unidades_por_anio / total_unidades_estimadas` del valor actual por año.
+    - MANUAL: `monto_anual` fijo.
+    """
+    libros = list(valores)
+    # Mismo criterio que calcular_montos: vida cumplida con saldo -> se deprecia en el primer mes
+    meses_restantes = [
+        max(vida * 12 - _meses_transcurridos(fecha, inicio), 1) if valor > 0 and vida > 0 else 0
+        for valor, vida, fecha in zip(valores, vidas_utiles, fechas_adquisicion)
+    ]
+    if depreciation_type == 'STRAIGHT_LINE':
+        tasas_mensuales = [valor / meses if meses else Decimal(0) for valor, meses in zip(valores, meses_restantes)]
+    elif depreciation_type == 'UNITS_OF_PRODUCTION':
+        fraccion_anual = Decimal(unidades_por_anio) / Decimal(total_unidades_estimadas)
+        tasas_mensuales = [valor * fraccion_anual / 12 for valor in valores]
+    elif depreciation_type == 'MANUAL':
+        tasas_mensuales = [Decimal(monto_anual) / 12] * len(valores)
+
+    cronogramas = [[] for _ in valores]
+    anio, meses_del_anio = inicio.year, 13 - inicio.month
+    while any(meses_restantes):
+        meses = [min(restantes, meses_del_anio) for restantes in meses_restantes]
+        if depreciation_type == 'DECLINING_BALANCE':
+            montos = [libro * Decimal(tasa) * mes / 12 for libro, mes in zip(libros, meses)]
+        else:
+            montos = [tasa_mensual * mes for tasa_mensual, mes in zip(tasas_mensuales, meses)]
+        # Último año de vida: se deprecia el saldo completo
+        montos = [
+            libro if mes and mes == restantes else min(monto.quantize(CENT, rounding=ROUND_HALF_UP), libro)
+            for monto, libro, mes, restantes in zip(montos, libros, meses, meses_restantes)
+        ]
+        for i, mes in enumerate(meses):
+            if mes:
+                cronogramas[i].append((anio, libros[i], montos[i], libros[i] - montos[i]))
+        libros = [libro - monto for libro, monto in zip(libros, montos)]
+        meses_restantes = [
+            0 if libro <= 0 else restantes - mes
+            for libro, restantes, mes in zip(libros, meses_restantes, meses)
+        ]
+        anio, meses_del_anio = anio + 1, 12
+    return cronogramas
+
+def iter_proyeccion(queryset, depreciation_type, inicio, chunk_size=PROYECCION_CHUNK_SIZE, **parametros):
+    """
+    Genera (id, codigo_interno, nombre, cronograma) por activo, proyectando por lotes
+    de `chunk_size` activos leídos con un cursor (la memoria no crece con la cartera).
+    """
+    filas = queryset.order_by('pk').values_list(
+        'id', 'codigo_interno', 'nombre', 'valor_actual', 'vida_util', 'fecha_adquisicion'
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        lote = list(islice(filas, chunk_size))
+        if not lote:
+            break
+        ids, codigos, nombres, valores, vidas, fechas = zip(*lote)
+        cronogramas = proyectar_cronogramas(valores, vidas, fechas, depreciation_type, inicio, **parametros)
+        yield from zip(ids, codigos, nombres, cronogramas)
+
+def iter_proyeccion_json(activos, encabezado):
+    """Objeto JSON `{...encabezado, "activos": [...]}` emitido activo por activo."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield encoder.encode(encabezado)[:-1].encode('utf-8') + b', "activos": ['
+    separador = b''
+    for activo_id, codigo, nombre, cronograma in activos:
+        yield separador + encoder.encode({
+            'id': activo_id, 'codigo_interno': codigo, 'nombre': nombre,
+            'cronograma': [
+                {'anio': anio, 'valor_inicial': inicial, 'depreciacion': monto, 'valor_final': final}
+                for anio, inicial, monto, final in cronograma
+            ],
+        }).encode('utf-8')
+        separador = b', '
+    yield b']}'
+
+def filas_proyeccion(activos):
+    """Una fila por activo y año (formato tabla, para Excel)."""
+    for _, codigo, nombre, cronograma in activos:
+        for anio, inicial, monto, final in cronograma:
+            yield (codigo, nombre, anio, inicial, monto, final)
+
+def iter_proyeccion_excel(rows):
+    return iter_excel_report(
+        rows, headers=[header for _, header in PROYECCION_COLUMNS], sheet_title="Proyección de Depreciación",
+    )
@@ -0,0 +1,83 @@
+# api/export_jobs.py
+import logging
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ReporteExportJob
+from .report_query import parse_and_build_query, report_base_queryset
+from .report_utils import EXPORT_FORMATS, iter_report_rows
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas filas se guarda el progreso (un UPDATE por bloque)
+PROGRESO_CADA_FILAS = 2000
+
+def reclamar_siguiente_job():
+    """
+    Toma el job pendiente más antiguo y lo marca PROCESANDO.
+
+    SKIP LOCKED permite varios workers sin que dos tomen el mismo job. También se
+    reintentan los jobs PROCESANDO abandonados (worker caído) tras
+    EXPORT_JOB_STALE_MINUTES.
+    """
+    limite = timezone.now() - timedelta(minutes=getattr(settings, 'EXPORT_JOB_STALE_MINUTES', 60))
+    with transaction.atomic():
+        job = (
+            ReporteExportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(estado='PENDIENTE') | Q(estado='PROCESANDO', fecha_inicio__lt=limite))
+            .order_by('fecha_creacion')
+            .first()
+        )
+        if job is None:
+            return None
+        job.estado = 'PROCESANDO'
+        job.fecha_inicio = timezone.now()
+        job.progreso = 0
+        job.filas_procesadas = 0
+        job.save(update_fields=['estado', 'fecha_inicio', 'progreso', 'filas_procesadas'])
+    return job
+
+def _con_progreso(job, rows, total):
+    procesadas = 0
+    for row in rows:
+        yield row
+        procesadas += 1
+        if procesadas % PROGRESO_CADA_FILAS == 0:
+            ReporteExportJob.objects.filter(pk=job.pk).update(
+                filas_procesadas=procesadas,
+                progreso=min(99, procesadas * 100 // total) if total else 0,
+            )
+    job.filas_procesadas = procesadas
+
+def ejecutar_job(job):
+    """Genera el archivo del job y lo guarda en la carpeta de media del tenant."""
+    try:
+        is_staff = job.empresa_id is None
+        queryset = parse_and_build_query(job.filtros, report_base_queryset(job.empresa_id, is_staff=is_staff))
+        total = queryset.count()
+        job.total_filas = total
+        job.save(update_fields=['total_filas'])
+
+        formato = EXPORT_FORMATS[job.formato]
+        rows = _con_progreso(job, iter_report_rows(queryset), total)
+        with tempfile.TemporaryFile() as tmp:
+            formato['write'](rows, tmp)
+            tmp.seek(0)
+            job.archivo.save(f'reporte_{job.id}.{formato["extension"]}', File(tmp), save=False)
+
+        job.estado = 'COMPLETADO'
+        job.progreso = 100
+        job.fecha_fin = timezone.now()
+        job.save(update_fields=['archivo', 'estado', 'progreso', 'filas_procesadas', 'fecha_fin'])
+        logger.info(f"Export job {job.id} completado: {job.filas_procesadas} filas ({job.formato}).")
+    except Exception as e:
+        logger.error(f"Export job {job.id} falló: {e}", exc_info=True)
+        job.estado = 'ERROR'
+        job.error = str(e)
+        job.fecha_fin = timezone.now()
+        job.save(update_fields=['estado', 'error', 'fecha_fin'])
+    return job
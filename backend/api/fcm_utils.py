@@ -1,36 +1,181 @@
 import firebase_admin
 from firebase_admin import credentials, messaging
 from django.conf import settings
+from django.utils.module_loading import import_string
+from collections import namedtuple
+import json
 import os
+import urllib.request
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# FCM accepts at most 500 messages per send_each call.
+FCM_MAX_BATCH = 500
+
+# A push to deliver, independent of the transport.
+PushMessage = namedtuple('PushMessage', ['token', 'title', 'body', 'data'])
+# Outcome of one message. `token_invalid` means the device is gone for good
+# (app uninstalled, token rotated) and the token should not be used again.
+PushResult = namedtuple('PushResult', ['success', 'message_id', 'error', 'token_invalid'])
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_firebase_app():
+    """
+    Returns the Firebase app, initializing it once per process.
+    The messaging client (and its HTTP session) is cached per app by the SDK, so
+    reusing the same app also reuses the connection pool.
+    Returns None if the service account key is missing or invalid.
+    """
+    global _app
+    if _app is not None:
+        return _app
+    with _app_lock:
+        if _app is None:
+            try:
+                _app = firebase_admin.get_app()
+            except ValueError:
+                cred_path = settings.FIREBASE_ADMIN_CREDENTIALS_PATH
+                if not os.path.exists(cred_path):
+                    logger.error(f"Firebase service account key not found at: {cred_path}")
+                    return None
+                try:
+                    _app = firebase_admin.initialize_app(credentials.Certificate(cred_path))
+                    logger.info("Firebase Admin SDK initialized successfully.")
+                except Exception as e:
+                    logger.error(f"Error initializing Firebase Admin SDK: {e}")
+                    return None
+    return _app
+
 def initialize_firebase_app():
     """
     Initializes the Firebase Admin SDK if it hasn't been initialized already.
-    Uses the service account key specified in Django settings.
+    Kept for existing callers; returns True when the app is available.
     """
-    if not firebase_admin._apps:
+    return get_firebase_app() is not None
+
+def build_message(push):
+    """Builds the FCM message for a PushMessage (Android heads-up configuration included)."""
+    return messaging.Message(
+        notification=messaging.Notification(title=push.title, body=push.body),
+        data=push.data or None,
+        token=push.token,
+        android=messaging.AndroidConfig(
+            priority='high',
+            notification=messaging.AndroidNotification(
+                channel_id='high_importance_channel', # Must match channel ID in Flutter's main.dart
+            ),
+        ),
+    )
+
+def is_invalid_token_error(exc):
+    """True when Firebase reports the registration token as no longer valid."""
+    return isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+
+
+class FirebaseTransport:
+    """Sends pushes through the Firebase Admin SDK in send_each batches."""
+
+    def send_batch(self, pushes):
+        """Sends `pushes` (list of PushMessage) and returns one PushResult per message, in order."""
+        app = get_firebase_app()
+        if app is None:
+            return [PushResult(False, None, "Firebase Admin SDK not initialized.", False) for _ in pushes]
+
+        results = []
+        for start in range(0, len(pushes), FCM_MAX_BATCH):
+            chunk = pushes[start:start + FCM_MAX_BATCH]
+            try:
+                response = messaging.send_each([build_message(push) for push in chunk], app=app)
+            except Exception as e:
+                # The whole request failed (network, auth): every message in the chunk failed
+                logger.error(f"Error sending FCM batch: {e}")
+                results.extend(PushResult(False, None, str(e), False) for _ in chunk)
+                continue
+            for item in response.responses:
+                if item.success:
+                    results.append(PushResult(True, item.message_id, None, False))
+                else:
+                    results.append(PushResult(False, None, str(item.exception), is_invalid_token_error(item.exception)))
+        return results
+
+
+class FakeTransport:
+    """
+    Local stand-in for Firebase (tests and development): records the messages
+    instead of sending them. Tokens in `invalid_tokens` fail as unregistered and
+    tokens in `failing_tokens` fail with a transient error.
+    """
+
+    def __init__(self, invalid_tokens=(), failing_tokens=()):
+        self.sent = []
+        self.invalid_tokens = set(invalid_tokens)
+        self.failing_tokens = set(failing_tokens)
+        self.batches = 0
+
+    def send_batch(self, pushes):
+        self.batches += 1
+        results = []
+        for push in pushes:
+            if push.token in self.invalid_tokens:
+                results.append(PushResult(False, None, 'Requested entity was not found.', True))
+            elif push.token in self.failing_tokens:
+                results.append(PushResult(False, None, 'Service unavailable.', False))
+            else:
+                self.sent.append(push)
+                results.append(PushResult(True, f'fake-{len(self.sent)}', None, False))
+        return results
+
+
+class HttpStubTransport:
+    """
+    Sends each batch as JSON to a local HTTP stub that stands in for Firebase
+    (settings.PUSH_STUB_URL, see `manage.py run_push_stub`), for load runs and
+    integration tests. If the stub is down or answers an error, the whole batch
+    fails with a transient error, like a Firebase brownout.
+    """
+
+    def __init__(self, url=None, timeout=10):
+        self.url = url or getattr(settings, 'PUSH_STUB_URL', 'http://127.0.0.1:8765/send')
+        self.timeout = timeout
+
+    def send_batch(self, pushes):
+        payload = json.dumps({'messages': [push._asdict() for push in pushes]}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
         try:
-            cred_path = settings.FIREBASE_ADMIN_CREDENTIALS_PATH
-            if not os.path.exists(cred_path):
-                logger.error(f"Firebase service account key not found at: {cred_path}")
-                return False
-            
-            cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred)
-            logger.info("Firebase Admin SDK initialized successfully.")
-            return True
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                items = json.loads(response.read())['results']
         except Exception as e:
-            logger.error(f"Error initializing Firebase Admin SDK: {e}")
-            return False
-    return True # Already initialized
+            logger.error(f"Error sending batch to push stub {self.url}: {e}")
+            return [PushResult(False, None, str(e), False) for _ in pushes]
+        return [
+            PushResult(bool(item.get('success')), item.get('message_id'), item.get('error'), bool(item.get('token_invalid')))
+            for item in items
+        ]
+
+
+_transport = None
+
+def get_transport():
+    """Transport configured in settings.PUSH_TRANSPORT (dotted path), one instance per process."""
+    global _transport
+    if _transport is None:
+        _transport = import_string(getattr(settings, 'PUSH_TRANSPORT', 'api.fcm_utils.FirebaseTransport'))()
+    return _transport
+
+def set_transport(transport):
+    """Replaces the process transport (tests); returns the previous one."""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
 
 def send_fcm_notification(fcm_token, title, body, data=None):
     """
     Sends a push notification to a specific device using its FCM token.
-    
+
     Args:
         fcm_token (str): The FCM registration token of the device.
         title (str): The title of the notification.
@@ -42,31 +187,9 @@ def send_fcm_notification(fcm_token, title, body, data=None):
         bool: True if the message was sent successfully, False otherwise.
         str: The message ID if successful, or an error message if failed.
     """
-    if not initialize_firebase_app():
-        return False, "Firebase Admin SDK not initialized."
-
-    # --- NUEVO: Add Android specific configuration for heads-up notifications ---
-    android_config = messaging.AndroidConfig(
-        priority='high',
-        notification=messaging.AndroidNotification(
-            channel_id='high_importance_channel', # Must match channel ID in Flutter's main.dart
-        ),
-    )
-
-    message = messaging.Message(
-        notification=messaging.Notification(
-            title=title,
-            body=body,
-        ),
-        data=data,
-        token=fcm_token,
-        android=android_config, # <--- NUEVO
-    )
-
-    try:
-        response = messaging.send(message)
-        logger.info(f"Successfully sent FCM message: {response}")
-        return True, response
-    except Exception as e:
-        logger.error(f"Error sending FCM message: {e}")
-        return False, str(e)
\ No newline at end of file
+    result = get_transport().send_batch([PushMessage(fcm_token, title, body, data)])[0]
+    if result.success:
+        logger.info(f"Successfully sent FCM message: {result.message_id}")
+        return True, result.message_id
+    logger.error(f"Error sending FCM message: {result.error}")
+    return False, result.error
@@ -0,0 +1,33 @@
+# api/log_utils.py
+import logging
+import random
+from django.conf import settings
+
+def log_event(logger, level, event, sample_rate=None, **fields):
+    """
+    Log estructurado para rutas calientes (get_queryset, acciones de viewsets...).
+
+    - Si el nivel no está habilitado para el logger no se formatea nada (coste casi nulo).
+    - `sample_rate` (0.0 a 1.0) registra solo una fracción de los eventos; por defecto
+      usa settings.HOT_PATH_LOG_SAMPLE_RATE. Los errores y advertencias nunca se muestrean.
+    - Los campos se añaden al mensaje como `clave=valor` y al LogRecord en `record.data`.
+    """
+    if not logger.isEnabledFor(level):
+        return
+
+    if level < logging.WARNING:
+        if sample_rate is None:
+            sample_rate = getattr(settings, 'HOT_PATH_LOG_SAMPLE_RATE', 1.0)
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return
+
+    message = event
+    if fields:
+        message = f"{event} " + " ".join(f"{key}={value}" for key, value in fields.items())
+    logger.log(level, message, extra={'event': event, 'data': fields})
+
+def log_debug(logger, event, sample_rate=None, **fields):
+    log_event(logger, logging.DEBUG, event, sample_rate=sample_rate, **fields)
+
+def log_info(logger, event, sample_rate=None, **fields):
+    log_event(logger, logging.INFO, event, sample_rate=sample_rate, **fields)
@@ -0,0 +1,98 @@
+# backend/api/management/commands/benchmark_pdf_report.py
+import datetime
+import io
+import multiprocessing
+import os
+import resource
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connections
+from reportlab.pdfgen import canvas
+from api.models import ActivoFijo
+from api.report_utils import PDF_PAGESIZE, draw_pdf_pages, iter_pdf_report, iter_report_rows
+
+def _synthetic_rows(total):
+    fecha = datetime.date(2020, 1, 1)
+    for i in range(total):
+        yield (
+            f'Activo de prueba {i}', f'AF-{i:07d}', 'Oficina Central', 'Equipos de Computación',
+            'Finanzas', fecha + datetime.timedelta(days=i % 1500), Decimal(i % 100000) / 7, 'En Uso',
+        )
+
+def _rows(total, empresa_id):
+    if empresa_id:
+        queryset = ActivoFijo.objects.filter(empresa_id=empresa_id).order_by('fecha_adquisicion')[:total]
+        return iter_report_rows(queryset)
+    return _synthetic_rows(total)
+
+def _run_streaming(rows):
+    size = 0
+    with open(os.devnull, 'wb') as out:
+        for chunk in iter_pdf_report(rows):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+def _run_reportlab(rows):
+    # Motor anterior: un canvas.Canvas de reportlab sobre un BytesIO, guardado al final
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=PDF_PAGESIZE)
+    for _ in draw_pdf_pages(p, rows):
+        pass
+    p.save()
+    return buffer.getbuffer().nbytes
+
+ENGINES = {
+    'streaming': _run_streaming,
+    'reportlab': _run_reportlab,
+}
+
+def _measure(engine, total, empresa_id, conn):
+    # ru_maxrss (KB en Linux) de un hijo recién creado parte del RSS heredado del padre
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    size = ENGINES[engine](_rows(total, empresa_id))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, peak_kb, peak_kb - base_kb, size))
+    conn.close()
+
+class Command(BaseCommand):
+    help = 'Compares peak RSS and wall time of the streamed PDF report against the reportlab in-memory canvas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10000,100000,500000',
+                            help='Comma-separated row counts (default: 10000,100000,500000).')
+        parser.add_argument('--engines', default=','.join(ENGINES),
+                            help=f'Comma-separated engines: {", ".join(ENGINES)}.')
+        parser.add_argument('--empresa', default=None,
+                            help='Read rows from this company\'s assets instead of synthetic rows.')
+
+    def handle(self, *args, **options):
+        row_counts = [int(n) for n in options['rows'].split(',')]
+        engines = [e.strip() for e in options['engines'].split(',')]
+        for engine in engines:
+            if engine not in ENGINES:
+                self.stderr.write(self.style.ERROR(f"Unknown engine '{engine}'."))
+                return
+
+        # Cada medición corre en un proceso nuevo para que los picos no se acumulen
+        ctx = multiprocessing.get_context('fork')
+        connections.close_all()
+
+        self.stdout.write(f"{'rows':>8} {'engine':>10} {'time (s)':>9} {'peak RSS (MB)':>14} {'delta (MB)':>11} {'size (MB)':>10}")
+        for total in row_counts:
+            for engine in engines:
+                parent_conn, child_conn = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_measure, args=(engine, total, options['empresa'], child_conn))
+                process.start()
+                child_conn.close()
+                elapsed, peak_kb, delta_kb, size = parent_conn.recv()
+                process.join()
+                self.stdout.write(
+                    f"{total:>8} {engine:>10} {elapsed:>9.2f} {peak_kb / 1024:>14.1f} "
+                    f"{delta_kb / 1024:>11.1f} {size / 1048576:>10.1f}"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,59 @@
+# backend/api/management/commands/dispatch_outbox.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.push_outbox import OUTBOX_BATCH_SIZE, despachar_pendientes
+
+class Command(BaseCommand):
+    help = ('Dispatcher that sends queued push notifications (PushOutbox) to Firebase after the '
+            'transactions that wrote them have committed. Failed messages are retried with backoff; '
+            'when a whole batch fails (Firebase brownout) the dispatcher itself backs off.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Send the messages that are due and exit instead of polling.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when nothing is due.')
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+                            help='Messages claimed per transaction.')
+        parser.add_argument('--rate', type=float, default=getattr(settings, 'PUSH_DISPATCH_RATE', 50),
+                            help='Maximum messages per second.')
+        parser.add_argument('--max-pause', type=float, default=60.0,
+                            help='Longest pause (seconds) after consecutive fully failed batches.')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Push outbox dispatcher started.")
+        total_enviados = total_fallidos = 0
+        lotes_caidos = 0  # Lotes seguidos sin ningún envío exitoso
+        while True:
+            close_old_connections()
+            inicio = time.monotonic()
+            enviados, fallidos = despachar_pendientes(options['batch_size'])
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if not (enviados or fallidos):
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Sent {enviados} push messages, {fallidos} failed.")
+            if enviados == 0:
+                # Firebase no responde: frenar en vez de seguir martillando con reintentos
+                lotes_caidos += 1
+                pausa = min(options['max_pause'], options['poll_interval'] * 2 ** lotes_caidos)
+                self.stdout.write(self.style.WARNING(f"Whole batch failed; pausing {pausa:.1f}s."))
+                if options['once']:
+                    break
+                time.sleep(pausa)
+                continue
+            lotes_caidos = 0
+
+            # Tope de mensajes por segundo
+            if options['rate'] > 0:
+                restante = (enviados + fallidos) / options['rate'] - (time.monotonic() - inicio)
+                if restante > 0:
+                    time.sleep(restante)
+
+        self.stdout.write(self.style.SUCCESS(f"Dispatched {total_enviados} push messages ({total_fallidos} failed)."))
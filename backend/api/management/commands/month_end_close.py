@@ -0,0 +1,78 @@
+# backend/api/management/commands/month_end_close.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api.depreciation_utils import BATCH_DEPRECIATION_TYPES, rango_periodo
+from api.models import Empresa
+from api.month_end import cerrar_mes_en_proceso, empresas_pendientes, periodo_anterior
+
+class Command(BaseCommand):
+    help = ('Month-end close for every company: batch depreciation, budget period closing and dashboard '
+            'refresh. Companies run in parallel worker processes; finished ones are checkpointed and skipped '
+            'when the command is run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', default=None,
+                            help='Month to close (YYYY-MM). Defaults to the previous month.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: CPU count).')
+        parser.add_argument('--empresa', action='append', dest='empresas',
+                            help='Company UUID to close (repeatable). Defaults to all.')
+        parser.add_argument('--depreciation-type', default='STRAIGHT_LINE', choices=BATCH_DEPRECIATION_TYPES,
+                            help='Batch depreciation method.')
+        parser.add_argument('--tasa', default=None,
+                            help='Annual rate (0-1] for DECLINING_BALANCE.')
+        parser.add_argument('--force', action='store_true',
+                            help='Also re-run companies whose close is already completed.')
+
+    def handle(self, *args, **options):
+        periodo = options['periodo'] or periodo_anterior()
+        try:
+            rango_periodo(periodo)
+        except ValueError as e:
+            raise CommandError(str(e))
+        try:
+            tasa = Decimal(options['tasa']) if options['tasa'] else None
+        except InvalidOperation:
+            raise CommandError(f"Invalid --tasa: {options['tasa']}")
+        # Se valida antes de repartir el trabajo: si no, cada empresa fallaría en su proceso
+        if options['depreciation_type'] == 'DECLINING_BALANCE' and not (tasa is not None and Decimal(0) < tasa <= Decimal(1)):
+            raise CommandError("DECLINING_BALANCE requires --tasa between 0 and 1 (e.g. 0.2 for 20%).")
+
+        empresas = Empresa.objects.order_by('id')
+        if options['empresas']:
+            empresas = empresas.filter(id__in=options['empresas'])
+        pendientes = empresas_pendientes(list(empresas.values_list('id', flat=True)), periodo, options['force'])
+        if not pendientes:
+            self.stdout.write(f"Nothing to do: every company already closed {periodo}.")
+            return
+
+        workers = max(1, min(options['workers'], len(pendientes)))
+        self.stdout.write(f"Closing {periodo} for {len(pendientes)} companies with {workers} workers...")
+
+        # Los hijos (fork) no deben heredar las conexiones abiertas del padre
+        connections.close_all()
+        completadas = fallidas = 0
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futuros = [
+                pool.submit(cerrar_mes_en_proceso, empresa_id, periodo, options['depreciation_type'], tasa)
+                for empresa_id in pendientes
+            ]
+            for futuro in as_completed(futuros):
+                resultado = futuro.result()
+                if resultado['estado'] == 'COMPLETADO':
+                    completadas += 1
+                    self.stdout.write(
+                        f"{resultado['empresa_id']}: {resultado['activos_depreciados']} assets depreciated "
+                        f"({resultado['monto_depreciado']}), {resultado['periodos_cerrados']} budget periods closed."
+                    )
+                else:
+                    fallidas += 1
+                    self.stdout.write(self.style.ERROR(f"{resultado['empresa_id']}: {resultado['error']}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Month-end close {periodo}: {completadas} completed, {fallidas} failed."))
+        if fallidas:
+            raise CommandError(f"{fallidas} companies failed; run the command again to retry them.")
@@ -0,0 +1,36 @@
+# backend/api/management/commands/process_export_jobs.py
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.export_jobs import ejecutar_job, reclamar_siguiente_job
+
+class Command(BaseCommand):
+    help = 'Worker that generates queued report exports (ReporteExportJob) outside the request cycle.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process the pending jobs and exit instead of polling.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Export worker started.")
+        procesados = 0
+        while True:
+            close_old_connections()
+            job = reclamar_siguiente_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Processing export job {job.id} ({job.formato})...")
+            job = ejecutar_job(job)
+            procesados += 1
+            if job.estado == 'COMPLETADO':
+                self.stdout.write(self.style.SUCCESS(f"Job {job.id}: {job.filas_procesadas} rows -> {job.archivo.name}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job {job.id} failed: {job.error}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {procesados} export jobs."))
@@ -0,0 +1,26 @@
+# backend/api/management/commands/rebuild_dashboard_snapshots.py
+from django.core.management.base import BaseCommand
+from api.dashboard_utils import reconstruir_snapshot
+from api.models import Empresa
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed dashboard metrics (DashboardSnapshot) from the live tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', action='append', dest='empresas',
+                            help='Company UUID to rebuild (repeatable). Defaults to all.')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.order_by('nombre')
+        if options['empresas']:
+            empresas = empresas.filter(id__in=options['empresas'])
+
+        total = 0
+        for empresa_id, nombre in empresas.values_list('id', 'nombre'):
+            snapshot = reconstruir_snapshot(empresa_id)
+            total += 1
+            self.stdout.write(
+                f"{nombre}: {snapshot.total_activos} activos, {snapshot.total_usuarios} usuarios"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} dashboard snapshots."))
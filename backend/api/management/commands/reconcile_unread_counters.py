@@ -0,0 +1,30 @@
+# backend/api/management/commands/reconcile_unread_counters.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from api.notification_counters import reconciliar_no_leidas
+
+class Command(BaseCommand):
+    help = 'Resets the cached unread-notification counters from the Notificacion table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', action='append', dest='usuarios', type=int,
+                            help='User id to reconcile (repeatable). Defaults to all.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Users per GROUP BY query.')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling unread-notification counters...")
+        usuarios = User.objects.order_by('pk')
+        if options['usuarios']:
+            usuarios = usuarios.filter(pk__in=options['usuarios'])
+
+        total = 0
+        ultimo_pk = 0
+        while True:
+            ids = list(usuarios.filter(pk__gt=ultimo_pk).values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            ultimo_pk = ids[-1]
+            total += reconciliar_no_leidas(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {total} counters."))
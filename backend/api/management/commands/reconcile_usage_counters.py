@@ -0,0 +1,24 @@
+# backend/api/management/commands/reconcile_usage_counters.py
+from django.core.management.base import BaseCommand
+from api.usage_utils import reconciliar_uso
+
+class Command(BaseCommand):
+    help = 'Recalculates subscription usage counters (users/assets) and fixes any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', action='append', dest='empresas',
+                            help='Company UUID to reconcile (repeatable). Defaults to all.')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling subscription usage counters...")
+
+        correcciones = reconciliar_uso(options['empresas'])
+
+        if correcciones:
+            for empresa_id, campo, antes, despues in correcciones:
+                self.stdout.write(self.style.WARNING(
+                    f"Empresa {empresa_id}: {campo} {antes} -> {despues}"
+                ))
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(correcciones)} counters."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All usage counters are in sync."))
@@ -0,0 +1,64 @@
+# backend/api/management/commands/run_push_stub.py
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = ('Local HTTP stub that stands in for Firebase when PUSH_TRANSPORT is '
+            'api.fcm_utils.HttpStubTransport (load runs, integration tests). It can inject latency, '
+            'transient failures and unregistered tokens.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=0,
+                            help='Delay added to every batch.')
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help='Fraction (0-1) of messages that fail with a transient error.')
+        parser.add_argument('--outage-rate', type=float, default=0.0,
+                            help='Fraction (0-1) of batches answered with HTTP 503 (brownout).')
+        parser.add_argument('--invalid-token-prefix', default='invalid-',
+                            help='Tokens starting with this prefix are reported as unregistered.')
+
+    def handle(self, *args, **options):
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                longitud = int(self.headers.get('Content-Length', 0))
+                mensajes = json.loads(self.rfile.read(longitud) or b'{}').get('messages', [])
+                if options['latency_ms']:
+                    time.sleep(options['latency_ms'] / 1000)
+                if random.random() < options['outage_rate']:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                results = []
+                for mensaje in mensajes:
+                    if str(mensaje.get('token', '')).startswith(options['invalid_token_prefix']):
+                        results.append({'success': False, 'error': 'Requested entity was not found.', 'token_invalid': True})
+                    elif random.random() < options['failure_rate']:
+                        results.append({'success': False, 'error': 'Service unavailable.'})
+                    else:
+                        results.append({'success': True, 'message_id': f'stub-{random.getrandbits(48):x}'})
+                body = json.dumps({'results': results}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                stdout.write(f"push stub: {format % args}")
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(f"Push stub listening on http://{options['host']}:{options['port']}/send")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
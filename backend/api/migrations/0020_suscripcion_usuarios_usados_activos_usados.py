@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _conteo(model):
+    conteo = (
+        model.objects.filter(empresa_id=OuterRef('empresa_id'))
+        .order_by()
+        .values('empresa_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(conteo, output_field=IntegerField()), Value(0))
+
+
+def inicializar_contadores(apps, schema_editor):
+    Suscripcion = apps.get_model('api', 'Suscripcion')
+    Empleado = apps.get_model('api', 'Empleado')
+    ActivoFijo = apps.get_model('api', 'ActivoFijo')
+    Suscripcion.objects.update(
+        usuarios_usados=_conteo(Empleado),
+        activos_usados=_conteo(ActivoFijo),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_mantenimiento_creado_por'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suscripcion',
+            name='usuarios_usados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='suscripcion',
+            name='activos_usados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_suscripcion_usuarios_usados_activos_usados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=models.Index(fields=['empresa', 'fecha_adquisicion'], name='activo_empresa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudcompra',
+            index=models.Index(fields=['empresa', 'estado'], name='solicitud_empresa_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['empresa', 'estado'], name='mant_empresa_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revalorizacionactivo',
+            index=models.Index(fields=['activo', '-fecha'], name='reval_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depreciacionactivo',
+            index=models.Index(fields=['activo', '-fecha'], name='deprec_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['destinatario', 'leido', '-timestamp'], name='notif_dest_leido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leido', False)), fields=['destinatario'], name='notif_no_leidas_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_tenant_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('empresa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_snapshot', serialize=False, to='api.empresa')),
+                ('total_activos', models.IntegerField(default=0)),
+                ('total_usuarios', models.IntegerField(default=0)),
+                ('valor_total_activos', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('activos_por_estado', models.JSONField(default=dict)),
+                ('activos_por_categoria', models.JSONField(default=dict)),
+                ('solicitudes_pendientes', models.IntegerField(default=0)),
+                ('mantenimientos_en_proceso', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
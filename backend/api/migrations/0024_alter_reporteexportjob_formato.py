@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_reporteexportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reporteexportjob',
+            name='formato',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel'), ('csv', 'CSV'), ('ndjson', 'NDJSON'), ('parquet', 'Parquet')], default='pdf', max_length=10),
+        ),
+    ]
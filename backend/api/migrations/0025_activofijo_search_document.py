@@ -0,0 +1,36 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+BACKFILL_SQL = r"""
+UPDATE api_activofijo a SET search_document = LOWER(CONCAT_WS(E'\n',
+    a.nombre,
+    a.codigo_interno,
+    COALESCE((SELECT nombre FROM api_departamento WHERE id = a.departamento_id), ''),
+    COALESCE((SELECT nombre FROM api_categoriaactivo WHERE id = a.categoria_id), ''),
+    COALESCE((SELECT nombre FROM api_ubicacion WHERE id = a.ubicacion_id), ''),
+    COALESCE((SELECT nombre FROM api_estado WHERE id = a.estado_id), ''),
+    COALESCE((SELECT nombre FROM api_proveedor WHERE id = a.proveedor_id), '')
+));
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_alter_reporteexportjob_formato'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='activofijo',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='activo_search_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
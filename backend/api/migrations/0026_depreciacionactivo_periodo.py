@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_activofijo_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depreciacionactivo',
+            name='periodo',
+            field=models.CharField(blank=True, max_length=7, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='depreciacionactivo',
+            constraint=models.UniqueConstraint(fields=('activo', 'periodo'), name='deprec_activo_periodo_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:36
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_depreciacionactivo_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreMensualCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('periodo', models.CharField(max_length=7)),
+                ('estado', models.CharField(choices=[('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PROCESANDO', max_length=20)),
+                ('activos_depreciados', models.PositiveIntegerField(default=0)),
+                ('monto_depreciado', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('periodos_cerrados', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_mensuales', to='api.empresa')),
+            ],
+            options={
+                'ordering': ['-periodo'],
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'periodo'), name='cierre_empresa_periodo_uniq')],
+            },
+        ),
+    ]
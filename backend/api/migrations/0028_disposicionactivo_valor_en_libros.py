@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_cierremensualcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disposicionactivo',
+            name='valor_en_libros',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='disposicionactivo',
+            index=models.Index(fields=['activo', 'fecha_disposicion'], name='dispos_activo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:43
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_pushoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pushoutbox',
+            name='push_outbox_cola_idx',
+        ),
+        migrations.AddField(
+            model_name='pushoutbox',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pushoutbox',
+            name='proximo_intento',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='pushoutbox',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIADO', 'Enviado'), ('ERROR', 'Error'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='pushoutbox',
+            index=models.Index(fields=['estado', 'proximo_intento'], name='push_outbox_cola_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+
+def _ultimo_valor(modelo, disposicion):
+    # Último cambio registrado hasta el día de la baja (inclusive): (fecha, valor_nuevo)
+    return (
+        modelo.objects.filter(activo_id=disposicion.activo_id, fecha__date__lte=disposicion.fecha_disposicion)
+        .order_by('-fecha')
+        .values_list('fecha', 'valor_nuevo')
+        .first()
+    )
+
+
+def rellenar_valor_en_libros(apps, schema_editor):
+    """
+    Las bajas anteriores a 0028 no guardaron el valor en libros y la baja dejó
+    valor_actual en cero. Se toma el valor_nuevo del último movimiento de historial
+    (depreciación o revalorización) hasta la fecha de la baja y, si el activo no
+    tiene historial, su valor de adquisición (precio final de la orden de compra).
+    """
+    DisposicionActivo = apps.get_model('api', 'DisposicionActivo')
+    DepreciacionActivo = apps.get_model('api', 'DepreciacionActivo')
+    RevalorizacionActivo = apps.get_model('api', 'RevalorizacionActivo')
+
+    pendientes = (
+        DisposicionActivo.objects.filter(valor_en_libros__isnull=True)
+        .select_related('activo__orden_compra')
+        .order_by('pk')
+    )
+    lote = []
+    for disposicion in pendientes.iterator(chunk_size=500):
+        movimientos = [
+            movimiento for movimiento in (
+                _ultimo_valor(DepreciacionActivo, disposicion),
+                _ultimo_valor(RevalorizacionActivo, disposicion),
+            ) if movimiento is not None
+        ]
+        if movimientos:
+            disposicion.valor_en_libros = max(movimientos, key=lambda movimiento: movimiento[0])[1]
+        elif disposicion.activo.orden_compra is not None:
+            disposicion.valor_en_libros = disposicion.activo.orden_compra.precio_final
+        else:
+            continue
+        lote.append(disposicion)
+        if len(lote) >= 500:
+            DisposicionActivo.objects.bulk_update(lote, ['valor_en_libros'])
+            lote = []
+    if lote:
+        DisposicionActivo.objects.bulk_update(lote, ['valor_en_libros'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_pushoutbox_reintentos'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_valor_en_libros, migrations.RunPython.noop),
+    ]
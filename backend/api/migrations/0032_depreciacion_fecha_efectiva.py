@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:17
+
+import calendar
+import datetime
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def rellenar_fecha_efectiva(apps, schema_editor):
+    """
+    Los registros existentes rigen desde su registro (`fecha`), salvo los que tienen
+    período: esos desde el último instante del mes, en hora local.
+    """
+    DepreciacionActivo = apps.get_model('api', 'DepreciacionActivo')
+    DepreciacionActivo.objects.filter(periodo__isnull=True).update(fecha_efectiva=F('fecha'))
+    periodos = DepreciacionActivo.objects.filter(periodo__isnull=False).values_list('periodo', flat=True).distinct()
+    for periodo in list(periodos):
+        year, month = (int(parte) for parte in periodo.split('-'))
+        ultimo_dia = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        DepreciacionActivo.objects.filter(periodo=periodo).update(
+            fecha_efectiva=timezone.make_aware(datetime.datetime.combine(ultimo_dia, datetime.time.max))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_backfill_disposicion_valor_en_libros'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depreciacionactivo',
+            name='fecha_efectiva',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='depreciacionactivo',
+            index=models.Index(fields=['activo', 'fecha_efectiva'], name='deprec_activo_efectiva_idx'),
+        ),
+        migrations.RunPython(rellenar_fecha_efectiva, migrations.RunPython.noop),
+    ]
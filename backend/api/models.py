@@ -1,6 +1,7 @@
 # api/models.py
 import uuid
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -27,6 +28,13 @@ def upload_path_mantenimiento(instance, filename):
     """
     return f'tenant_{instance.mantenimiento.empresa.id}/fotos_mantenimientos/{filename}'
 
+def upload_path_reporte(instance, filename):
+    """
+    Guarda el archivo de una exportación de reporte en la carpeta del tenant.
+    Ruta: /media/tenant_<empresa_id>/reportes/<filename>
+    """
+    return f'tenant_{instance.empresa_id or "global"}/reportes/{filename}'
+
 # --- Modelos de Negocio (Base de datos: 'af_saas') ---
 
 class Empresa(models.Model):
@@ -132,8 +140,19 @@ class ActivoFijo(models.Model): # <-- [EDITADO]
     # --- [NUEVO] Campo de foto de activo opcional ---
     foto_activo = models.ImageField(upload_to=upload_path_activo, null=True, blank=True)
     orden_compra = models.OneToOneField('OrdenCompra', on_delete=models.SET_NULL, null=True, blank=True, related_name='activo_creado')
+
+    # --- [NUEVO] Documento de búsqueda de texto libre (ver api/search_utils.py) ---
+    # Nombre, código y nombres de sus catálogos en minúsculas; lo mantienen las señales.
+    search_document = models.TextField(blank=True, default='', editable=False)
     
-    class Meta: unique_together = ('empresa', 'codigo_interno')
+    class Meta:
+        unique_together = ('empresa', 'codigo_interno')
+        indexes = [
+            # Reportes y filtros por rango de fechas dentro del tenant
+            models.Index(fields=['empresa', 'fecha_adquisicion'], name='activo_empresa_fecha_idx'),
+            # Búsqueda "contiene" (LIKE '%texto%') sobre el documento de búsqueda
+            GinIndex(fields=['search_document'], name='activo_search_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
     def __str__(self): return self.nombre
 
 class CategoriaActivo(models.Model):
@@ -199,6 +218,9 @@ class SolicitudCompra(models.Model):
 
     class Meta:
         ordering = ['-fecha_solicitud']
+        indexes = [
+            models.Index(fields=['empresa', 'estado'], name='solicitud_empresa_estado_idx'),
+        ]
 
     def __str__(self):
         return f"Solicitud de {self.departamento.nombre} - {self.estado}"
@@ -311,6 +333,11 @@ class Mantenimiento(models.Model):
     descripcion_problema = models.TextField()
     notas_solucion = models.TextField(blank=True, null=True)
     costo = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'estado'], name='mant_empresa_estado_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.activo.nombre} ({self.get_estado_display()})"
@@ -356,9 +383,37 @@ class Suscripcion(models.Model):
     max_usuarios = models.PositiveIntegerField(default=5)
     max_activos = models.PositiveIntegerField(default=50)
 
+    # --- [NUEVO] Uso actual (contadores denormalizados, ver api/usage_utils.py) ---
+    # Se mantienen por señales al crear/eliminar Empleados y Activos;
+    # `manage.py reconcile_usage_counters` corrige cualquier desviación.
+    usuarios_usados = models.PositiveIntegerField(default=0)
+    activos_usados = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Suscripción {self.get_plan_display()} de {self.empresa.nombre} ({self.get_estado_display()})"
 
+# --- [NUEVO] Resumen precalculado del Dashboard (ver api/dashboard_utils.py) ---
+class DashboardSnapshot(models.Model):
+    """
+    Métricas del Dashboard de una empresa. Se mantienen incrementalmente por señales
+    (Activos, Empleados, Solicitudes, Mantenimientos) y se reconstruyen con
+    `manage.py rebuild_dashboard_snapshots`. DashboardDataView lo lee por clave primaria.
+    """
+    empresa = models.OneToOneField(Empresa, on_delete=models.CASCADE, primary_key=True, related_name='dashboard_snapshot')
+    total_activos = models.IntegerField(default=0)
+    total_usuarios = models.IntegerField(default=0)
+    valor_total_activos = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    # {"<estado_id>": {"nombre": "En Uso", "count": 12}, ...}
+    activos_por_estado = models.JSONField(default=dict)
+    # {"<categoria_id>": {"nombre": "Equipos", "count": 7}, ...}
+    activos_por_categoria = models.JSONField(default=dict)
+    solicitudes_pendientes = models.IntegerField(default=0)
+    mantenimientos_en_proceso = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard de {self.empresa_id} ({self.actualizado:%Y-%m-%d %H:%M})"
+
 # --- [NUEVO] Modelo de Revalorización (Base de datos: 'af_saas') ---
 class RevalorizacionActivo(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -375,6 +430,10 @@ class RevalorizacionActivo(models.Model):
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Historial de un activo (?activo_id=...), más reciente primero
+            models.Index(fields=['activo', '-fecha'], name='reval_activo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Revalorización de {self.activo.nombre} en {self.fecha.strftime('%Y-%m-%d')}"
@@ -399,11 +458,26 @@ class DepreciacionActivo(models.Model):
     monto_depreciado = models.DecimalField(max_digits=12, decimal_places=2)
     depreciation_type = models.CharField(max_length=20, choices=DEPRECIATION_TYPE_CHOICES, default='MANUAL') # Nuevo campo
     notas = models.TextField(blank=True, null=True)
+    # [NUEVO] Mes contable ("AAAA-MM") de la depreciación, individual o por lote
+    # (api/depreciation_utils.py). Nulo en los registros anteriores a este campo.
+    periodo = models.CharField(max_length=7, null=True, blank=True)
+    # [NUEVO] Momento desde el que rige el cambio de valor (api/valuation_utils.py): el
+    # cierre del período si lo hay (una corrida de diciembre se registra en enero), si
+    # no el momento del registro.
+    fecha_efectiva = models.DateTimeField(default=timezone.now)
     
     realizado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['activo', '-fecha'], name='deprec_activo_fecha_idx'),
+            models.Index(fields=['activo', 'fecha_efectiva'], name='deprec_activo_efectiva_idx'),
+        ]
+        constraints = [
+            # Un activo se deprecia una sola vez por período: repetir la corrida no duplica
+            models.UniqueConstraint(fields=['activo', 'periodo'], name='deprec_activo_periodo_uniq'),
+        ]
 
     def __str__(self):
         return f"Depreciación de {self.activo.nombre} en {self.fecha.strftime('%Y-%m-%d')}"
@@ -433,10 +507,52 @@ class Notificacion(models.Model):
 
     class Meta:
         ordering = ['leido', '-timestamp']
+        indexes = [
+            # Listado de la campanita: destinatario + orden del Meta
+            models.Index(fields=['destinatario', 'leido', '-timestamp'], name='notif_dest_leido_idx'),
+            # Contador de no leídas: índice parcial, solo las filas con leido=False
+            models.Index(fields=['destinatario'], name='notif_no_leidas_idx', condition=models.Q(leido=False)),
+        ]
 
     def __str__(self):
         return f"[{self.get_tipo_display()}] para {self.destinatario.username} (Leído: {self.leido})"
 
+# --- [NUEVO] Outbox de notificaciones push (ver api/push_outbox.py) ---
+# Se escribe en la misma transacción que la operación que notifica; un proceso
+# aparte (manage.py dispatch_outbox) lo envía a Firebase después del commit.
+class PushOutbox(models.Model):
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIADO', 'Enviado'),
+        ('ERROR', 'Error'), # Fallo definitivo (token no registrado): no se reintenta
+        ('FALLIDO', 'Fallido'), # Dead-letter: agotó los reintentos
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    destinatario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='push_outbox')
+    fcm_token = models.CharField(max_length=255)
+    titulo = models.CharField(max_length=255)
+    cuerpo = models.TextField()
+    data = models.JSONField(default=dict, blank=True) # Payload de datos (valores string)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    error = models.TextField(blank=True, null=True)
+    # [NUEVO] Reintentos con backoff exponencial (ver push_outbox.calcular_backoff)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['fecha_creacion']
+        indexes = [
+            # Cola del dispatcher: pendientes cuyo próximo intento ya venció
+            models.Index(fields=['estado', 'proximo_intento'], name='push_outbox_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Push '{self.titulo}' para {self.destinatario_id} ({self.get_estado_display()})"
+
 # --- Modelo de Log/Bitácora (Base de datos: 'log_saas') ---
 class Log(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -472,6 +588,9 @@ class DisposicionActivo(models.Model):
     tipo_disposicion = models.CharField(max_length=50, choices=TIPO_DISPOSICION_CHOICES)
     fecha_disposicion = models.DateField(default=timezone.now)
     valor_venta = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    # [NUEVO] Valor en libros al momento de la baja: la baja deja valor_actual en cero
+    # sin historial, y el valor a una fecha anterior se toma de aquí (valuation_utils.py)
+    valor_en_libros = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     razon = models.TextField(blank=True, null=True)
     realizado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -480,10 +599,86 @@ class DisposicionActivo(models.Model):
         verbose_name = "Disposición de Activo"
         verbose_name_plural = "Disposiciones de Activos"
         ordering = ['-fecha_disposicion']
+        indexes = [
+            # Valor a una fecha (api/valuation_utils.py): ¿dado de baja hasta D?
+            models.Index(fields=['activo', 'fecha_disposicion'], name='dispos_activo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Disposición de {self.activo.nombre} ({self.get_tipo_disposicion_display()}) por {self.realizado_por.username if self.realizado_por else 'N/A'}"
 
+# --- [NUEVO] Exportaciones de reportes en segundo plano (ver api/export_jobs.py) ---
+class ReporteExportJob(models.Model):
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+    FORMATO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('excel', 'Excel'),
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+        ('parquet', 'Parquet'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Nulo solo para exportaciones de un superusuario sin empresa (todos los activos)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True, related_name='exportaciones')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='exportaciones')
+
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES, default='pdf')
+    filtros = models.JSONField(default=list, blank=True) # Misma lista que /reportes/query/
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    progreso = models.PositiveSmallIntegerField(default=0) # 0 a 100
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    total_filas = models.PositiveIntegerField(null=True, blank=True)
+    archivo = models.FileField(upload_to=upload_path_reporte, null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # Cola del worker: pendientes más antiguos primero
+            models.Index(fields=['estado', 'fecha_creacion'], name='export_job_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.formato} ({self.get_estado_display()}) {self.id}"
+
+# --- [NUEVO] Checkpoint del cierre mensual por empresa (ver api/month_end.py) ---
+class CierreMensualCheckpoint(models.Model):
+    ESTADO_CHOICES = [
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='cierres_mensuales')
+    periodo = models.CharField(max_length=7) # "AAAA-MM"
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PROCESANDO')
+    activos_depreciados = models.PositiveIntegerField(default=0)
+    monto_depreciado = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    periodos_cerrados = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    fecha_inicio = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-periodo']
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'periodo'], name='cierre_empresa_periodo_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Cierre {self.periodo} de {self.empresa_id} ({self.get_estado_display()})"
+
 # --- [NUEVO] Modelo de Predicción de Mantenimiento (Base de datos: 'analytics_saas') ---
 class PrediccionMantenimiento(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
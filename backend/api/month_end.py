@@ -0,0 +1,84 @@
+# api/month_end.py
+import datetime
+import logging
+from django.db import close_old_connections, connections
+from django.utils import timezone
+from .dashboard_utils import reconstruir_snapshot
+from .depreciation_utils import ejecutar_depreciacion_lote, rango_periodo
+from .models import CierreMensualCheckpoint, PeriodoPresupuestario
+
+logger = logging.getLogger(__name__)
+
+def periodo_anterior():
+    """Mes que acaba de terminar ('AAAA-MM'): el cierre se corre a inicios del mes siguiente."""
+    ultimo_dia = timezone.localdate().replace(day=1) - datetime.timedelta(days=1)
+    return ultimo_dia.strftime('%Y-%m')
+
+def empresas_pendientes(empresa_ids, periodo, force=False):
+    """Quita las empresas cuyo cierre de `periodo` ya terminó (salvo con `force`)."""
+    if force:
+        return list(empresa_ids)
+    completadas = set(
+        CierreMensualCheckpoint.objects.filter(periodo=periodo, estado='COMPLETADO')
+        .values_list('empresa_id', flat=True)
+    )
+    return [empresa_id for empresa_id in empresa_ids if empresa_id not in completadas]
+
+def cerrar_mes_empresa(empresa_id, periodo, depreciation_type='STRAIGHT_LINE', tasa=None):
+    """
+    Cierre mensual de una empresa: depreciación del período, cierre de los períodos
+    presupuestarios vencidos y reconstrucción del snapshot del Dashboard.
+
+    El checkpoint (empresa, periodo) queda COMPLETADO al terminar o ERROR con el
+    mensaje. Repetir un cierre a medias es seguro: la depreciación por lote es
+    idempotente por período y los demás pasos son recalculables.
+    """
+    _, fin_periodo = rango_periodo(periodo)
+    checkpoint, creado = CierreMensualCheckpoint.objects.get_or_create(empresa_id=empresa_id, periodo=periodo)
+    if not creado:
+        checkpoint.estado = 'PROCESANDO'
+        checkpoint.error = None
+        checkpoint.fecha_inicio = timezone.now()
+        checkpoint.fecha_fin = None
+        checkpoint.save(update_fields=['estado', 'error', 'fecha_inicio', 'fecha_fin'])
+
+    try:
+        resumen = ejecutar_depreciacion_lote(empresa_id, periodo, depreciation_type, tasa=tasa)
+        # El modelo no tiene señales: un UPDATE para todos los períodos vencidos
+        periodos_cerrados = PeriodoPresupuestario.objects.filter(
+            empresa_id=empresa_id, estado='ACTIVO', fecha_fin__lte=fin_periodo,
+        ).update(estado='CERRADO')
+        reconstruir_snapshot(empresa_id)
+    except Exception as e:
+        logger.error(f"Cierre mensual {periodo} empresa {empresa_id}: {e}", exc_info=True)
+        checkpoint.estado = 'ERROR'
+        checkpoint.error = str(e)
+        checkpoint.fecha_fin = timezone.now()
+        checkpoint.save(update_fields=['estado', 'error', 'fecha_fin'])
+        return checkpoint
+
+    # Acumula: un reintento solo deprecia lo que faltaba
+    checkpoint.activos_depreciados += resumen['depreciados']
+    checkpoint.monto_depreciado += resumen['monto_total']
+    checkpoint.periodos_cerrados += periodos_cerrados
+    checkpoint.estado = 'COMPLETADO'
+    checkpoint.fecha_fin = timezone.now()
+    checkpoint.save()
+    return checkpoint
+
+def cerrar_mes_en_proceso(empresa_id, periodo, depreciation_type, tasa):
+    """
+    Punto de entrada de cada worker del pool. Los procesos hijos heredan (fork)
+    las conexiones del padre: se descartan y cada tarea abre las suyas.
+    """
+    close_old_connections()
+    try:
+        checkpoint = cerrar_mes_empresa(empresa_id, periodo, depreciation_type, tasa)
+        return {
+            'empresa_id': empresa_id, 'estado': checkpoint.estado, 'error': checkpoint.error,
+            'activos_depreciados': checkpoint.activos_depreciados,
+            'monto_depreciado': checkpoint.monto_depreciado,
+            'periodos_cerrados': checkpoint.periodos_cerrados,
+        }
+    finally:
+        connections.close_all()
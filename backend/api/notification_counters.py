@@ -0,0 +1,74 @@
+# api/notification_counters.py
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .models import Notificacion
+
+# --- Contador de notificaciones no leídas por usuario, en la caché compartida ---
+# La campanita (web) y el notification_provider (móvil) consultan unread-count
+# cada pocos segundos: se sirve desde la caché y solo se cuenta en la tabla al
+# faltar la entrada. Crear, leer y borrar notificaciones ajustan el contador; la
+# expiración (UNREAD_COUNT_CACHE_TIMEOUT) y `reconciliar_no_leidas` corrigen
+# cualquier desvío.
+UNREAD_COUNT_PREFIX = 'notificaciones:no_leidas'
+
+def _key(usuario_id):
+    return f"{UNREAD_COUNT_PREFIX}:{usuario_id}"
+
+def _timeout():
+    return getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 3600)
+
+def contar_en_tabla(usuario_id):
+    return Notificacion.objects.filter(destinatario_id=usuario_id, leido=False).count()
+
+def contar_no_leidas(usuario_id):
+    """No leídas del usuario: lectura de caché; COUNT (índice parcial) solo si falta la entrada."""
+    count = cache.get(_key(usuario_id))
+    if count is None:
+        count = contar_en_tabla(usuario_id)
+        # add() no pisa un valor que otro proceso ya haya fijado entretanto
+        cache.add(_key(usuario_id), count, _timeout())
+    return count
+
+def _ajustar(usuario_id, delta):
+    try:
+        if delta >= 0:
+            cache.incr(_key(usuario_id), delta)
+        elif cache.decr(_key(usuario_id), -delta) < 0:
+            cache.delete(_key(usuario_id))
+    except ValueError:
+        # Sin entrada: la próxima lectura cuenta en la tabla
+        pass
+
+def incrementar_no_leidas(usuario_ids):
+    """Una notificación no leída más por cada aparición en `usuario_ids`, al hacer commit."""
+    usuario_ids = list(usuario_ids)
+
+    def aplicar():
+        for usuario_id in usuario_ids:
+            _ajustar(usuario_id, 1)
+
+    transaction.on_commit(aplicar)
+
+def decrementar_no_leidas(usuario_id):
+    transaction.on_commit(lambda: _ajustar(usuario_id, -1))
+
+def reiniciar_no_leidas(usuario_id):
+    """Todas leídas: el contador queda en cero."""
+    transaction.on_commit(lambda: cache.set(_key(usuario_id), 0, _timeout()))
+
+def reconciliar_no_leidas(usuario_ids=None):
+    """
+    Fija los contadores a partir de la tabla (un GROUP BY) para `usuario_ids` o para
+    todos los usuarios. Devuelve cuántos contadores se escribieron.
+    """
+    usuarios = User.objects.all() if usuario_ids is None else User.objects.filter(pk__in=usuario_ids)
+    ids = list(usuarios.values_list('pk', flat=True))
+    conteos = dict(
+        Notificacion.objects.filter(destinatario_id__in=ids, leido=False).order_by()
+        .values('destinatario_id').annotate(total=Count('pk')).values_list('destinatario_id', 'total')
+    )
+    cache.set_many({_key(usuario_id): conteos.get(usuario_id, 0) for usuario_id in ids}, _timeout())
+    return len(ids)
@@ -0,0 +1,69 @@
+# api/notification_utils.py
+import logging
+from django.db.models import Q
+from .log_utils import log_debug
+from .models import Empleado, Notificacion
+from .notification_counters import incrementar_no_leidas
+from .push_outbox import construir_push, encolar_pushes
+
+logger = logging.getLogger(__name__)
+
+def resolver_destinatarios(empresa_id=None, usuarios=(), roles=(), departamentos=(), todos=False, excluir=()):
+    """
+    Destinatarios como {usuario_id: fcm_token o None}, en una sola consulta.
+
+    `usuarios` se notifican siempre (tengan o no perfil de empleado); `roles`
+    (nombres), `departamentos` (ids) y `todos` seleccionan empleados de `empresa_id`.
+    """
+    criterio = Q(usuario_id__in=list(usuarios)) if usuarios else Q(pk__in=[])
+    if empresa_id is not None:
+        de_la_empresa = Q(empresa_id=empresa_id)
+        if todos:
+            criterio |= de_la_empresa
+        else:
+            if roles:
+                criterio |= de_la_empresa & Q(roles__nombre__in=list(roles))
+            if departamentos:
+                criterio |= de_la_empresa & Q(departamento_id__in=list(departamentos))
+
+    destinatarios = dict(
+        Empleado.objects.filter(criterio).exclude(usuario_id__in=list(excluir))
+        .values_list('usuario_id', 'fcm_token').distinct()
+    )
+    excluidos = set(excluir)
+    for usuario_id in usuarios:
+        if usuario_id not in excluidos:
+            destinatarios.setdefault(usuario_id, None)
+    return destinatarios
+
+def notificar(mensaje, titulo, tipo='INFO', url_destino=None, data=None, empresa_id=None,
+              usuarios=(), roles=(), departamentos=(), todos=False, excluir=()):
+    """
+    Fan-out de una notificación: resuelve los destinatarios con sus tokens (una
+    consulta), crea todas las Notificacion de la campanita con bulk_create y deja
+    los pushes en el outbox en un solo INSERT. `data` se agrega al payload push
+    (id, url_destino y tipo van siempre). Devuelve las Notificacion creadas.
+    """
+    destinatarios = resolver_destinatarios(empresa_id, usuarios, roles, departamentos, todos, excluir)
+    if not destinatarios:
+        return []
+
+    notificaciones = Notificacion.objects.bulk_create([
+        Notificacion(destinatario_id=usuario_id, mensaje=mensaje, tipo=tipo, url_destino=url_destino)
+        for usuario_id in destinatarios
+    ])
+    pushes = [
+        construir_push(
+            notificacion.destinatario_id, destinatarios[notificacion.destinatario_id], titulo, mensaje,
+            {'id': notificacion.id, 'url_destino': url_destino or '', 'tipo': tipo, **(data or {})},
+        )
+        for notificacion in notificaciones if destinatarios[notificacion.destinatario_id]
+    ]
+    encolar_pushes(pushes)
+    # bulk_create no dispara post_save: contadores de la campanita aquí
+    incrementar_no_leidas(destinatarios)
+    log_debug(
+        logger, 'notificaciones.fan_out', titulo=titulo,
+        destinatarios=len(notificaciones), pushes=len(pushes)
+    )
+    return notificaciones
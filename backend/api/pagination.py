@@ -0,0 +1,98 @@
+# api/pagination.py
+import base64
+import json
+import logging
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+class KeysetPagination:
+    """
+    Paginación por cursor (keyset) sobre un orden estable `(campo, id)`.
+
+    Cada página se obtiene con `WHERE (campo, id) > (último visto) ORDER BY campo, id
+    LIMIT n`, servido por índice: el coste por página no depende de su posición
+    (a diferencia de OFFSET). Devuelve un total aproximado tomado de las estadísticas
+    del planificador (EXPLAIN, sin recorrer filas) y el COUNT exacto solo si se pide
+    con `count=exact`.
+    """
+    page_size = 100
+    max_page_size = 500
+
+    def __init__(self, ordering_field='fecha_adquisicion', page_size=None, max_page_size=None):
+        self.ordering_field = ordering_field
+        if page_size:
+            self.page_size = page_size
+        if max_page_size:
+            self.max_page_size = max_page_size
+
+    # --- Cursor opaco: base64 de [valor del campo, id] ---
+
+    def encode_cursor(self, row):
+        data = json.dumps([str(row[self.ordering_field]), str(row['id'])])
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor, model):
+        try:
+            valor, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            valor = model._meta.get_field(self.ordering_field).to_python(valor)
+            pk = model._meta.pk.to_python(pk)
+        except Exception:
+            raise ValidationError({'cursor': 'Cursor inválido.'})
+        return valor, pk
+
+    def get_page_size(self, params):
+        try:
+            size = int(params.get('page_size', self.page_size))
+        except (TypeError, ValueError):
+            raise ValidationError({'page_size': 'Debe ser un número entero.'})
+        return max(1, min(size, self.max_page_size))
+
+    # --- Totales ---
+
+    def approximate_count(self, queryset):
+        """Filas estimadas por el planificador de Postgres (no ejecuta la consulta)."""
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f"KeysetPagination: no se pudo estimar el total: {e}")
+            return None
+
+    # --- Página ---
+
+    def paginate(self, queryset, params, fields):
+        """
+        Devuelve el dict de respuesta para la página pedida en `params`
+        (`cursor`, `page_size`, `count`). `fields` debe incluir el campo de orden e 'id'.
+        """
+        page_size = self.get_page_size(params)
+        cursor = params.get('cursor')
+        data = {
+            'approximate_total': self.approximate_count(queryset),
+        }
+        if str(params.get('count', '')).lower() == 'exact':
+            data['total'] = queryset.count()
+
+        page_qs = queryset.order_by(self.ordering_field, 'id')
+        if cursor:
+            valor, pk = self.decode_cursor(cursor, queryset.model)
+            # La condición >= sobre el campo indexado acota el rango del índice;
+            # el OR desempata las filas con el mismo valor por id.
+            page_qs = page_qs.filter(
+                Q(**{f'{self.ordering_field}__gte': valor}) &
+                (Q(**{f'{self.ordering_field}__gt': valor}) | Q(id__gt=pk))
+            )
+
+        rows = list(page_qs.values(*fields)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        data.update({
+            'results': rows,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': self.encode_cursor(rows[-1]) if has_more else None,
+        })
+        return data
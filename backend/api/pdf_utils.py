@@ -0,0 +1,123 @@
+# api/pdf_utils.py
+import zlib
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Fuentes estándar de PDF (no se incrustan): nombre reportlab -> recurso de la página
+FONTS = {
+    'Helvetica': b'F1',
+    'Helvetica-Bold': b'F2',
+}
+
+def _num(value):
+    texto = f"{value:.2f}".rstrip('0').rstrip('.')
+    return (texto if texto not in ('', '-0') else '0').encode('ascii')
+
+def _pdf_string(text):
+    # WinAnsiEncoding (cp1252) cubre los acentos y la ñ del español
+    data = str(text).encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+class StreamingPDFCanvas:
+    """
+    Canvas mínimo, compatible con el subconjunto de `reportlab.pdfgen.canvas.Canvas`
+    que usan los reportes (setFont, drawString, drawRightString, line, showPage, save).
+
+    A diferencia de reportlab, que guarda todas las páginas hasta `save()`, cada página
+    se serializa (comprimida) al llamar a `showPage()` y sus bytes se recogen con
+    `read()`. La memoria depende del tamaño de una página, no del documento.
+    Solo la tabla de offsets (xref) crece: unos bytes por página.
+    """
+
+    def __init__(self, pagesize=letter):
+        self.width, self.height = pagesize
+        self._pending = []
+        self._offset = 0
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3 + len(FONTS)  # 1: Catalog, 2: Pages, 3..: fuentes
+        self._ops = []
+        self._font = ('Helvetica', 12)
+
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._font_ids = {}
+        for font_id, (name, resource) in enumerate(FONTS.items(), start=3):
+            self._font_ids[resource] = font_id
+            self._write_object(font_id, (
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /' + name.encode('ascii') +
+                b' /Encoding /WinAnsiEncoding >>'
+            ))
+        self._resources = b'<< /Font << ' + b' '.join(
+            b'/%s %d 0 R' % (resource, font_id) for resource, font_id in self._font_ids.items()
+        ) + b' >> >>'
+
+    # --- Salida ---
+
+    def _write(self, data):
+        self._pending.append(data)
+        self._offset += len(data)
+
+    def _write_object(self, object_id, body):
+        self._offsets[object_id] = self._offset
+        self._write(b'%d 0 obj\n' % object_id + body + b'\nendobj\n')
+
+    def _new_id(self):
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def read(self):
+        """Devuelve (y descarta) los bytes generados desde la última llamada."""
+        data = b''.join(self._pending)
+        self._pending = []
+        return data
+
+    # --- API tipo reportlab ---
+
+    def setFont(self, name, size):
+        if name not in FONTS:
+            raise ValueError(f"Fuente no soportada: {name}")
+        self._font = (name, size)
+
+    def drawString(self, x, y, text):
+        name, size = self._font
+        self._ops.append(
+            b'BT /' + FONTS[name] + b' ' + _num(size) + b' Tf ' + _num(x) + b' ' + _num(y) +
+            b' Td (' + _pdf_string(text) + b') Tj ET'
+        )
+
+    def drawRightString(self, x, y, text):
+        name, size = self._font
+        self.drawString(x - stringWidth(str(text), name, size), y, text)
+
+    def line(self, x1, y1, x2, y2):
+        self._ops.append(_num(x1) + b' ' + _num(y1) + b' m ' + _num(x2) + b' ' + _num(y2) + b' l S')
+
+    def showPage(self):
+        content = zlib.compress(b'\n'.join(self._ops))
+        self._ops = []
+        content_id = self._new_id()
+        self._write_object(content_id, (
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream'
+        ))
+        page_id = self._new_id()
+        self._write_object(page_id, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 ' + _num(self.width) + b' ' + _num(self.height) +
+            b'] /Resources ' + self._resources + b' /Contents %d 0 R >>' % content_id
+        ))
+        self._page_ids.append(page_id)
+
+    def save(self):
+        # Como reportlab: la página en curso solo se emite si tiene contenido
+        if self._ops or not self._page_ids:
+            self.showPage()
+
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        self._write_object(2, b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(self._page_ids))
+
+        xref_offset = self._offset
+        total = self._next_id
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % total)
+        self._write(b''.join(b'%010d 00000 n \n' % self._offsets[i] for i in range(1, total)))
+        self._write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (total, xref_offset))
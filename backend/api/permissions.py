@@ -1,5 +1,62 @@
 # api/permissions.py
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import permissions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- [NUEVO] Resolver de permisos por usuario (memo por request + caché compartida) ---
+PERMISSIONS_CACHE_PREFIX = 'permisos:user'
+
+def _http_request(request):
+    """Devuelve el HttpRequest de Django subyacente (DRF envuelve el original en `_request`)."""
+    return getattr(request, '_request', request)
+
+def permissions_cache_key(user_id):
+    return f"{PERMISSIONS_CACHE_PREFIX}:{user_id}"
+
+def load_user_permissions(user):
+    """
+    Devuelve el conjunto (frozenset) de nombres de permisos que el usuario obtiene
+    a través de los roles de su empleado. Se consulta la caché compartida primero y,
+    si no está, se resuelve con UNA sola consulta.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    key = permissions_cache_key(user.pk)
+    permisos = cache.get(key)
+    if permisos is None:
+        from .models import Permisos  # Import local para evitar ciclos con models/serializers
+        permisos = frozenset(
+            Permisos.objects.filter(roles__empleado__usuario_id=user.pk)
+            .values_list('nombre', flat=True)
+            .distinct()
+        )
+        cache.set(key, permisos, getattr(settings, 'PERMISSIONS_CACHE_TIMEOUT', 300))
+    return permisos
+
+def get_user_permissions(request):
+    """
+    Igual que `load_user_permissions`, pero memoizado en el request: todas las
+    comprobaciones de una misma petición comparten el mismo conjunto.
+    """
+    http_request = _http_request(request)
+    user = request.user
+    cached = getattr(http_request, '_permisos_cache', None)
+    if cached is not None and cached[0] == user.pk:
+        return cached[1]
+
+    permisos = load_user_permissions(user)
+    http_request._permisos_cache = (user.pk, permisos)
+    return permisos
+
+def invalidate_user_permissions(user_ids):
+    """Borra de la caché compartida los permisos de los usuarios indicados."""
+    keys = [permissions_cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
 
 class HasPermission(permissions.BasePermission):
     """
@@ -24,17 +81,10 @@ class HasPermission(permissions.BasePermission):
             return False
 
         try:
-            empleado = request.user.empleado
-            # Check if any role assigned to the employee has the required permission
-            # Note: This requires optimizing permission lookup if performance becomes an issue
-            # (e.g., caching permissions per user session)
-            has_perm = empleado.roles.filter(permisos__nombre=self.required_permission).exists()
-            # print(f"DEBUG: Checking {self.required_permission} for {request.user}: {has_perm}") # Optional debug
-            return has_perm
-        except AttributeError: # Handle cases where user might not have 'empleado' linked yet
-             return False
+            # Búsqueda en el conjunto precargado (sin SQL adicional en la misma petición)
+            return self.required_permission in get_user_permissions(request)
         except Exception as e: # Catch other potential errors
-             print(f"ERROR checking permission {self.required_permission}: {e}")
+             logger.error(f"ERROR checking permission {self.required_permission}: {e}")
              return False
 
     # Optional: Implement has_object_permission if you need row-level checks
@@ -44,4 +94,4 @@ class HasPermission(permissions.BasePermission):
 def check_permission(request, view, permission_name):
     """ Instantiates and checks HasPermission """
     checker = HasPermission(permission_name)
-    return checker.has_permission(request, view)
\ No newline at end of file
+    return checker.has_permission(request, view)
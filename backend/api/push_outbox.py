@@ -0,0 +1,115 @@
+# api/push_outbox.py
+import logging
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .fcm_utils import PushMessage, get_transport
+from .models import Empleado, PushOutbox
+
+logger = logging.getLogger(__name__)
+
+# Mensajes por transacción del dispatcher
+OUTBOX_BATCH_SIZE = 100
+
+def calcular_backoff(intentos):
+    """
+    Espera antes del intento número `intentos + 1`: exponencial desde
+    PUSH_RETRY_BASE_SECONDS con tope PUSH_RETRY_MAX_SECONDS, y jitter sobre la
+    mitad superior para que los mensajes caídos juntos no reintenten juntos.
+    """
+    base = getattr(settings, 'PUSH_RETRY_BASE_SECONDS', 30)
+    tope = getattr(settings, 'PUSH_RETRY_MAX_SECONDS', 3600)
+    espera = min(tope, base * 2 ** max(0, intentos - 1))
+    return timedelta(seconds=espera / 2 + random.uniform(0, espera / 2))
+
+def construir_push(destinatario_id, fcm_token, titulo, cuerpo, data=None):
+    """PushOutbox sin guardar (para bulk_create)."""
+    return PushOutbox(
+        destinatario_id=destinatario_id,
+        fcm_token=fcm_token,
+        titulo=titulo,
+        cuerpo=cuerpo,
+        # FCM solo acepta valores string en el payload de datos
+        data={str(k): str(v) for k, v in (data or {}).items()},
+    )
+
+def encolar_push(destinatario, fcm_token, titulo, cuerpo, data=None):
+    """
+    Registra la notificación push en el outbox, dentro de la transacción en curso:
+    si la operación hace rollback, el push tampoco sale. No hace I/O de red; el
+    envío lo hace `despachar_pendientes` (manage.py dispatch_outbox) tras el commit.
+    """
+    if not fcm_token:
+        return None
+    push = construir_push(destinatario.pk, fcm_token, titulo, cuerpo, data)
+    push.save()
+    return push
+
+def encolar_pushes(pushes):
+    """Varios pushes (de construir_push) en un solo INSERT."""
+    return PushOutbox.objects.bulk_create(pushes)
+
+def podar_tokens_invalidos(tokens):
+    """
+    Borra de los empleados los tokens que Firebase dio por no registrados: no vuelven
+    a costar una llamada. Los pushes pendientes para esos tokens se descartan.
+    """
+    tokens = set(tokens)
+    if not tokens:
+        return 0
+    podados = Empleado.objects.filter(fcm_token__in=tokens).update(fcm_token=None)
+    PushOutbox.objects.filter(fcm_token__in=tokens, estado='PENDIENTE').update(
+        estado='ERROR', error='Token FCM no registrado.'
+    )
+    logger.info(f"Tokens FCM no registrados eliminados: {len(tokens)} ({podados} empleados).")
+    return podados
+
+def despachar_pendientes(limite=OUTBOX_BATCH_SIZE, transport=None):
+    """
+    Envía hasta `limite` pushes pendientes cuyo próximo intento ya venció, en un solo
+    lote del transporte (send_each de FCM). SKIP LOCKED permite varios dispatchers
+    sin enviar dos veces el mismo mensaje.
+
+    Un fallo transitorio vuelve a PENDIENTE con backoff (calcular_backoff); tras
+    PUSH_MAX_ATTEMPTS intentos pasa a FALLIDO (dead-letter). Un token no registrado
+    es un fallo definitivo (ERROR). Devuelve (enviados, fallidos).
+    """
+    transport = transport or get_transport()
+    max_intentos = getattr(settings, 'PUSH_MAX_ATTEMPTS', 8)
+    enviados = fallidos = 0
+    tokens_invalidos = set()
+    with transaction.atomic():
+        lote = list(
+            PushOutbox.objects.select_for_update(skip_locked=True)
+            .filter(estado='PENDIENTE', proximo_intento__lte=timezone.now())
+            .order_by('proximo_intento')[:limite]
+        )
+        if not lote:
+            return 0, 0
+        resultados = transport.send_batch([
+            PushMessage(mensaje.fcm_token, mensaje.titulo, mensaje.cuerpo, mensaje.data) for mensaje in lote
+        ])
+        ahora = timezone.now()
+        for mensaje, resultado in zip(lote, resultados):
+            mensaje.intentos += 1
+            if resultado.success:
+                mensaje.estado = 'ENVIADO'
+                mensaje.fecha_envio = ahora
+                mensaje.error = None
+                enviados += 1
+                continue
+            fallidos += 1
+            mensaje.error = resultado.error
+            if resultado.token_invalid:
+                mensaje.estado = 'ERROR'
+                tokens_invalidos.add(mensaje.fcm_token)
+            elif mensaje.intentos >= max_intentos:
+                logger.error(f"Push {mensaje.id} para {mensaje.destinatario_id} descartado tras {mensaje.intentos} intentos: {resultado.error}")
+                mensaje.estado = 'FALLIDO'
+            else:
+                mensaje.proximo_intento = ahora + calcular_backoff(mensaje.intentos)
+        PushOutbox.objects.bulk_update(lote, ['estado', 'intentos', 'proximo_intento', 'fecha_envio', 'error'])
+        podar_tokens_invalidos(tokens_invalidos)
+    return enviados, fallidos
@@ -0,0 +1,99 @@
+# api/report_cache.py
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .report_query import uses_relative_dates
+
+# --- Caché de resultados de reportes por empresa ---
+# Las claves incluyen la "versión de escritura" de la empresa: cada cambio en sus
+# activos o catálogos la incrementa (ver signals.py) y deja huérfanas todas las
+# entradas anteriores, que expiran solas. No hay que buscar ni borrar claves.
+REPORT_CACHE_PREFIX = 'reportes'
+GLOBAL_SCOPE = 'global'  # Consultas de staff sin empresa: ven activos de todas
+
+def _version_key(scope):
+    return f"{REPORT_CACHE_PREFIX}:version:{scope}"
+
+def report_scope(empresa_id, is_staff=False):
+    """Ámbito de caché del reporte, o None si la consulta no se cachea."""
+    if empresa_id is not None:
+        return empresa_id
+    return GLOBAL_SCOPE if is_staff else None
+
+def get_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # add() no pisa el valor si otro proceso lo creó entretanto
+        cache.add(_version_key(scope), 1, timeout=None)
+        version = cache.get(_version_key(scope), 1)
+    return version
+
+def bump_version(empresa_id):
+    """Invalida los resultados cacheados de la empresa (y los globales de staff)."""
+    for scope in (empresa_id, GLOBAL_SCOPE):
+        if scope is None:
+            continue
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            # Sin versión aún: nada cacheado que invalidar
+            cache.add(_version_key(scope), 1, timeout=None)
+
+def normalize_filters(filters):
+    """
+    Los filtros se combinan con AND: el orden, los duplicados y los espacios
+    sobrantes no cambian el resultado, así que no deben cambiar la clave.
+    """
+    normalized = {' '.join(str(f).split()) for f in filters}
+    normalized.discard('')
+    return sorted(normalized)
+
+def report_cache_key(scope, filters, shape):
+    normalized = normalize_filters(filters)
+    # "hoy" o "este_mes" cambian de período a medianoche: con fechas relativas el día
+    # forma parte de la clave y las entradas de ayer dejan de usarse
+    today = timezone.localdate() if uses_relative_dates(normalized) else None
+    payload = json.dumps([normalized, shape, today], sort_keys=True, cls=DjangoJSONEncoder)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f"{REPORT_CACHE_PREFIX}:{scope}:v{get_version(scope)}:{digest}"
+
+def cached_report_result(scope, filters, shape, compute):
+    """
+    Devuelve el resultado cacheado para (empresa, filtros normalizados, forma de salida)
+    o lo calcula con `compute()` y lo guarda. `shape` distingue las distintas salidas
+    de una misma consulta (ids, página de vista previa, ...).
+    """
+    if scope is None:
+        return compute()
+    key = report_cache_key(scope, filters, shape)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        if result is not None:
+            cache.set(key, result, getattr(settings, 'REPORT_CACHE_TIMEOUT', 600))
+    return result
+
+def filter_report_queryset(scope, filters, base_queryset, build):
+    """
+    Aplica `build(filters, base_queryset)` reutilizando los ids ya calculados para los
+    mismos filtros: la vista previa y la exportación posterior evalúan la búsqueda una
+    sola vez. Con más de REPORT_CACHE_MAX_IDS filas se usa la consulta original: un
+    `pk IN (...)` enorme pesa en la caché y en el planificador más que repetir la búsqueda
+    (las páginas y totales de esas consultas ya se cachean aparte).
+    """
+    max_ids = getattr(settings, 'REPORT_CACHE_MAX_IDS', 2000)
+
+    def compute_ids():
+        ids = list(build(filters, base_queryset).order_by().values_list('pk', flat=True)[:max_ids + 1])
+        # False: demasiadas filas. Se cachea igual para no repetir el recorrido.
+        return ids if len(ids) <= max_ids else False
+
+    if scope is None:
+        return build(filters, base_queryset)
+    ids = cached_report_result(scope, filters, 'ids', compute_ids)
+    if ids is False:
+        return build(filters, base_queryset)
+    return base_queryset.filter(pk__in=ids)
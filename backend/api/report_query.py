@@ -0,0 +1,427 @@
+# api/report_query.py
+import calendar
+import datetime
+import logging
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from django.db.models import Q
+from django.utils import timezone
+from .models import ActivoFijo, CategoriaActivo, Departamento, Estado, Proveedor, Ubicacion
+from .search_utils import search_filter_value
+
+logger = logging.getLogger(__name__)
+
+def report_base_queryset(empresa_id=None, is_staff=False):
+    """
+    Activos sobre los que se aplican los filtros del reporte dinámico:
+    los de la empresa, todos si es staff sin empresa, o ninguno.
+    """
+    if empresa_id is not None:
+        # Precargar todos los campos relacionados que podamos necesitar
+        return ActivoFijo.objects.filter(empresa_id=empresa_id).select_related(
+            'departamento', 'ubicacion', 'categoria', 'estado', 'proveedor'
+        )
+    if is_staff:
+        return ActivoFijo.objects.all().select_related(
+            'departamento', 'ubicacion', 'categoria', 'estado', 'proveedor'
+        )
+    return ActivoFijo.objects.none()
+
+# --- Lenguaje de filtros del reporte dinámico ---
+#
+# Cada filtro de la lista es una expresión; los filtros de la lista se combinan con AND.
+#
+#   laptop                      texto libre (documento de búsqueda, índice trigram)
+#   "laptop dell"               frase exacta
+#   depto:TI                    contiene (sin mayúsculas); `=` exacto, `!=` distinto
+#   depto:Recursos Humanos      sin comillas, el valor llega hasta el siguiente AND/OR/NOT,
+#                               paréntesis o `campo:` (como antes del lenguaje)
+#   valor>500  valor<=1000      comparaciones numéricas y de fecha (>, <, >=, <=)
+#   valor:100..500              rango inclusivo (`..500` o `100..` para abiertos)
+#   estado:(baja, reparacion)   lista (IN); `estado=(...)` exige nombre exacto
+#   fecha_adq:este_mes          palabras clave: hoy, ayer, esta_semana, semana_pasada,
+#                               este_mes, mes_pasado, este_anio, anio_pasado, ultimos_N_dias
+#   fecha_adq:2024  fecha_adq:2024-03  fecha_adq>=2024-03-15
+#   laptop OR tablet            OR, AND (implícito), NOT o prefijo `-`, paréntesis
+#
+# Un apóstrofo sin cerrar es un carácter más (O'Brien); '...' completo es una frase.
+
+class FilterSyntaxError(ValueError):
+    """Filtro mal formado: la vista responde 400 con el mensaje."""
+
+Token = namedtuple('Token', 'kind value')
+
+TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<range>\.\.)
+  | (?P<op>>=|<=|!=|[:=<>])
+  | (?P<word>(?:[^\s()",:=<>!.]|\.(?!\.)|!(?!=))+)
+''', re.VERBOSE)
+
+KEYWORDS = {'AND': 'and', 'OR': 'or', 'NOT': 'not'}
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            fragmento = text[pos:pos + 10]
+            if fragmento[0] == '"':
+                raise FilterSyntaxError(f"Comilla sin cerrar en '{text}'.")
+            raise FilterSyntaxError(f"Carácter no válido cerca de '{fragmento}'.")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'ws':
+            continue
+        value = match.group()
+        if kind == 'word' and value.upper() in KEYWORDS:
+            kind, value = KEYWORDS[value.upper()], value.upper()
+        tokens.append(Token(kind, value))
+    return tuple(tokens)
+
+# --- AST ---
+And = namedtuple('And', 'children')
+Or = namedtuple('Or', 'children')
+Not = namedtuple('Not', 'child')
+Text = namedtuple('Text', 'value')
+Predicate = namedtuple('Predicate', 'field op value')
+Range = namedtuple('Range', 'low high')
+InList = namedtuple('InList', 'values')
+
+class _Parser:
+    """
+    Descenso recursivo. Precedencia: NOT > AND (implícito) > OR.
+
+        expr      := and_expr (OR and_expr)*
+        and_expr  := not_expr ([AND] not_expr)*
+        not_expr  := (NOT | '-') not_expr | atom
+        atom      := '(' expr ')' | STRING | WORD [op value]
+        value     := scalar | scalar '..' [scalar] | '..' scalar | '(' scalar (',' scalar)* ')'
+        scalar    := STRING | WORD+            (las palabras no pueden iniciar otro `campo<op>`)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise FilterSyntaxError("Expresión incompleta.")
+        self.i += 1
+        return token
+
+    def expect(self, kind, descripcion):
+        token = self.peek()
+        if token is None or token.kind != kind:
+            encontrado = f"'{token.value}'" if token else 'el final'
+            raise FilterSyntaxError(f"Se esperaba {descripcion} y se encontró {encontrado}.")
+        return self.next()
+
+    def parse(self):
+        node = self.parse_or()
+        token = self.peek()
+        if token is not None:
+            raise FilterSyntaxError(f"Símbolo inesperado '{token.value}'.")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() and self.peek().kind == 'or':
+            self.next()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else Or(tuple(nodes))
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek() and self.peek().kind not in ('or', 'rparen'):
+            if self.peek().kind == 'and':
+                self.next()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else And(tuple(nodes))
+
+    def parse_not(self):
+        token = self.peek()
+        if token and token.kind == 'not':
+            self.next()
+            return Not(self.parse_not())
+        if token and token.kind == 'word' and token.value.startswith('-') and len(token.value) > 1:
+            # "-laptop", "-estado:baja": el prefijo niega el átomo que sigue
+            self.tokens[self.i] = Token('word', token.value[1:])
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.next()
+        if token.kind == 'lparen':
+            node = self.parse_or()
+            self.expect('rparen', "')'")
+            return node
+        if token.kind == 'string':
+            return Text(token.value[1:-1])
+        if token.kind == 'word':
+            if self.peek() and self.peek().kind == 'op':
+                return self.parse_predicate(token.value.lower(), self.next().value)
+            return Text(token.value)
+        raise FilterSyntaxError(f"Símbolo inesperado '{token.value}'.")
+
+    def parse_predicate(self, field, op):
+        if field not in FILTER_FIELDS:
+            raise FilterSyntaxError(
+                f"Campo desconocido '{field}'. Use uno de: {', '.join(FILTER_FIELDS)}."
+            )
+        token = self.peek()
+        if token and token.kind == 'lparen':
+            self.next()
+            values = [self.parse_scalar()]
+            while self.peek() and self.peek().kind == 'comma':
+                self.next()
+                values.append(self.parse_scalar())
+            self.expect('rparen', "')' al cerrar la lista")
+            return Predicate(field, op, InList(tuple(values)))
+        if token and token.kind == 'range':
+            self.next()
+            return Predicate(field, op, Range(None, self.parse_scalar()))
+
+        value = self.parse_scalar()
+        if self.peek() and self.peek().kind == 'range':
+            self.next()
+            high = self.parse_scalar() if self.peek() and self.peek().kind in ('word', 'string') else None
+            return Predicate(field, op, Range(value, high))
+        if self.peek() and self.peek().kind == 'comma':
+            # Lista sin paréntesis: estado:baja,reparacion
+            values = [value]
+            while self.peek() and self.peek().kind == 'comma':
+                self.next()
+                values.append(self.parse_scalar())
+            return Predicate(field, op, InList(tuple(values)))
+        return Predicate(field, op, value)
+
+    def parse_scalar(self):
+        token = self.peek()
+        if token is None or token.kind not in ('word', 'string'):
+            encontrado = f"'{token.value}'" if token else 'el final'
+            raise FilterSyntaxError(f"Se esperaba un valor y se encontró {encontrado}.")
+        self.next()
+        if token.kind == 'string':
+            return token.value[1:-1]
+        # Sin comillas, el valor sigue hasta el próximo AND/OR/NOT, paréntesis, coma,
+        # rango o `campo<op>`: "depto:Recursos Humanos" es un solo valor
+        words = [token.value]
+        while self.peek() and self.peek().kind == 'word' and not self.starts_predicate():
+            words.append(self.next().value)
+        return ' '.join(words)
+
+    def starts_predicate(self):
+        siguiente = self.tokens[self.i + 1] if self.i + 1 < len(self.tokens) else None
+        return siguiente is not None and siguiente.kind == 'op'
+
+# --- Compilación a Q ---
+
+# Clave del filtro -> (campo de ActivoFijo, tipo). Los catálogos se filtran por nombre
+# con una subconsulta sobre el catálogo: `<fk>_id IN (SELECT id ... WHERE nombre ...)`
+# usa el índice de la FK en vez de un JOIN por cada fila del activo.
+FILTER_FIELDS = {
+    'depto': ('departamento', Departamento),
+    'categoria': ('categoria', CategoriaActivo),
+    'ubicacion': ('ubicacion', Ubicacion),
+    'estado': ('estado', Estado),
+    'proveedor': ('proveedor', Proveedor),
+    'nombre': ('nombre', 'text'),
+    'codigo': ('codigo_interno', 'text'),
+    'valor': ('valor_actual', 'number'),
+    'fecha_adq': ('fecha_adquisicion', 'date'),
+}
+
+# Orden de los predicados dentro de un AND: primero los que resuelve un índice b-tree
+# (rangos de fecha/valor), luego las subconsultas a catálogos y al final las búsquedas
+# de texto (LIKE/trigram), que solo recorren las filas que quedan.
+COSTE_RANGO, COSTE_CATALOGO, COSTE_TEXTO_CAMPO, COSTE_TEXTO_LIBRE = 0, 1, 2, 3
+
+Plan = namedtuple('Plan', 'q cost')
+
+TEXT_OPS = {':': 'icontains', '=': 'iexact', '!=': 'iexact'}
+COMPARISON_OPS = {'>': 'gt', '<': 'lt', '>=': 'gte', '<=': 'lte'}
+
+def _text_q(field, op, value):
+    if op not in TEXT_OPS:
+        raise FilterSyntaxError(f"Operador '{op}' no válido para un campo de texto (use :, = o !=).")
+    if isinstance(value, Range):
+        raise FilterSyntaxError("Los rangos (a..b) solo se admiten en valor y fecha_adq.")
+    values = value.values if isinstance(value, InList) else (value,)
+    q = Q()
+    for v in values:
+        q |= Q(**{f'{field}__{TEXT_OPS[op]}': v})
+    return q
+
+def _number(value):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise FilterSyntaxError(f"'{value}' no es un número válido.")
+
+def _number_bounds(value):
+    number = _number(value)
+    return number, number
+
+def _month_bounds(year, month):
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+# Palabras clave cuyo período depende del día en que se evalúa el filtro
+RELATIVE_DATE_RE = re.compile(
+    r'\b(hoy|ayer|esta_semana|semana_pasada|este_mes|mes_pasado|este_a(ni|ñ)o|a(ni|ñ)o_pasado|ultimos_\d+_dias)\b',
+    re.IGNORECASE,
+)
+
+def uses_relative_dates(filters):
+    """True si algún filtro usa fechas relativas (hoy, este_mes, ultimos_N_dias, ...)."""
+    return any(RELATIVE_DATE_RE.search(str(f)) for f in filters)
+
+def _date_bounds(value, today):
+    """Convierte un valor de fecha en el período (inicio, fin) que representa."""
+    texto = value.lower()
+    if texto == 'hoy':
+        return today, today
+    if texto == 'ayer':
+        ayer = today - datetime.timedelta(days=1)
+        return ayer, ayer
+    if texto in ('esta_semana', 'semana_pasada'):
+        inicio = today - datetime.timedelta(days=today.weekday())
+        if texto == 'semana_pasada':
+            inicio -= datetime.timedelta(days=7)
+        return inicio, inicio + datetime.timedelta(days=6)
+    if texto == 'este_mes':
+        return _month_bounds(today.year, today.month)
+    if texto == 'mes_pasado':
+        ultimo = today.replace(day=1) - datetime.timedelta(days=1)
+        return _month_bounds(ultimo.year, ultimo.month)
+    if texto in ('este_anio', 'este_año'):
+        return datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)
+    if texto in ('anio_pasado', 'año_pasado'):
+        return datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)
+    match = re.fullmatch(r'ultimos_(\d+)_dias', texto)
+    if match:
+        return today - datetime.timedelta(days=int(match.group(1)) - 1), today
+    try:
+        if re.fullmatch(r'\d{4}', texto):
+            return datetime.date(int(texto), 1, 1), datetime.date(int(texto), 12, 31)
+        if re.fullmatch(r'\d{4}-\d{1,2}', texto):
+            year, month = map(int, texto.split('-'))
+            return _month_bounds(year, month)
+        fecha = datetime.datetime.strptime(texto, '%Y-%m-%d').date()
+        return fecha, fecha
+    except ValueError:
+        raise FilterSyntaxError(
+            f"'{value}' no es una fecha válida (use AAAA-MM-DD, AAAA-MM, AAAA o una palabra clave como este_mes)."
+        )
+
+def _ordered_q(field, op, value, bounds):
+    """Predicados de valor y fecha: cada valor es un período [inicio, fin]."""
+    if isinstance(value, InList):
+        if op not in TEXT_OPS:
+            raise FilterSyntaxError("Las listas solo admiten los operadores :, = o !=.")
+        q = Q()
+        for v in value.values:
+            q |= _ordered_q(field, '=', v, bounds)
+        return ~q if op == '!=' else q
+    if isinstance(value, Range):
+        if op not in (':', '='):
+            raise FilterSyntaxError("Los rangos (a..b) se escriben con ':' o '=' (ej: valor:100..500).")
+        q = Q()
+        if value.low is not None:
+            q &= Q(**{f'{field}__gte': bounds(value.low)[0]})
+        if value.high is not None:
+            q &= Q(**{f'{field}__lte': bounds(value.high)[1]})
+        return q
+
+    inicio, fin = bounds(value)
+    if op in (':', '=', '!='):
+        q = Q(**{field: inicio}) if inicio == fin else Q(**{f'{field}__range': (inicio, fin)})
+        return ~q if op == '!=' else q
+    # > y <= comparan con el final del período; < y >= con el inicio
+    limite = fin if op in ('>', '<=') else inicio
+    return Q(**{f'{field}__{COMPARISON_OPS[op]}': limite})
+
+def _compile_predicate(node, today):
+    field, kind = FILTER_FIELDS[node.field]
+    if kind == 'text':
+        return Plan(_text_q(field, node.op, node.value), COSTE_TEXTO_CAMPO)
+    if kind == 'number':
+        return Plan(_ordered_q(field, node.op, node.value, _number_bounds), COSTE_RANGO)
+    if kind == 'date':
+        return Plan(_ordered_q(field, node.op, node.value, lambda v: _date_bounds(v, today)), COSTE_RANGO)
+
+    # Catálogo: la condición sobre el nombre se evalúa en el catálogo (tabla pequeña)
+    negado = node.op == '!='
+    op = '=' if negado else node.op
+    catalogo_ids = kind.objects.filter(_text_q('nombre', op, node.value)).values('pk')
+    q = Q(**{f'{field}_id__in': catalogo_ids})
+    return Plan(~q if negado else q, COSTE_CATALOGO)
+
+def _compile_node(node, today):
+    if isinstance(node, Text):
+        return Plan(Q(search_document__contains=search_filter_value(node.value)), COSTE_TEXTO_LIBRE)
+    if isinstance(node, Predicate):
+        return _compile_predicate(node, today)
+    if isinstance(node, Not):
+        plan = _compile_node(node.child, today)
+        return Plan(~plan.q, plan.cost)
+    plans = [_compile_node(child, today) for child in node.children]
+    if isinstance(node, And):
+        plans.sort(key=lambda plan: plan.cost)
+        q = Q()
+        for plan in plans:
+            q &= plan.q
+        return Plan(q, plans[0].cost)
+    q = Q()
+    for plan in plans:
+        q |= plan.q
+    # Un OR cuesta lo que su rama más cara
+    return Plan(q, max(plan.cost for plan in plans))
+
+@lru_cache(maxsize=512)
+def _compile_tokens(tokens, today):
+    # La fecha forma parte de la clave: "hoy" o "este_mes" cambian de un día a otro
+    return _compile_node(_Parser(tokens).parse(), today)
+
+def compile_filter(text):
+    """
+    Compila una expresión de filtro a un Plan (Q, coste). El plan se cachea por
+    expresión normalizada (sus tokens), así que espacios o mayúsculas en las
+    palabras clave no generan entradas distintas.
+    """
+    if not isinstance(text, str):
+        raise FilterSyntaxError("Cada filtro debe ser un texto.")
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    return _compile_tokens(tokens, timezone.localdate())
+
+def validate_filters(filters_list):
+    """Lanza FilterSyntaxError si algún filtro no compila."""
+    for f in filters_list:
+        compile_filter(f)
+
+def parse_and_build_query(filters_list, base_queryset):
+    """
+    Toma una lista de expresiones de filtro (ej: ["depto:TI", "laptop OR tablet",
+    "valor:500..1000"]), las compila y las aplica (con AND) al queryset base.
+    Lanza FilterSyntaxError si alguna está mal formada.
+    """
+    plans = [plan for plan in (compile_filter(f) for f in filters_list) if plan is not None]
+    plans.sort(key=lambda plan: plan.cost)
+    q_objects = Q()
+    for plan in plans:
+        q_objects &= plan.q
+    # Sin .distinct(): los filtros de catálogo son subconsultas, no joins; no duplican filas.
+    return base_queryset.filter(q_objects)
@@ -1,151 +1,288 @@
 # api/report_utils.py
 
+import csv
+import importlib.util
 import io
 import logging
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font
-from reportlab.pdfgen import canvas
+from itertools import chain, islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
+from .pdf_utils import StreamingPDFCanvas
+from .xlsx_utils import ChunkBuffer, StreamingXLSXWriter
 
 # Configurar logger (opcional pero bueno para depurar)
 logger = logging.getLogger(__name__)
 
+# Columnas del reporte de activos: (campo ORM para values_list, encabezado Excel)
+REPORT_COLUMNS = [
+    ('nombre', 'Nombre'),
+    ('codigo_interno', 'Código Interno'),
+    ('ubicacion__nombre', 'Ubicación'),
+    ('categoria__nombre', 'Categoría'),
+    ('departamento__nombre', 'Departamento'),
+    ('fecha_adquisicion', 'Fecha Adquisición'),
+    ('valor_actual', 'Valor Actual (Bs.)'),
+    ('estado__nombre', 'Estado'),
+]
+REPORT_FIELDS = [campo for campo, _ in REPORT_COLUMNS]
+
+REPORT_CHUNK_SIZE = 2000           # Filas por viaje al servidor (cursor del lado del servidor)
+EXCEL_WIDTH_SAMPLE_ROWS = 1000     # Filas usadas para calcular el ancho de columnas
+STREAM_BLOCK_SIZE = 64 * 1024      # Tamaño de cada bloque enviado al cliente
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def iter_report_rows(queryset, chunk_size=REPORT_CHUNK_SIZE):
+    """
+    Filas del reporte como tuplas en el orden de REPORT_COLUMNS.
+    values_list + iterator: sin instancias del ORM ni caché del queryset en memoria.
+    """
+    return queryset.values_list(*REPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+def _excel_value(value):
+    return 'N/A' if value is None else value
+
+def iter_excel_report(rows, headers=None, sheet_title="Reporte de Activos"):
+    """
+    Genera el XLSX por trozos mientras se escriben las filas (StreamingXLSXWriter):
+    el cliente recibe los primeros bytes sin esperar a que el libro esté completo.
+    Por defecto con las columnas del reporte de activos (REPORT_COLUMNS).
+
+    Los anchos de columna van antes de la primera fila, por eso se calculan sobre
+    una muestra inicial (EXCEL_WIDTH_SAMPLE_ROWS) en vez de recorrer todas las celdas.
+    """
+    headers = headers or [header for _, header in REPORT_COLUMNS]
+    rows = iter(rows)
+    sample = list(islice(rows, EXCEL_WIDTH_SAMPLE_ROWS))
+
+    widths = [len(header) for header in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(str(_excel_value(value))))
+
+    try:
+        writer = StreamingXLSXWriter(sheet_title, [width + 2 for width in widths])
+        writer.append(headers, bold=True) # Encabezados en negrita
+        for row in chain(sample, rows):
+            writer.append([_excel_value(value) for value in row])
+            if writer.pending_size >= STREAM_BLOCK_SIZE:
+                yield writer.read()
+        writer.close()
+        yield writer.read()
+    except Exception as e:
+        # Las cabeceras ya se enviaron: solo queda registrar el error
+        logger.error(f"iter_excel_report: Error during generation: {e}", exc_info=True)
+        raise
+
+def write_excel_report(rows, destination, headers=None, sheet_title="Reporte de Activos"):
+    for chunk in iter_excel_report(rows, headers, sheet_title):
+        destination.write(chunk)
+
 def create_excel_report(queryset):
-    """Genera un HttpResponse con el reporte de activos en formato Excel."""
+    """Genera un StreamingHttpResponse con el reporte de activos en formato Excel."""
+    return create_export_response(queryset, 'excel')
+
+# --- PDF ---
+PDF_PAGESIZE = letter
+PDF_HEADERS = ["Nombre", "Código", "Ubicación", "Categoría", "Depto", "Fecha Adq.", "Valor", "Estado"]
+# Ajustar anchos para incluir departamento
+PDF_COL_WIDTHS = [1.8*inch, 0.7*inch, 1.0*inch, 0.9*inch, 0.8*inch, 0.7*inch, 0.7*inch, 0.9*inch]
+PDF_LINE_HEIGHT = 0.25 * inch
+
+def draw_headers(canvas_obj, y_pos, page_width=PDF_PAGESIZE[0]):
+    canvas_obj.setFont('Helvetica-Bold', 10)
+    x_pos = inch
+    for i, header in enumerate(PDF_HEADERS):
+        canvas_obj.drawString(x_pos, y_pos, header)
+        x_pos += PDF_COL_WIDTHS[i]
+    canvas_obj.line(inch, y_pos - 0.1 * inch, page_width - inch, y_pos - 0.1 * inch)
+    return y_pos - 0.25 * inch, PDF_COL_WIDTHS # Devolver nueva Y y anchos
+
+def draw_footer(canvas_obj, page_number, page_width=PDF_PAGESIZE[0]):
+    canvas_obj.setFont('Helvetica', 8)
+    canvas_obj.drawString(inch, 0.75 * inch, f"Página {page_number}")
+    canvas_obj.drawRightString(page_width - inch, 0.75 * inch, "Reporte Generado Automáticamente")
+
+def _pdf_row(row):
+    # Fila de values_list en el orden de REPORT_COLUMNS
+    nombre, codigo, ubicacion, categoria, departamento, fecha, valor, estado = row
+    return [
+        nombre[:22] + '...' if len(nombre) > 22 else nombre,
+        codigo,
+        ubicacion[:14] if ubicacion else 'N/A',
+        categoria[:12] if categoria else 'N/A',
+        departamento[:10] if departamento else 'N/A',
+        str(fecha),
+        f"{valor:.2f}", # Formatear valor
+        estado if estado else 'N/A',
+    ]
+
+def draw_pdf_pages(p, rows):
+    """
+    Dibuja el reporte sobre cualquier canvas con la API de reportlab
+    (canvas.Canvas o StreamingPDFCanvas). Es un generador: cede el control
+    después de cada showPage() para que el llamador pueda enviar la página.
+    """
+    width, height = PDF_PAGESIZE
+    page_num = 1
+    y_position = height - inch # Posición Y actual
+
+    # Título primera página
+    p.setFont('Helvetica-Bold', 16)
+    p.drawString(inch, y_position, "Reporte de Activos Fijos")
+    y_position -= 0.5 * inch
+
+    # Encabezados primera página
+    y_position, column_widths = draw_headers(p, y_position, width)
+    draw_footer(p, page_num, width)
+
+    # Datos
+    p.setFont('Helvetica', 9)
+    for row in rows:
+        # Salto de página si no hay espacio
+        if y_position < inch + PDF_LINE_HEIGHT: # Dejar espacio para el footer
+            p.showPage()
+            yield page_num
+            page_num += 1
+            y_position = height - inch # Reiniciar Y
+            y_position, column_widths = draw_headers(p, y_position, width) # Redibujar headers
+            draw_footer(p, page_num, width) # Redibujar footer
+            p.setFont('Helvetica', 9) # Volver a fuente normal
+
+        x_position = inch
+        for i, item in enumerate(_pdf_row(row)):
+            p.drawString(x_position, y_position, str(item))
+            x_position += column_widths[i]
+        y_position -= PDF_LINE_HEIGHT
+
+def iter_pdf_report(rows):
+    """Genera el PDF por trozos: cada página se emite en cuanto se completa."""
+    p = StreamingPDFCanvas(pagesize=PDF_PAGESIZE)
     try:
-        logger.debug("create_excel_report: Starting Excel generation...")
-        buffer = io.BytesIO()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Activos"
-
-        # Encabezados
-        headers = ["Nombre", "Código Interno", "Ubicación", "Categoría", "Departamento", "Fecha Adquisición", "Valor Actual (Bs.)", "Estado"]
-        ws.append(headers)
-        for cell in ws[1]: # Poner encabezados en negrita
-            cell.font = Font(bold=True)
-
-        # Añadir datos
-        for activo in queryset:
-            ws.append([
-                activo.nombre,
-                activo.codigo_interno,
-                activo.ubicacion.nombre if activo.ubicacion else 'N/A',
-                activo.categoria.nombre if activo.categoria else 'N/A',
-                activo.departamento.nombre if hasattr(activo, 'departamento') and activo.departamento else 'N/A', # Si departamento está en queryset
-                activo.fecha_adquisicion,
-                activo.valor_actual,
-                activo.estado.nombre if activo.estado else 'N/A'
-            ])
-
-        # Ajustar ancho de columnas (opcional)
-        for col in ws.columns:
-             max_length = 0
-             column = col[0].column_letter # Get the column name
-             for cell in col:
-                 try: # Necesario para manejar celdas vacías o tipos mixtos
-                     if len(str(cell.value)) > max_length:
-                         max_length = len(str(cell.value))
-                 except:
-                     pass
-             adjusted_width = (max_length + 2)
-             ws.column_dimensions[column].width = adjusted_width
-
-        wb.save(buffer)
-        buffer.seek(0)
-        logger.debug(f"create_excel_report: Buffer size = {buffer.getbuffer().nbytes} bytes.")
-
-        response = HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="reporte_activos.xlsx"'
-        logger.info("create_excel_report: Response created successfully.")
-        return response
+        for _ in draw_pdf_pages(p, rows):
+            yield p.read()
+        p.save()
+        yield p.read()
     except Exception as e:
-         logger.error(f"create_excel_report: Error during generation: {e}", exc_info=True)
-         # Re-lanzar para que la vista lo capture como 500
-         raise
+        # Las cabeceras ya se enviaron: solo queda registrar el error
+        logger.error(f"iter_pdf_report: Error during generation: {e}", exc_info=True)
+        raise
+
+def write_pdf_report(rows, destination):
+    for chunk in iter_pdf_report(rows):
+        destination.write(chunk)
 
 def create_pdf_report(queryset):
-    """Genera un HttpResponse con el reporte de activos en formato PDF."""
-    try:
-        logger.debug("create_pdf_report: Starting PDF generation...")
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-
-        # Título y configuración inicial
-        page_num = 1
-        y_position = height - inch # Posición Y actual
-
-        def draw_headers(canvas_obj, y_pos):
-            canvas_obj.setFont('Helvetica-Bold', 10)
-            x_pos = inch
-            headers = ["Nombre", "Código", "Ubicación", "Categoría", "Depto", "Fecha Adq.", "Valor", "Estado"]
-            # Ajustar anchos para incluir departamento
-            col_widths = [1.8*inch, 0.7*inch, 1.0*inch, 0.9*inch, 0.8*inch, 0.7*inch, 0.7*inch, 0.9*inch]
-            for i, header in enumerate(headers):
-                canvas_obj.drawString(x_pos, y_pos, header)
-                x_pos += col_widths[i]
-            canvas_obj.line(inch, y_pos - 0.1 * inch, width - inch, y_pos - 0.1 * inch)
-            return y_pos - 0.25 * inch, col_widths # Devolver nueva Y y anchos
-
-        def draw_footer(canvas_obj, page_number):
-             canvas_obj.setFont('Helvetica', 8)
-             canvas_obj.drawString(inch, 0.75 * inch, f"Página {page_number}")
-             canvas_obj.drawRightString(width - inch, 0.75 * inch, "Reporte Generado Automáticamente")
-
-
-        # Título primera página
-        p.setFont('Helvetica-Bold', 16)
-        p.drawString(inch, y_position, "Reporte de Activos Fijos")
-        y_position -= 0.5 * inch
-
-        # Encabezados primera página
-        y_position, column_widths = draw_headers(p, y_position)
-        draw_footer(p, page_num)
-
-        # Datos
-        p.setFont('Helvetica', 9)
-        line_height = 0.25 * inch
-        for activo in queryset:
-            # Salto de página si no hay espacio
-            if y_position < inch + line_height: # Dejar espacio para el footer
-                p.showPage()
-                page_num += 1
-                y_position = height - inch # Reiniciar Y
-                y_position, column_widths = draw_headers(p, y_position) # Redibujar headers
-                draw_footer(p, page_num) # Redibujar footer
-                p.setFont('Helvetica', 9) # Volver a fuente normal
-
-            # Preparar datos fila
-            data = [
-                activo.nombre[:22] + '...' if len(activo.nombre) > 22 else activo.nombre,
-                activo.codigo_interno,
-                activo.ubicacion.nombre[:14] if activo.ubicacion else 'N/A',
-                activo.categoria.nombre[:12] if activo.categoria else 'N/A',
-                activo.departamento.nombre[:10] if hasattr(activo, 'departamento') and activo.departamento else 'N/A',
-                str(activo.fecha_adquisicion),
-                f"{activo.valor_actual:.2f}", # Formatear valor
-                activo.estado.nombre if activo.estado else 'N/A'
-            ]
-            x_position = inch
-            for i, item in enumerate(data):
-                p.drawString(x_position, y_position, str(item))
-                x_position += column_widths[i]
-            y_position -= line_height
-
-        p.save() # Guarda el contenido PDF en el buffer
+    """Genera un StreamingHttpResponse con el reporte de activos en formato PDF."""
+    return create_export_response(queryset, 'pdf')
+
+# --- CSV / NDJSON / Parquet (para consumo masivo, ej. BI) ---
+# Claves legibles por máquina, en el orden de REPORT_COLUMNS (ej. 'ubicacion__nombre' -> 'ubicacion')
+REPORT_KEYS = [campo.split('__')[0] for campo in REPORT_FIELDS]
+PARQUET_BATCH_ROWS = 50000         # Filas por record batch / row group de Parquet
+
+def _batches(rows, size=REPORT_CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_csv_report(rows):
+    """CSV UTF-8 con encabezado; un bloque por lote de filas. Los nulos quedan vacíos."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_KEYS)
+    yield buffer.getvalue().encode('utf-8')
+    for batch in _batches(rows):
         buffer.seek(0)
-        logger.debug(f"create_pdf_report: Buffer size = {buffer.getbuffer().nbytes} bytes.")
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
 
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_activos.pdf"'
-        logger.info("create_pdf_report: Response created successfully.")
-        return response
-    except Exception as e:
-         logger.error(f"create_pdf_report: Error during generation: {e}", exc_info=True)
-         raise
\ No newline at end of file
+def iter_ndjson_report(rows):
+    """Un objeto JSON por línea (fechas ISO, decimales como texto para no perder precisión)."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for batch in _batches(rows):
+        yield ''.join(encoder.encode(dict(zip(REPORT_KEYS, row))) + '\n' for row in batch).encode('utf-8')
+
+def _parquet_schema(pa):
+    tipos = {
+        'fecha_adquisicion': pa.date32(),
+        'valor_actual': pa.decimal128(12, 2), # Igual que ActivoFijo.valor_actual
+    }
+    return pa.schema([(key, tipos.get(key, pa.string())) for key in REPORT_KEYS])
+
+def iter_parquet_report(rows):
+    """
+    Parquet columnar por record batches: cada row group se envía en cuanto se
+    escribe, con solo un lote en memoria a la vez. El pie (metadatos) va al final.
+    """
+    # Dependencia opcional: se importa aquí para no exigir pyarrow al resto de la app
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    sink = ChunkBuffer()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in _batches(rows, PARQUET_BATCH_ROWS):
+            columns = zip(*batch)
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.read()
+    yield sink.read()
+
+def _write_chunks(iter_report):
+    def write(rows, destination):
+        for chunk in iter_report(rows):
+            destination.write(chunk)
+    write.__name__ = f'write_{iter_report.__name__}'
+    return write
+
+# Formato de exportación -> cómo generarlo:
+# - 'stream': generador de bytes para StreamingHttpResponse
+# - 'write': escribe en un archivo (exportaciones en segundo plano, api/export_jobs.py)
+# - 'requires': módulo opcional necesario (None si siempre está disponible)
+EXPORT_FORMATS = {
+    'pdf': {
+        'stream': iter_pdf_report, 'write': write_pdf_report,
+        'extension': 'pdf', 'content_type': 'application/pdf', 'requires': None,
+    },
+    'excel': {
+        'stream': iter_excel_report, 'write': write_excel_report,
+        'extension': 'xlsx', 'content_type': EXCEL_CONTENT_TYPE, 'requires': None,
+    },
+    'csv': {
+        'stream': iter_csv_report, 'write': _write_chunks(iter_csv_report),
+        'extension': 'csv', 'content_type': 'text/csv; charset=utf-8', 'requires': None,
+    },
+    'ndjson': {
+        'stream': iter_ndjson_report, 'write': _write_chunks(iter_ndjson_report),
+        'extension': 'ndjson', 'content_type': 'application/x-ndjson; charset=utf-8', 'requires': None,
+    },
+    'parquet': {
+        'stream': iter_parquet_report, 'write': _write_chunks(iter_parquet_report),
+        'extension': 'parquet', 'content_type': 'application/vnd.apache.parquet', 'requires': 'pyarrow',
+    },
+}
+
+def export_format_available(export_format):
+    spec = EXPORT_FORMATS.get(export_format)
+    if spec is None:
+        return False
+    return spec['requires'] is None or importlib.util.find_spec(spec['requires']) is not None
+
+def create_export_response(queryset, export_format):
+    """StreamingHttpResponse del reporte en cualquier formato de EXPORT_FORMATS."""
+    spec = EXPORT_FORMATS[export_format]
+    logger.debug(f"create_export_response: Starting streamed {export_format} generation...")
+    response = StreamingHttpResponse(
+        spec['stream'](iter_report_rows(queryset)),
+        content_type=spec['content_type']
+    )
+    response['Content-Disposition'] = f'attachment; filename="reporte_activos.{spec["extension"]}"'
+    return response
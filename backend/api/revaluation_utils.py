@@ -0,0 +1,150 @@
+# api/revaluation_utils.py
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value
+from django.db.models.functions import Round
+from .models import ActivoFijo, DisposicionActivo, RevalorizacionActivo
+from . import dashboard_utils, report_cache
+
+logger = logging.getLogger(__name__)
+
+REVAL_TYPES = ('factor', 'fijo', 'porcentual')
+REVALUATION_CHUNK_SIZE = 1000  # Activos por transacción
+
+CENT = Decimal('0.01')
+FACTOR_DECIMALS = Decimal('0.000001')  # RevalorizacionActivo.factor_aplicado: 6 decimales
+
+def validar_regla(reval_type, value):
+    """Mismas reglas que la revalorización individual. Devuelve `value` como Decimal."""
+    if reval_type not in REVAL_TYPES:
+        raise ValueError('reval_type inválido.')
+    value = Decimal(value)
+    if reval_type == 'porcentual':
+        if value <= -100:
+            raise ValueError("El porcentaje no puede ser menor o igual a -100%.")
+    elif value < 0:
+        raise ValueError("El valor no puede ser negativo para este método.")
+    return value
+
+def factor_de_regla(reval_type, value):
+    """Factor multiplicativo de 'factor'/'porcentual' (None para 'fijo')."""
+    if reval_type == 'factor':
+        return value
+    if reval_type == 'porcentual':
+        return Decimal(1) + value / Decimal(100)
+    return None
+
+def activos_revalorizables(empresa_id, categoria_id=None, ubicacion_id=None, departamento_id=None):
+    """Activos de la empresa (no dados de baja) que cumplen el filtro."""
+    qs = ActivoFijo.objects.filter(empresa_id=empresa_id).exclude(
+        Exists(DisposicionActivo.objects.filter(activo_id=OuterRef('pk')))
+    )
+    if categoria_id:
+        qs = qs.filter(categoria_id=categoria_id)
+    if ubicacion_id:
+        qs = qs.filter(ubicacion_id=ubicacion_id)
+    if departamento_id:
+        qs = qs.filter(departamento_id=departamento_id)
+    return qs
+
+def _valor_nuevo_expr(reval_type, value):
+    """Nuevo valor como expresión SQL (redondeado a centavos como el DecimalField)."""
+    if reval_type == 'fijo':
+        return Value(value, output_field=DecimalField(max_digits=12, decimal_places=2))
+    factor = Value(factor_de_regla(reval_type, value), output_field=DecimalField(max_digits=20, decimal_places=10))
+    return Round(F('valor_actual') * factor, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+def _aplicables(queryset, reval_type):
+    # Un activo con valor cero no se puede revalorizar por factor o porcentaje
+    return queryset if reval_type == 'fijo' else queryset.exclude(valor_actual=0)
+
+def simular_revalorizacion(queryset, reval_type, value):
+    """Totales de la revalorización sin escribir nada (una sola consulta agregada)."""
+    condicion = None if reval_type == 'fijo' else ~Q(valor_actual=0)
+    totales = queryset.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=condicion),
+        valor_anterior=Sum('valor_actual', filter=condicion),
+        valor_nuevo=Sum(_valor_nuevo_expr(reval_type, value), filter=condicion),
+    )
+    return _resumen(reval_type, value, True, totales['activos'], totales['total'] - totales['activos'],
+                    totales['valor_anterior'] or Decimal('0'), totales['valor_nuevo'] or Decimal('0'))
+
+def _resumen(reval_type, value, dry_run, activos, omitidos, valor_anterior, valor_nuevo):
+    return {
+        'reval_type': reval_type, 'value': value, 'dry_run': dry_run,
+        'activos': activos, 'omitidos_valor_cero': omitidos,
+        'valor_anterior_total': valor_anterior, 'valor_nuevo_total': valor_nuevo,
+        'diferencia': valor_nuevo - valor_anterior,
+    }
+
+def _procesar_lote(empresa_id, ids, reval_type, value, usuario, notas):
+    factor = factor_de_regla(reval_type, value)
+    with transaction.atomic():
+        # Bloquear y leer los valores vigentes del lote
+        filas = list(
+            ActivoFijo.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', 'valor_actual')
+        )
+        historial = []
+        for activo_id, valor_anterior in filas:
+            if factor is None:
+                valor_nuevo = value.quantize(CENT, rounding=ROUND_HALF_UP)
+                factor_aplicado = (valor_nuevo / valor_anterior) if valor_anterior > 0 else Decimal(0)
+            else:
+                valor_nuevo = (valor_anterior * factor).quantize(CENT, rounding=ROUND_HALF_UP)
+                factor_aplicado = factor
+            historial.append(RevalorizacionActivo(
+                empresa_id=empresa_id, activo_id=activo_id,
+                valor_anterior=valor_anterior, valor_nuevo=valor_nuevo,
+                factor_aplicado=factor_aplicado.quantize(FACTOR_DECIMALS, rounding=ROUND_HALF_UP),
+                notas=notas, realizado_por=usuario,
+            ))
+        RevalorizacionActivo.objects.bulk_create(historial)
+        # UPDATE por conjunto: la misma fórmula (ROUND de PostgreSQL redondea la mitad
+        # hacia arriba en valores positivos, igual que ROUND_HALF_UP) para todo el lote
+        ActivoFijo.objects.filter(pk__in=[activo_id for activo_id, _ in filas]).update(
+            valor_actual=_valor_nuevo_expr(reval_type, value)
+        )
+        valor_anterior = sum((registro.valor_anterior for registro in historial), Decimal('0'))
+        valor_nuevo = sum((registro.valor_nuevo for registro in historial), Decimal('0'))
+        if valor_nuevo != valor_anterior:
+            # .update() no dispara post_save: ajustar el Dashboard aquí
+            dashboard_utils.aplicar_delta(empresa_id, contadores={'valor_total_activos': valor_nuevo - valor_anterior})
+    return len(historial), valor_anterior, valor_nuevo
+
+def revalorizar_lote(empresa_id, reval_type, value, categoria_id=None, ubicacion_id=None, departamento_id=None,
+                     dry_run=False, usuario=None, notas=None, chunk_size=REVALUATION_CHUNK_SIZE):
+    """
+    Aplica una regla de revalorización ('factor', 'porcentual' o 'fijo') a todos los
+    activos que cumplen el filtro. Por lotes de `chunk_size` en orden de pk, cada uno
+    en su transacción: bulk_create del historial y un UPDATE por conjunto del valor.
+    Con `dry_run` solo devuelve los totales que resultarían.
+    """
+    value = validar_regla(reval_type, value)
+    queryset = activos_revalorizables(empresa_id, categoria_id, ubicacion_id, departamento_id)
+    if dry_run:
+        return simular_revalorizacion(queryset, reval_type, value)
+
+    omitidos = 0 if reval_type == 'fijo' else queryset.filter(valor_actual=0).count()
+    aplicables = _aplicables(queryset, reval_type).order_by('pk')
+    activos, valor_anterior, valor_nuevo = 0, Decimal('0'), Decimal('0')
+    ultimo_pk = None
+    while True:
+        lote_qs = aplicables if ultimo_pk is None else aplicables.filter(pk__gt=ultimo_pk)
+        ids = list(lote_qs.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        ultimo_pk = ids[-1]
+        cantidad, anterior, nuevo = _procesar_lote(empresa_id, ids, reval_type, value, usuario, notas)
+        activos += cantidad
+        valor_anterior += anterior
+        valor_nuevo += nuevo
+
+    if activos:
+        report_cache.bump_version(empresa_id)
+    logger.info(
+        f"Revalorización por lote ({reval_type} {value}) empresa {empresa_id}: "
+        f"{activos} activos, {valor_anterior} -> {valor_nuevo}."
+    )
+    return _resumen(reval_type, value, False, activos, omitidos, valor_anterior, valor_nuevo)
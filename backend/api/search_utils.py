@@ -0,0 +1,44 @@
+# api/search_utils.py
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Lower
+from .models import ActivoFijo, CategoriaActivo, Departamento, Estado, Proveedor, Ubicacion
+
+# Separador entre campos: evita que un término "cruce" de un nombre al siguiente
+SEPARADOR = '\n'
+
+# FK de ActivoFijo -> catálogo cuyo nombre entra en el documento de búsqueda
+CAMPOS_RELACIONADOS = {
+    'departamento_id': Departamento,
+    'categoria_id': CategoriaActivo,
+    'ubicacion_id': Ubicacion,
+    'estado_id': Estado,
+    'proveedor_id': Proveedor,
+}
+
+def _nombre(model, fk):
+    nombre = model.objects.filter(pk=OuterRef(fk)).values('nombre')[:1]
+    return Coalesce(Subquery(nombre, output_field=CharField()), Value(''))
+
+def search_document_expression():
+    """
+    Expresión SQL del documento de búsqueda de un activo (en minúsculas):
+    nombre, código y nombres de departamento, categoría, ubicación, estado y proveedor.
+
+    Usa subconsultas en vez de joins para poder usarse en un UPDATE.
+    """
+    partes = [F('nombre'), F('codigo_interno')]
+    partes += [_nombre(model, fk) for fk, model in CAMPOS_RELACIONADOS.items()]
+    separadas = []
+    for parte in partes:
+        if separadas:
+            separadas.append(Value(SEPARADOR))
+        separadas.append(parte)
+    return Lower(Concat(*separadas, output_field=CharField()))
+
+def actualizar_search_document(**filtros):
+    """Recalcula el documento de los activos que cumplan `filtros` con un único UPDATE."""
+    return ActivoFijo.objects.filter(**filtros).update(search_document=search_document_expression())
+
+def search_filter_value(texto):
+    # El documento se guarda en minúsculas: `__contains` (LIKE) usa el índice trigram
+    return texto.strip().lower()
@@ -3,11 +3,18 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
 from .permissions import check_permission, HasPermission
+from .tenant import get_tenant_context
+from .report_utils import export_format_available
+from .report_query import FilterSyntaxError, validate_filters
 from .models import *
 from django.db import transaction
+from django.urls import reverse
 from datetime import timedelta, datetime # <-- datetime AÑADIDO
 import re # <-- re AÑADIDO
 from django.db.models import Sum # <-- AÑADIDO: Importar Sum
+import logging
+
+logger = logging.getLogger(__name__)
 
 class CurrentUserEmpresaDefault:
     requires_context = True
@@ -21,8 +28,10 @@ class CurrentUserEmpresaDefault:
                 raise serializers.ValidationError("No hay empresas registradas. El superusuario no puede crear datos.")
             return empresa
         
-        if hasattr(user, 'empleado'):
-            return user.empleado.empresa
+        # Contexto del tenant compartido con la vista (sin consultas repetidas)
+        empresa = get_tenant_context(request).empresa
+        if empresa is not None:
+            return empresa
         
         raise serializers.ValidationError("El usuario no está asociado a una empresa.")
 
@@ -315,7 +324,12 @@ class PeriodoPresupuestarioSerializer(serializers.ModelSerializer):
         read_only_fields = ('monto_total', 'total_gastado_periodo', 'ahorro_o_sobregasto')
 
     def get_total_gastado_periodo(self, obj):
-        # Suma el monto_gastado de todas las partidas asociadas a este período
+        # Suma el monto_gastado de todas las partidas asociadas a este período.
+        # Los listados ya traen las partidas con prefetch_related: sumar en Python
+        # evita un aggregate por período. Sin prefetch (ej: tras crear) se consulta.
+        prefetched = getattr(obj, '_prefetched_objects_cache', {}).get('partidas')
+        if prefetched is not None:
+            return sum((partida.monto_gastado for partida in prefetched), 0)
         return obj.partidas.aggregate(Sum('monto_gastado'))['monto_gastado__sum'] or 0
 
     def get_ahorro_o_sobregasto(self, obj):
@@ -532,7 +546,7 @@ class RegisterEmpresaSerializer(serializers.Serializer):
              # Si algo falla (ej: error al crear suscripción, rol, etc.),
              # transaction.atomic deshará todo lo anterior.
              # Lanzamos un error de validación para que el frontend lo muestre.
-             print(f"ERROR en RegisterEmpresaSerializer.create: {e}") # Log para el servidor
+             logger.error(f"Error en RegisterEmpresaSerializer.create: {e}", exc_info=True) # Log para el servidor
              raise serializers.ValidationError(f"Error interno durante el registro: {e}")
 
 class EmpleadoSimpleSerializer(serializers.ModelSerializer):
@@ -669,7 +683,7 @@ class DisposicionActivoSerializer(serializers.ModelSerializer):
     class Meta:
         model = DisposicionActivo
         fields = '__all__'
-        read_only_fields = ('realizado_por', 'fecha_creacion', 'tipo_disposicion_display')
+        read_only_fields = ('realizado_por', 'fecha_creacion', 'tipo_disposicion_display', 'valor_en_libros')
 
     def create(self, validated_data):
         validated_data['realizado_por'] = self.context['request'].user
@@ -697,6 +711,44 @@ class NotificacionSerializer(serializers.ModelSerializer):
             'url_destino', 'tipo_display'
         ]
 
+# --- [NUEVO] Exportaciones de reportes en segundo plano ---
+class ReporteExportJobSerializer(serializers.ModelSerializer):
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    descarga_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteExportJob
+        fields = [
+            'id', 'formato', 'filtros', 'estado', 'estado_display', 'progreso',
+            'filas_procesadas', 'total_filas', 'error', 'descarga_url',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin'
+        ]
+        read_only_fields = [
+            'estado', 'progreso', 'filas_procesadas', 'total_filas', 'error',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin'
+        ]
+
+    def validate_filtros(self, value):
+        if not isinstance(value, list) or not all(isinstance(f, str) for f in value):
+            raise serializers.ValidationError("Los filtros deben ser una lista de textos.")
+        try:
+            validate_filters(value)
+        except FilterSyntaxError as e:
+            raise serializers.ValidationError(f"Filtro no válido: {e}")
+        return value
+
+    def validate_formato(self, value):
+        if not export_format_available(value):
+            raise serializers.ValidationError(f"El formato '{value}' no está disponible en este servidor.")
+        return value
+
+    def get_descarga_url(self, obj):
+        if obj.estado != 'COMPLETADO':
+            return None
+        request = self.context.get('request')
+        url = reverse('reporte-export-job-descargar', args=[obj.id])
+        return request.build_absolute_uri(url) if request else url
+
 # --- Serializer para recibir FCM token ---
 class FCMTokenSerializer(serializers.Serializer):
     fcm_token = serializers.CharField(max_length=255)
@@ -1,7 +1,16 @@
 # backend/api/signals.py
-from django.db.models.signals import post_save, post_delete
+from decimal import Decimal
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import PartidaPresupuestaria, PeriodoPresupuestario
+from .models import (
+    PartidaPresupuestaria, PeriodoPresupuestario, Roles, Empleado, Permisos, ActivoFijo, Suscripcion,
+    SolicitudCompra, Mantenimiento, Estado, CategoriaActivo, Departamento, Ubicacion, Proveedor, Notificacion,
+)
+from .permissions import invalidate_user_permissions
+from .usage_utils import USAGE_FIELD_FOR_MODEL, ajustar_uso, recalcular_uso
+from . import dashboard_utils, report_cache
+from .notification_counters import decrementar_no_leidas, incrementar_no_leidas
+from .search_utils import CAMPOS_RELACIONADOS, actualizar_search_document
 from django.db.models import Sum
 
 @receiver(post_save, sender=PartidaPresupuestaria)
@@ -17,3 +26,301 @@ def update_periodo_monto_total(sender, instance, **kwargs):
     periodo.monto_total = total_asignado
     periodo.save(update_fields=['monto_total'])
 
+
+# --- [NUEVO] Invalidación de la caché de permisos ---
+
+def _usuarios_con_roles(role_ids):
+    return list(
+        Empleado.objects.filter(roles__in=role_ids).values_list('usuario_id', flat=True).distinct()
+    )
+
+def _usuarios_con_permisos(permiso_ids):
+    return list(
+        Empleado.objects.filter(roles__permisos__in=permiso_ids).values_list('usuario_id', flat=True).distinct()
+    )
+
+@receiver(m2m_changed, sender=Roles.permisos.through)
+def invalidate_permisos_por_rol(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Roles.permisos cambió. Sin `reverse` la instancia es un Rol; con `reverse`
+    (permiso.roles_set...) la instancia es un Permiso y pk_set son Roles.
+    """
+    if action == 'pre_clear':
+        # Tras el clear ya no se puede saber a quién afectaba: calcular antes
+        if reverse:
+            instance._usuarios_afectados = _usuarios_con_permisos([instance.pk])
+        else:
+            instance._usuarios_afectados = _usuarios_con_roles([instance.pk])
+        return
+    if action == 'post_clear':
+        invalidate_user_permissions(getattr(instance, '_usuarios_afectados', []))
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    role_ids = pk_set if reverse else [instance.pk]
+    invalidate_user_permissions(_usuarios_con_roles(role_ids))
+
+@receiver(m2m_changed, sender=Empleado.roles.through)
+def invalidate_permisos_por_empleado(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Empleado.roles cambió. Sin `reverse` la instancia es un Empleado; con `reverse`
+    (rol.empleado_set...) la instancia es un Rol y pk_set son Empleados.
+    """
+    if action == 'pre_clear' and reverse:
+        instance._usuarios_afectados = _usuarios_con_roles([instance.pk])
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_user_permissions([instance.usuario_id])
+    elif action == 'post_clear':
+        invalidate_user_permissions(getattr(instance, '_usuarios_afectados', []))
+    else:
+        invalidate_user_permissions(
+            Empleado.objects.filter(pk__in=pk_set).values_list('usuario_id', flat=True)
+        )
+
+@receiver(pre_delete, sender=Roles)
+def invalidate_permisos_rol_eliminado(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no dispara m2m_changed
+    invalidate_user_permissions(_usuarios_con_roles([instance.pk]))
+
+@receiver(pre_delete, sender=Permisos)
+def invalidate_permisos_permiso_eliminado(sender, instance, **kwargs):
+    invalidate_user_permissions(_usuarios_con_permisos([instance.pk]))
+
+@receiver(post_save, sender=Permisos)
+def invalidate_permisos_permiso_renombrado(sender, instance, created, **kwargs):
+    # La caché guarda nombres: un renombrado deja entradas obsoletas
+    if not created:
+        invalidate_user_permissions(_usuarios_con_permisos([instance.pk]))
+
+@receiver(post_delete, sender=Empleado)
+def invalidate_permisos_empleado_eliminado(sender, instance, **kwargs):
+    invalidate_user_permissions([instance.usuario_id])
+
+
+# --- [NUEVO] Contadores de uso de la suscripción ---
+
+@receiver(post_save, sender=Empleado)
+@receiver(post_save, sender=ActivoFijo)
+def incrementar_uso_suscripcion(sender, instance, created, **kwargs):
+    if created:
+        ajustar_uso(instance.empresa_id, USAGE_FIELD_FOR_MODEL[sender], 1)
+
+@receiver(post_delete, sender=Empleado)
+@receiver(post_delete, sender=ActivoFijo)
+def decrementar_uso_suscripcion(sender, instance, **kwargs):
+    ajustar_uso(instance.empresa_id, USAGE_FIELD_FOR_MODEL[sender], -1)
+
+@receiver(post_save, sender=Suscripcion)
+def inicializar_uso_suscripcion(sender, instance, created, **kwargs):
+    # La suscripción puede crearse después que el primer empleado (registro de empresa)
+    if created:
+        recalcular_uso(instance.empresa_id)
+
+
+# --- [NUEVO] Snapshot incremental del Dashboard ---
+# post_init guarda los valores cargados de la BD para calcular deltas al guardar/borrar.
+# Se lee de __dict__ para no disparar consultas con campos diferidos (.only/.defer).
+
+CAMPOS_DASHBOARD = {
+    ActivoFijo: ('estado_id', 'categoria_id', 'valor_actual'),
+    SolicitudCompra: ('estado',),
+    Mantenimiento: ('estado',),
+}
+
+def _valores_dashboard(instance):
+    campos = CAMPOS_DASHBOARD[type(instance)]
+    if any(campo not in instance.__dict__ for campo in campos):
+        return None
+    return tuple(instance.__dict__[campo] for campo in campos)
+
+@receiver(post_init, sender=ActivoFijo)
+@receiver(post_init, sender=SolicitudCompra)
+@receiver(post_init, sender=Mantenimiento)
+def guardar_valores_dashboard(sender, instance, **kwargs):
+    instance._dashboard_original = _valores_dashboard(instance)
+
+def _delta_activo(valores, signo):
+    estado_id, categoria_id, valor = valores
+    return (
+        {'total_activos': signo, 'valor_total_activos': signo * Decimal(str(valor or 0))},
+        {
+            'activos_por_estado': [(estado_id, signo)],
+            'activos_por_categoria': [(categoria_id, signo)],
+        },
+    )
+
+@receiver(post_save, sender=ActivoFijo)
+def dashboard_activo_guardado(sender, instance, created, **kwargs):
+    original = None if created else instance._dashboard_original
+    actual = _valores_dashboard(instance)
+    instance._dashboard_original = actual
+
+    if created:
+        contadores, grupos = _delta_activo(actual, 1)
+    elif original is None or actual is None:
+        # Instancia cargada con campos diferidos: no hay base para el delta
+        dashboard_utils.reconstruir_snapshot(instance.empresa_id)
+        return
+    elif original == actual:
+        return
+    else:
+        contadores, grupos = _delta_activo(original, -1)
+        nuevos_contadores, nuevos_grupos = _delta_activo(actual, 1)
+        contadores = {
+            'valor_total_activos': contadores['valor_total_activos'] + nuevos_contadores['valor_total_activos']
+        }
+        for campo_json, cambios in nuevos_grupos.items():
+            grupos[campo_json] += cambios
+    dashboard_utils.aplicar_delta(instance.empresa_id, contadores, grupos)
+
+@receiver(post_delete, sender=ActivoFijo)
+def dashboard_activo_eliminado(sender, instance, **kwargs):
+    valores = instance._dashboard_original or _valores_dashboard(instance)
+    if valores is None:
+        dashboard_utils.reconstruir_snapshot(instance.empresa_id)
+        return
+    contadores, grupos = _delta_activo(valores, -1)
+    dashboard_utils.aplicar_delta(instance.empresa_id, contadores, grupos)
+
+@receiver(post_save, sender=Empleado)
+def dashboard_empleado_creado(sender, instance, created, **kwargs):
+    if created:
+        dashboard_utils.aplicar_delta(instance.empresa_id, {'total_usuarios': 1})
+
+@receiver(post_delete, sender=Empleado)
+def dashboard_empleado_eliminado(sender, instance, **kwargs):
+    dashboard_utils.aplicar_delta(instance.empresa_id, {'total_usuarios': -1})
+
+# Modelo -> (contador del snapshot, estado que cuenta)
+CONTADORES_POR_ESTADO = {
+    SolicitudCompra: ('solicitudes_pendientes', dashboard_utils.SOLICITUD_PENDIENTE),
+    Mantenimiento: ('mantenimientos_en_proceso', dashboard_utils.MANTENIMIENTO_EN_PROCESO),
+}
+
+@receiver(post_save, sender=SolicitudCompra)
+@receiver(post_save, sender=Mantenimiento)
+def dashboard_estado_guardado(sender, instance, created, **kwargs):
+    campo, estado_contado = CONTADORES_POR_ESTADO[sender]
+    original = None if created else instance._dashboard_original
+    instance._dashboard_original = _valores_dashboard(instance)
+
+    if not created and original is None:
+        dashboard_utils.reconstruir_snapshot(instance.empresa_id)
+        return
+    antes = 0 if created else int(original[0] == estado_contado)
+    delta = int(instance.estado == estado_contado) - antes
+    if delta:
+        dashboard_utils.aplicar_delta(instance.empresa_id, {campo: delta})
+
+@receiver(post_delete, sender=SolicitudCompra)
+@receiver(post_delete, sender=Mantenimiento)
+def dashboard_estado_eliminado(sender, instance, **kwargs):
+    campo, estado_contado = CONTADORES_POR_ESTADO[sender]
+    valores = instance._dashboard_original or _valores_dashboard(instance)
+    if valores is None:
+        dashboard_utils.reconstruir_snapshot(instance.empresa_id)
+    elif valores[0] == estado_contado:
+        dashboard_utils.aplicar_delta(instance.empresa_id, {campo: -1})
+
+@receiver(post_save, sender=Estado)
+@receiver(post_save, sender=CategoriaActivo)
+def dashboard_catalogo_renombrado(sender, instance, created, **kwargs):
+    if created:
+        return
+    campo_json = 'activos_por_estado' if sender is Estado else 'activos_por_categoria'
+    dashboard_utils.renombrar_en_snapshot(instance.empresa_id, campo_json, instance.pk, instance.nombre)
+
+
+# --- [NUEVO] Documento de búsqueda de ActivoFijo (api/search_utils.py) ---
+
+@receiver(post_save, sender=ActivoFijo)
+def search_document_activo(sender, instance, **kwargs):
+    # UPDATE con subconsultas: no dispara post_save de nuevo
+    actualizar_search_document(pk=instance.pk)
+
+# Catálogo -> FK de ActivoFijo que lo referencia
+FK_POR_CATALOGO = {model: fk for fk, model in CAMPOS_RELACIONADOS.items()}
+
+@receiver(post_init, sender=Departamento)
+@receiver(post_init, sender=CategoriaActivo)
+@receiver(post_init, sender=Ubicacion)
+@receiver(post_init, sender=Estado)
+@receiver(post_init, sender=Proveedor)
+def guardar_nombre_catalogo(sender, instance, **kwargs):
+    instance._nombre_original = instance.__dict__.get('nombre')
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_save, sender=CategoriaActivo)
+@receiver(post_save, sender=Ubicacion)
+@receiver(post_save, sender=Estado)
+@receiver(post_save, sender=Proveedor)
+def search_document_catalogo_renombrado(sender, instance, created, **kwargs):
+    renombrado = not created and instance._nombre_original != instance.nombre
+    instance._nombre_original = instance.nombre
+    if renombrado:
+        actualizar_search_document(**{FK_POR_CATALOGO[sender]: instance.pk})
+
+@receiver(pre_delete, sender=Departamento)
+@receiver(pre_delete, sender=Proveedor)
+def search_document_catalogo_pre_delete(sender, instance, **kwargs):
+    # on_delete=SET_NULL actualiza los activos sin señales: recordar cuáles eran
+    instance._activos_afectados = list(
+        ActivoFijo.objects.filter(**{FK_POR_CATALOGO[sender]: instance.pk}).values_list('pk', flat=True)
+    )
+
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=Proveedor)
+def search_document_catalogo_eliminado(sender, instance, **kwargs):
+    activos = getattr(instance, '_activos_afectados', None)
+    if activos:
+        actualizar_search_document(pk__in=activos)
+
+
+# --- [NUEVO] Invalidación de la caché de reportes (api/report_cache.py) ---
+
+@receiver(post_save, sender=ActivoFijo)
+@receiver(post_delete, sender=ActivoFijo)
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_save, sender=CategoriaActivo)
+@receiver(post_delete, sender=CategoriaActivo)
+@receiver(post_save, sender=Ubicacion)
+@receiver(post_delete, sender=Ubicacion)
+@receiver(post_save, sender=Estado)
+@receiver(post_delete, sender=Estado)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def invalidar_cache_reportes(sender, instance, **kwargs):
+    report_cache.bump_version(instance.empresa_id)
+
+
+# --- [NUEVO] Contador de notificaciones no leídas (api/notification_counters.py) ---
+# Notificaciones creadas con bulk_create (notification_utils.notificar) y marcadas
+# con .update() (marcar-todo-leido) no pasan por aquí: esos caminos ajustan el
+# contador directamente.
+
+@receiver(post_init, sender=Notificacion)
+def guardar_leido_original(sender, instance, **kwargs):
+    instance._leido_original = instance.__dict__.get('leido')
+
+@receiver(post_save, sender=Notificacion)
+def contador_notificacion_guardada(sender, instance, created, **kwargs):
+    original = None if created else instance._leido_original
+    instance._leido_original = instance.leido
+    if created:
+        if not instance.leido:
+            incrementar_no_leidas([instance.destinatario_id])
+    elif original is False and instance.leido:
+        decrementar_no_leidas(instance.destinatario_id)
+    elif original is True and not instance.leido:
+        incrementar_no_leidas([instance.destinatario_id])
+
+@receiver(post_delete, sender=Notificacion)
+def contador_notificacion_eliminada(sender, instance, **kwargs):
+    if instance.leido is False:
+        decrementar_no_leidas(instance.destinatario_id)
@@ -0,0 +1,95 @@
+# api/tenant.py
+from .models import Empleado, Suscripcion
+from .permissions import _http_request
+
+_UNRESOLVED = object()
+
+class TenantContext:
+    """
+    Contexto del tenant (empleado, empresa y suscripción) del usuario autenticado.
+
+    - `empresa_id` se toma del claim `empresa_id` del JWT cuando existe, por lo que
+      filtrar por tenant no necesita ninguna consulta.
+    - `empleado`, `empresa` y `suscripcion` se resuelven juntos, la primera vez que
+      se piden, con UNA consulta (select_related empresa + suscripción).
+    """
+
+    def __init__(self, user, empresa_id=None):
+        self.user = user
+        self._empresa_id = empresa_id
+        self._empleado = _UNRESOLVED
+
+    def _resolve(self):
+        if self._empleado is not _UNRESOLVED:
+            return self._empleado
+
+        empleado = None
+        if self.user is not None and self.user.is_authenticated:
+            empleado = (
+                Empleado.objects.select_related('empresa', 'empresa__suscripcion')
+                .filter(usuario_id=self.user.pk)
+                .first()
+            )
+            # Rellenar la caché de la relación para que `request.user.empleado`
+            # (y `empleado.usuario`) no vuelvan a consultar la BD.
+            Empleado.usuario.field.remote_field.set_cached_value(self.user, empleado)
+            if empleado is not None:
+                Empleado.usuario.field.set_cached_value(empleado, self.user)
+
+        self._empleado = empleado
+        return empleado
+
+    @property
+    def empleado(self):
+        return self._resolve()
+
+    @property
+    def empresa(self):
+        empleado = self._resolve()
+        return empleado.empresa if empleado else None
+
+    @property
+    def empresa_id(self):
+        if self._empresa_id is None:
+            empleado = self._resolve()
+            self._empresa_id = empleado.empresa_id if empleado else None
+        return self._empresa_id
+
+    @property
+    def suscripcion(self):
+        """Suscripción de la empresa, o None si el usuario no tiene empresa o suscripción."""
+        empresa = self.empresa
+        if empresa is None:
+            return None
+        try:
+            return empresa.suscripcion
+        except Suscripcion.DoesNotExist:
+            return None
+
+def _empresa_id_from_token(request):
+    token = getattr(request, 'auth', None)
+    if token is None:
+        return None
+    try:
+        empresa_id = token.get('empresa_id')
+    except AttributeError:
+        return None
+    return empresa_id or None
+
+def get_tenant_context(request):
+    """
+    Devuelve el TenantContext de la petición, creándolo la primera vez.
+
+    Se guarda en `request.tenant` (sobre el HttpRequest de Django, compartido por
+    vistas y serializers). No puede resolverse en un middleware de Django porque la
+    autenticación JWT ocurre dentro de DRF: allí `request.user` aún es anónimo.
+    """
+    http_request = _http_request(request)
+    user = getattr(request, 'user', None)
+    tenant = getattr(http_request, 'tenant', None)
+    if tenant is not None and tenant.user is user:
+        return tenant
+
+    tenant = TenantContext(user, empresa_id=_empresa_id_from_token(request))
+    http_request.tenant = tenant
+    return tenant
@@ -1,3 +1,1160 @@
+import datetime
+import io
+import json
+import re
+import zlib
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from .models import (
+    Empresa, Empleado, Cargo, Suscripcion, Departamento, CategoriaActivo, Estado, Ubicacion,
+    ActivoFijo, SolicitudCompra, Mantenimiento, Notificacion, DepreciacionActivo, RevalorizacionActivo,
+    ReporteExportJob, PeriodoPresupuestario, PartidaPresupuestaria, DisposicionActivo, PushOutbox, Roles, Permisos,
+)
+from .permissions import load_user_permissions
+from .usage_utils import reconciliar_uso
+from .dashboard_utils import obtener_snapshot, reconstruir_snapshot, snapshot_a_respuesta
+from .export_jobs import ejecutar_job, reclamar_siguiente_job
+from .report_utils import (
+    REPORT_KEYS, iter_csv_report, iter_excel_report, iter_ndjson_report, iter_parquet_report, iter_pdf_report,
+)
+from .report_query import FilterSyntaxError, Or, Predicate, _Parser, parse_and_build_query, tokenize
+from .search_utils import actualizar_search_document
+from .pagination import KeysetPagination
+from .report_cache import filter_report_queryset
+from .depreciation_utils import ejecutar_depreciacion_lote
+from .revaluation_utils import revalorizar_lote
+from .valuation_utils import totales_a_fecha, valorizar_a_fecha
+from .push_outbox import despachar_pendientes, encolar_push
+from .fcm_utils import FakeTransport
+from .notification_utils import notificar
+from .notification_counters import contar_no_leidas
+from .month_end import cerrar_mes_empresa, empresas_pendientes
+
+
+def crear_empresa_con_empleado(nombre='Empresa Test', nit='100', username='empleado'):
+    empresa = Empresa.objects.create(nombre=nombre, nit=nit)
+    user = User.objects.create_user(username=username, password='test123')
+    empleado = Empleado.objects.create(
+        usuario=user, empresa=empresa, ci='1', apellido_p='Perez', apellido_m='Lopez'
+    )
+    return empresa, user, empleado
+
+
+class TenantViewSetQueryCountTests(TestCase):
+    """
+    get_queryset de BaseTenantViewSet corre en cada list/retrieve/update/delete:
+    no debe añadir COUNT(*) ni consultas extra por request.
+    """
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        self.cargo = Cargo.objects.create(empresa=self.empresa, nombre='Contador')
+        self.client = APIClient()
+        self.url = reverse('cargo-detail', args=[self.cargo.id])
+
+    def test_retrieve_resuelve_tenant_con_una_consulta(self):
+        self.client.force_authenticate(user=self.user)
+        # 1) empleado + empresa + suscripción (TenantContext)  2) el Cargo
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['nombre'], 'Contador')
+
+    def test_retrieve_con_claim_empresa_id_no_consulta_empleado(self):
+        self.client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_de_otra_empresa_devuelve_404(self):
+        otra_empresa, otro_user, _ = crear_empresa_con_empleado('Otra', '200', 'otro')
+        self.client.force_authenticate(user=otro_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class PermissionCacheTests(TestCase):
+    """Los permisos del usuario se resuelven una vez y se invalidan al cambiar roles o permisos."""
+
+    def setUp(self):
+        cache.clear()
+        self.empresa, self.user, self.empleado = crear_empresa_con_empleado()
+        self.ver = Permisos.objects.create(nombre='view_dashboard', descripcion='Ver dashboard')
+        self.gestionar = Permisos.objects.create(nombre='manage_activo', descripcion='Gestionar activos')
+        self.rol = Roles.objects.create(empresa=self.empresa, nombre='Usuario')
+        self.rol.permisos.add(self.ver)
+        self.empleado.roles.add(self.rol)
+
+    def test_segunda_comprobacion_sin_consultas(self):
+        self.assertEqual(load_user_permissions(self.user), frozenset({'view_dashboard'}))
+        with self.assertNumQueries(0):
+            self.assertEqual(load_user_permissions(self.user), frozenset({'view_dashboard'}))
+
+    def test_cambios_en_roles_y_permisos_invalidan(self):
+        load_user_permissions(self.user)
+        self.rol.permisos.add(self.gestionar)
+        self.assertEqual(load_user_permissions(self.user), frozenset({'view_dashboard', 'manage_activo'}))
+        self.rol.permisos.remove(self.gestionar)
+        self.assertEqual(load_user_permissions(self.user), frozenset({'view_dashboard'}))
+        self.empleado.roles.remove(self.rol)
+        self.assertEqual(load_user_permissions(self.user), frozenset())
+        self.rol.empleado_set.add(self.empleado)
+        self.assertEqual(load_user_permissions(self.user), frozenset({'view_dashboard'}))
+
+    def test_revocar_aplica_en_la_siguiente_peticion(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        url = reverse('notificacion-marcar-todo-leido')
+        self.assertEqual(client.post(url).status_code, 200)
+        self.rol.permisos.remove(self.ver)
+        self.assertEqual(client.post(url).status_code, 403)
+        self.rol.permisos.add(self.ver)
+        self.assertEqual(client.post(url).status_code, 200)
+
+
+class SuscripcionUsageCounterTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, self.empleado = crear_empresa_con_empleado()
+        # La suscripción se crea después del primer empleado (como en el registro)
+        self.suscripcion = Suscripcion.objects.create(
+            empresa=self.empresa, fecha_inicio='2025-01-01', fecha_fin='2026-01-01'
+        )
+
+    def test_contadores_siguen_altas_y_bajas(self):
+        self.suscripcion.refresh_from_db()
+        self.assertEqual(self.suscripcion.usuarios_usados, 1)
+
+        otro = User.objects.create_user(username='otro', password='test123')
+        nuevo = Empleado.objects.create(
+            usuario=otro, empresa=self.empresa, ci='2', apellido_p='Rojas', apellido_m='Vargas'
+        )
+        self.suscripcion.refresh_from_db()
+        self.assertEqual(self.suscripcion.usuarios_usados, 2)
+
+        nuevo.delete()
+        self.suscripcion.refresh_from_db()
+        self.assertEqual(self.suscripcion.usuarios_usados, 1)
+
+    def test_reconciliar_corrige_desviaciones(self):
+        Suscripcion.objects.filter(pk=self.suscripcion.pk).update(usuarios_usados=7)
+        correcciones = reconciliar_uso()
+        self.assertEqual(correcciones, [(self.empresa.id, 'usuarios_usados', 7, 1)])
+        self.suscripcion.refresh_from_db()
+        self.assertEqual(self.suscripcion.usuarios_usados, 1)
+
+
+class TenantIndexQueryPlanTests(TestCase):
+    """
+    Regresión de planes de consulta: con un volumen de datos realista, las consultas
+    calientes de las vistas deben usar los índices compuestos/parciales (migración 0021)
+    y nunca un Seq Scan sobre las tablas grandes.
+    """
+    EMPRESAS = 10
+    ACTIVOS_POR_EMPRESA = 2000
+    SOLICITUDES_POR_EMPRESA = 1500
+    USUARIOS = 200
+    NOTIFICACIONES_POR_USUARIO = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = Empresa.objects.bulk_create([
+            Empresa(nombre=f'Empresa {i}', nit=f'NIT{i}') for i in range(cls.EMPRESAS)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'user{i}') for i in range(cls.USUARIOS)
+        ])
+        cls.user = users[0]
+
+        activos, solicitudes, mantenimientos, historial = [], [], [], []
+        base = datetime.date(2015, 1, 1)
+        for empresa in cls.empresas:
+            depto = Departamento.objects.create(empresa=empresa, nombre='General')
+            categoria = CategoriaActivo.objects.create(empresa=empresa, nombre='Equipos')
+            estado = Estado.objects.create(empresa=empresa, nombre='En Uso')
+            ubicacion = Ubicacion.objects.create(empresa=empresa, nombre='Oficina')
+            activos_empresa = [
+                ActivoFijo(
+                    empresa=empresa, nombre=f'Activo {n}', codigo_interno=f'AF-{n}',
+                    fecha_adquisicion=base + datetime.timedelta(days=n % 3650),
+                    valor_actual=Decimal('1000.00'), vida_util=5,
+                    categoria=categoria, estado=estado, ubicacion=ubicacion,
+                )
+                for n in range(cls.ACTIVOS_POR_EMPRESA)
+            ]
+            activos.extend(activos_empresa)
+            solicitudes.extend(
+                SolicitudCompra(
+                    empresa=empresa, solicitante=cls.user, departamento=depto,
+                    descripcion='Compra', costo_estimado=Decimal('100.00'), justificacion='-',
+                    estado=('PENDIENTE', 'APROBADA', 'RECHAZADA')[n % 3],
+                )
+                for n in range(cls.SOLICITUDES_POR_EMPRESA)
+            )
+            mantenimientos.extend(
+                Mantenimiento(
+                    empresa=empresa, activo=activo, descripcion_problema='-',
+                    estado=('PENDIENTE', 'EN_PROGRESO', 'COMPLETADO')[n % 3],
+                )
+                for n, activo in enumerate(activos_empresa)
+            )
+            for activo in activos_empresa[:500]:
+                for _ in range(4):
+                    historial.append(DepreciacionActivo(
+                        empresa=empresa, activo=activo, valor_anterior=Decimal('1000.00'),
+                        valor_nuevo=Decimal('900.00'), monto_depreciado=Decimal('100.00'),
+                    ))
+
+        ActivoFijo.objects.bulk_create(activos, batch_size=2000)
+        SolicitudCompra.objects.bulk_create(solicitudes, batch_size=2000)
+        Mantenimiento.objects.bulk_create(mantenimientos, batch_size=2000)
+        DepreciacionActivo.objects.bulk_create(historial, batch_size=2000)
+        RevalorizacionActivo.objects.bulk_create([
+            RevalorizacionActivo(
+                empresa=d.empresa, activo=d.activo, valor_anterior=d.valor_anterior,
+                valor_nuevo=Decimal('1100.00'), factor_aplicado=Decimal('1.100000'),
+            )
+            for d in historial
+        ], batch_size=2000)
+        Notificacion.objects.bulk_create([
+            Notificacion(destinatario=u, mensaje='-', leido=n % 10 != 0)
+            for u in users for n in range(cls.NOTIFICACIONES_POR_USUARIO)
+        ], batch_size=2000)
+
+        # bulk_create no dispara señales: construir el documento de búsqueda de una vez
+        actualizar_search_document()
+
+        # Estadísticas frescas para que el planificador vea el volumen real
+        with connection.cursor() as cursor:
+            for model in (ActivoFijo, SolicitudCompra, Mantenimiento, DepreciacionActivo,
+                          RevalorizacionActivo, Notificacion):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        cls.empresa = cls.empresas[0]
+        cls.activo = ActivoFijo.objects.filter(empresa=cls.empresa).first()
+
+    def assertUsesIndex(self, queryset):
+        table = queryset.model._meta.db_table
+        plan = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {table}', plan, msg=f'\n{queryset.query}\n{plan}')
+
+    def test_activos_por_rango_de_fechas(self):
+        # ReporteActivosPreview / ReporteQueryView
+        self.assertUsesIndex(
+            ActivoFijo.objects.filter(
+                empresa=self.empresa,
+                fecha_adquisicion__gte=datetime.date(2018, 1, 1),
+                fecha_adquisicion__lte=datetime.date(2018, 3, 31),
+            ).order_by('fecha_adquisicion')
+        )
+
+    def test_solicitudes_pendientes(self):
+        # DashboardDataView (solicitudes pendientes)
+        self.assertUsesIndex(SolicitudCompra.objects.filter(empresa=self.empresa, estado='PENDIENTE'))
+
+    def test_mantenimientos_por_estado(self):
+        # DashboardDataView (mantenimientos en progreso)
+        self.assertUsesIndex(Mantenimiento.objects.filter(empresa=self.empresa, estado='EN_PROGRESO'))
+
+    def test_notificaciones_del_usuario(self):
+        # NotificacionViewSet.list (orden del Meta: leido, -timestamp)
+        self.assertUsesIndex(Notificacion.objects.filter(destinatario=self.user)[:20])
+
+    def test_notificaciones_no_leidas(self):
+        # NotificacionViewSet.unread_count -> índice parcial
+        qs = Notificacion.objects.filter(destinatario=self.user, leido=False)
+        self.assertUsesIndex(qs)
+        self.assertIn('notif_no_leidas_idx', qs.explain())
+
+    def test_busqueda_de_texto_libre(self):
+        # parse_and_build_query: texto simple -> índice GIN trigram
+        qs = parse_and_build_query(['activo 1234'], ActivoFijo.objects.filter(empresa=self.empresa))
+        self.assertUsesIndex(qs)
+        self.assertIn('activo_search_trgm_idx', qs.explain())
+
+    def test_historial_de_depreciacion_y_revalorizacion(self):
+        # Depreciacion/RevalorizacionActivoViewSet?activo_id=
+        for model in (DepreciacionActivo, RevalorizacionActivo):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(model.objects.filter(empresa=self.empresa, activo=self.activo))
+
+
+class DashboardSnapshotTests(TestCase):
+    """El snapshot mantenido por señales debe coincidir con una reconstrucción completa."""
+
+    def setUp(self):
+        self.empresa, self.user, self.empleado = crear_empresa_con_empleado()
+        self.en_uso = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        self.baja = Estado.objects.create(empresa=self.empresa, nombre='De Baja')
+        self.categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        self.ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+        self.depto = Departamento.objects.create(empresa=self.empresa, nombre='General')
+        obtener_snapshot(self.empresa.id)
+
+    def crear_activo(self, codigo, valor):
+        return ActivoFijo.objects.create(
+            empresa=self.empresa, nombre=codigo, codigo_interno=codigo,
+            fecha_adquisicion=datetime.date(2024, 1, 1), valor_actual=Decimal(valor), vida_util=5,
+            categoria=self.categoria, estado=self.en_uso, ubicacion=self.ubicacion,
+        )
+
+    def assertSnapshotConsistente(self):
+        incremental = snapshot_a_respuesta(obtener_snapshot(self.empresa.id))
+        completo = snapshot_a_respuesta(reconstruir_snapshot(self.empresa.id))
+        self.assertEqual(incremental, completo)
+        return completo
+
+    def test_altas_cambios_y_bajas(self):
+        activo = self.crear_activo('AF-1', '1000.00')
+        self.crear_activo('AF-2', '500.00')
+        activo.estado = self.baja
+        activo.valor_actual = Decimal('800.00')
+        activo.save()
+        mant = Mantenimiento.objects.create(empresa=self.empresa, activo=activo, descripcion_problema='-')
+        mant.estado = 'EN_PROGRESO'
+        mant.save(update_fields=['estado'])
+        SolicitudCompra.objects.create(
+            empresa=self.empresa, solicitante=self.user, departamento=self.depto,
+            descripcion='-', costo_estimado=Decimal('10.00'), justificacion='-',
+        )
+        ActivoFijo.objects.get(codigo_interno='AF-2').delete()
+
+        data = self.assertSnapshotConsistente()
+        self.assertEqual(data['total_activos'], 1)
+        self.assertEqual(data['valor_total_activos'], Decimal('800.00'))
+        self.assertEqual(data['activos_por_estado'], [{'estado__nombre': 'De Baja', 'count': 1}])
+        self.assertEqual(data['mantenimientos_en_proceso'], 1)
+        self.assertEqual(data['solicitudes_pendientes'], 1)
+
+    def test_renombrar_estado(self):
+        self.crear_activo('AF-1', '100.00')
+        self.en_uso.nombre = 'Operativo'
+        self.en_uso.save()
+        data = self.assertSnapshotConsistente()
+        self.assertEqual(data['activos_por_estado'], [{'estado__nombre': 'Operativo', 'count': 1}])
+
+    def test_dashboard_es_una_lectura(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard_data'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_usuarios'], 1)
+
+
+class ReporteExportJobTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        Suscripcion.objects.create(
+            empresa=self.empresa, plan='profesional', fecha_inicio='2025-01-01', fecha_fin='2026-01-01'
+        )
+        categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        estado = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+        for n in range(3):
+            ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=f'Laptop {n}', codigo_interno=f'AF-{n}',
+                fecha_adquisicion=datetime.date(2024, 1, 1), valor_actual=Decimal('100.00'), vida_util=5,
+                categoria=categoria, estado=estado, ubicacion=ubicacion,
+            )
+
+    def test_worker_genera_el_archivo(self):
+        job = ReporteExportJob.objects.create(
+            empresa=self.empresa, solicitado_por=self.user, formato='excel', filtros=['laptop']
+        )
+        self.assertEqual(reclamar_siguiente_job().pk, job.pk)
+        # Ya está PROCESANDO: otro worker no lo vuelve a tomar
+        self.assertIsNone(reclamar_siguiente_job())
+
+        job = ejecutar_job(ReporteExportJob.objects.get(pk=job.pk))
+        self.assertEqual(job.estado, 'COMPLETADO')
+        self.assertEqual((job.total_filas, job.filas_procesadas, job.progreso), (3, 3, 100))
+        self.assertTrue(job.archivo.name.startswith(f'tenant_{self.empresa.id}/reportes/'))
+        job.archivo.delete(save=False)
+
+
+class ExcelStreamingTests(TestCase):
+
+    def test_primeros_bytes_antes_de_la_ultima_fila(self):
+        consumidas = []
+
+        def filas(total):
+            for n in range(total):
+                consumidas.append(n)
+                yield (f'Activo {n}', f'AF-{n}', 'Oficina', None, 'TI', datetime.date(2024, 1, 1), Decimal('10.50'), 'En Uso')
+
+        chunks = iter_excel_report(filas(30000))
+        primero = next(chunks)
+        # El zip se envía mientras se escribe: no espera a la última fila
+        self.assertTrue(primero.startswith(b'PK'))
+        self.assertLess(len(consumidas), 30000)
+
+        ws = load_workbook(io.BytesIO(primero + b''.join(chunks))).active
+        self.assertEqual(ws.max_row, 30001)
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual([c.value for c in ws[2]][3:], ['N/A', 'TI', datetime.datetime(2024, 1, 1), 10.5, 'En Uso'])
+
+
+class PDFStreamingTests(TestCase):
+
+    def test_paginas_antes_de_la_ultima_fila_y_pdf_valido(self):
+        consumidas = []
+
+        def filas(total):
+            for n in range(total):
+                consumidas.append(n)
+                yield (r'Silla (ñandú) C:\x', f'AF-{n}', 'Oficina', None, 'TI', datetime.date(2024, 1, 1), Decimal('10.50'), 'En Uso')
+
+        chunks = iter_pdf_report(filas(200))
+        primero = next(chunks)
+        # La primera página se envía en cuanto se completa
+        self.assertIn(b'/Type /Page ', primero)
+        self.assertLess(len(consumidas), 200)
+        pdf = primero + b''.join(chunks)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n'))
+
+        # La tabla xref apunta al inicio de cada objeto
+        xref = int(re.search(rb'startxref\n(\d+)\n', pdf).group(1))
+        self.assertTrue(pdf[xref:].startswith(b'xref\n'))
+        total = int(re.match(rb'xref\n0 (\d+)\n', pdf[xref:]).group(1))
+        offsets = re.findall(rb'(\d{10}) 00000 n ', pdf[xref:])
+        self.assertEqual(len(offsets), total - 1)
+        for object_id, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[int(offset):].startswith(b'%d 0 obj\n' % object_id))
+
+        paginas = len(re.findall(rb'/Type /Page ', pdf))
+        self.assertGreater(paginas, 1)
+        self.assertIn(b'/Count %d >>' % paginas, pdf)
+
+        # Paréntesis y barra escapados, acentos en WinAnsi (cp1252)
+        contenido = b''.join(
+            zlib.decompress(stream) for stream in re.findall(rb'stream\n(.*?)\nendstream', pdf, re.DOTALL)
+        )
+        self.assertEqual(contenido.count(r'(Silla \(ñandú\) C:\\x) Tj'.encode('cp1252')), 200)
+        self.assertIn('(Página 2) Tj'.encode('cp1252'), contenido)
+
+
+class ExportFormatTests(TestCase):
+    FILAS = [
+        ('Silla, "gamer"', 'AF-1', 'Oficina', None, 'TI', datetime.date(2024, 1, 31), Decimal('1234.50'), 'En Uso'),
+        ('Mesa', 'AF-2', None, 'Muebles', None, datetime.date(2023, 12, 1), Decimal('0.10'), None),
+    ]
+
+    def test_csv_encabezado_comillas_y_nulos(self):
+        texto = b''.join(iter_csv_report(iter(self.FILAS))).decode('utf-8')
+        self.assertEqual(texto.splitlines(), [
+            'nombre,codigo_interno,ubicacion,categoria,departamento,fecha_adquisicion,valor_actual,estado',
+            '"Silla, ""gamer""",AF-1,Oficina,,TI,2024-01-31,1234.50,En Uso',
+            'Mesa,AF-2,,Muebles,,2023-12-01,0.10,',
+        ])
+
+    def test_ndjson_decimales_como_texto_y_fechas_iso(self):
+        lineas = b''.join(iter_ndjson_report(iter(self.FILAS))).decode('utf-8').splitlines()
+        self.assertEqual(len(lineas), 2)
+        primera = json.loads(lineas[0])
+        self.assertEqual(primera['valor_actual'], '1234.50')
+        self.assertEqual(primera['fecha_adquisicion'], '2024-01-31')
+        self.assertIsNone(primera['categoria'])
+        self.assertEqual(json.loads(lineas[1])['valor_actual'], '0.10')
+
+    def test_parquet_ida_y_vuelta(self):
+        import pyarrow.parquet as pq
+
+        tabla = pq.read_table(io.BytesIO(b''.join(iter_parquet_report(iter(self.FILAS)))))
+        self.assertEqual(tabla.column_names, REPORT_KEYS)
+        self.assertEqual(tabla.to_pylist()[1], dict(zip(REPORT_KEYS, self.FILAS[1])))
+        self.assertEqual(tabla.column('valor_actual').to_pylist(), [Decimal('1234.50'), Decimal('0.10')])
+        # Sin filas: archivo válido, con el esquema y 0 filas
+        vacia = pq.read_table(io.BytesIO(b''.join(iter_parquet_report(iter([])))))
+        self.assertEqual((vacia.num_rows, vacia.column_names), (0, REPORT_KEYS))
+
+    def test_endpoint_rechaza_formatos_desconocidos_o_no_disponibles(self):
+        empresa, user, _ = crear_empresa_con_empleado()
+        user.is_staff = True
+        user.save()
+        client = APIClient()
+        client.force_authenticate(user=user, token={'empresa_id': str(empresa.id)})
+        url = reverse('reporte_query_export')
+
+        response = client.post(url, {'filters': [], 'format': 'xyz'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Formato no soportado', response.data['detail'])
+        with mock.patch('api.views.export_format_available', return_value=False):
+            response = client.post(url, {'filters': [], 'format': 'parquet'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no está disponible', response.data['detail'])
+
+
+class SearchDocumentTests(TestCase):
+
+    def setUp(self):
+        self.empresa, _, _ = crear_empresa_con_empleado()
+        self.categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        self.activo = ActivoFijo.objects.create(
+            empresa=self.empresa, nombre='Laptop Dell', codigo_interno='AF-1',
+            fecha_adquisicion=datetime.date(2024, 1, 1), valor_actual=Decimal('100.00'), vida_util=5,
+            categoria=self.categoria,
+            estado=Estado.objects.create(empresa=self.empresa, nombre='En Uso'),
+            ubicacion=Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina'),
+            departamento=Departamento.objects.create(empresa=self.empresa, nombre='Finanzas'),
+        )
+
+    def buscar(self, texto):
+        return list(parse_and_build_query([texto], ActivoFijo.objects.filter(empresa=self.empresa)))
+
+    def test_busca_en_nombres_relacionados(self):
+        self.assertEqual(self.buscar('FINANZ'), [self.activo])
+        self.assertEqual(self.buscar('dell'), [self.activo])
+        self.assertEqual(self.buscar('cocina'), [])
+
+    def test_renombrar_catalogo_actualiza_documento(self):
+        self.categoria.nombre = 'Computación'
+        self.categoria.save()
+        self.assertEqual(self.buscar('computación'), [self.activo])
+        self.assertEqual(self.buscar('equipos'), [])
+
+    def test_eliminar_departamento_limpia_documento(self):
+        self.activo.departamento.delete()
+        self.assertEqual(self.buscar('finanzas'), [])
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.empresa, _, _ = crear_empresa_con_empleado()
+        self.activos = [
+            ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=f'Activo {n}', codigo_interno=f'AF-{n}',
+                # Fechas repetidas: el cursor debe desempatar por id
+                fecha_adquisicion=datetime.date(2024, 1, 1 + n // 2), valor_actual=Decimal('10.00'), vida_util=5,
+                categoria=CategoriaActivo.objects.get_or_create(empresa=self.empresa, nombre='Equipos')[0],
+                estado=Estado.objects.get_or_create(empresa=self.empresa, nombre='En Uso')[0],
+                ubicacion=Ubicacion.objects.get_or_create(empresa=self.empresa, nombre='Oficina')[0],
+            )
+            for n in range(7)
+        ]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        queryset = ActivoFijo.objects.filter(empresa=self.empresa)
+        paginador = KeysetPagination()
+        vistos, params = [], {'page_size': 3, 'count': 'exact'}
+        while True:
+            pagina = paginador.paginate(queryset, params, ('id', 'fecha_adquisicion'))
+            vistos += [fila['id'] for fila in pagina['results']]
+            if not pagina['has_more']:
+                break
+            params = {'page_size': 3, 'cursor': pagina['next_cursor']}
+        esperado = sorted(self.activos, key=lambda a: (a.fecha_adquisicion, a.id))
+        self.assertEqual(vistos, [a.id for a in esperado])
+        self.assertIsNone(pagina['next_cursor'])
+
+    def test_total_exacto_solo_bajo_demanda(self):
+        queryset = ActivoFijo.objects.filter(empresa=self.empresa)
+        pagina = KeysetPagination().paginate(queryset, {}, ('id', 'fecha_adquisicion'))
+        self.assertNotIn('total', pagina)
+        self.assertIn('approximate_total', pagina)
+        pagina = KeysetPagination().paginate(queryset, {'count': 'exact'}, ('id', 'fecha_adquisicion'))
+        self.assertEqual(pagina['total'], 7)
+
+
+class ReportCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.empresa, _, _ = crear_empresa_con_empleado()
+        self.categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        self.activo = ActivoFijo.objects.create(
+            empresa=self.empresa, nombre='Laptop Dell', codigo_interno='AF-1',
+            fecha_adquisicion=datetime.date(2024, 1, 1), valor_actual=Decimal('100.00'), vida_util=5,
+            categoria=self.categoria,
+            estado=Estado.objects.create(empresa=self.empresa, nombre='En Uso'),
+            ubicacion=Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina'),
+        )
+
+    def filtrar(self, filtros):
+        base = ActivoFijo.objects.filter(empresa=self.empresa)
+        return list(filter_report_queryset(self.empresa.id, filtros, base, parse_and_build_query))
+
+    def test_filtros_normalizados_reutilizan_los_ids(self):
+        self.assertEqual(self.filtrar(['laptop', 'valor > 50']), [self.activo])
+        # Mismo conjunto en otro orden y con espacios: una sola consulta (los activos por pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.filtrar(['valor >  50', ' laptop']), [self.activo])
+
+    def test_escritura_invalida_la_cache(self):
+        self.assertEqual(self.filtrar(['equipos']), [self.activo])
+        self.categoria.nombre = 'Mobiliario'
+        self.categoria.save()
+        self.assertEqual(self.filtrar(['equipos']), [])
+
+    def test_fechas_relativas_cambian_de_clave_a_medianoche(self):
+        hoy = timezone.localdate()
+        self.activo.fecha_adquisicion = hoy
+        self.activo.save()
+        self.assertEqual(self.filtrar(['fecha_adq:hoy']), [self.activo])
+        # Al día siguiente "hoy" ya no incluye el activo: los ids de ayer no se reutilizan
+        with mock.patch('django.utils.timezone.localdate', return_value=hoy + datetime.timedelta(days=1)):
+            self.assertEqual(self.filtrar(['fecha_adq:hoy']), [])
+
+
+class ReportFilterLanguageTests(TestCase):
+
+    def setUp(self):
+        self.empresa, _, _ = crear_empresa_con_empleado()
+        estado = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        baja = Estado.objects.create(empresa=self.empresa, nombre='Baja')
+        ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+        categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+
+        def crear(nombre, valor, fecha, estado):
+            return ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=nombre, codigo_interno=nombre[:10], fecha_adquisicion=fecha,
+                valor_actual=Decimal(valor), vida_util=5, categoria=categoria, estado=estado, ubicacion=ubicacion,
+            )
+        self.laptop = crear('Laptop', '1500.00', datetime.date(2024, 3, 10), estado)
+        self.tablet = crear('Tablet', '400.00', datetime.date(2023, 6, 1), estado)
+        self.silla = crear('Silla', '80.00', datetime.date(2024, 11, 20), baja)
+
+    def buscar(self, *filtros):
+        qs = parse_and_build_query(list(filtros), ActivoFijo.objects.filter(empresa=self.empresa))
+        return set(qs.values_list('nombre', flat=True))
+
+    def test_or_not_y_parentesis(self):
+        self.assertEqual(self.buscar('laptop OR tablet'), {'Laptop', 'Tablet'})
+        self.assertEqual(self.buscar('-estado:baja'), {'Laptop', 'Tablet'})
+        self.assertEqual(self.buscar('NOT (laptop OR estado=baja)'), {'Tablet'})
+
+    def test_rangos_listas_y_fechas(self):
+        self.assertEqual(self.buscar('valor:100..1500'), {'Laptop', 'Tablet'})
+        self.assertEqual(self.buscar('valor:..400'), {'Tablet', 'Silla'})
+        self.assertEqual(self.buscar('estado:(baja, "en uso")'), {'Laptop', 'Tablet', 'Silla'})
+        self.assertEqual(self.buscar('fecha_adq:2024'), {'Laptop', 'Silla'})
+        self.assertEqual(self.buscar('fecha_adq>2024-03'), {'Silla'})
+        # Varios filtros de la lista se combinan con AND
+        self.assertEqual(self.buscar('fecha_adq:2024', 'valor>100'), {'Laptop'})
+
+    def test_valores_sin_comillas_como_antes(self):
+        # El valor de `campo:` sin comillas llega hasta el siguiente operador, como en el parser anterior
+        self.assertEqual(
+            _Parser(tokenize('depto:Recursos Humanos')).parse(), Predicate('depto', ':', 'Recursos Humanos')
+        )
+        self.assertEqual(
+            _Parser(tokenize('depto:Recursos Humanos OR valor>100')).parse(),
+            Or((Predicate('depto', ':', 'Recursos Humanos'), Predicate('valor', '>', '100'))),
+        )
+        rrhh = Departamento.objects.create(empresa=self.empresa, nombre='Recursos Humanos')
+        ActivoFijo.objects.filter(pk=self.tablet.pk).update(departamento=rrhh)
+        self.assertEqual(self.buscar('depto:Recursos Humanos'), {'Tablet'})
+        self.assertEqual(self.buscar('depto:recursos humanos valor>1000'), set())
+
+    def test_apostrofo_suelto_es_literal(self):
+        ActivoFijo.objects.filter(pk=self.silla.pk).update(nombre="Silla O'Brien")
+        self.assertEqual(self.buscar("nombre:O'Brien"), {"Silla O'Brien"})
+        self.assertEqual(self.buscar("nombre:'silla o'"), {"Silla O'Brien"})
+
+    def test_filtros_mal_formados(self):
+        for filtro in ('foo:bar', 'valor>abc', '(laptop', 'depto>3', 'laptop OR'):
+            with self.subTest(filtro=filtro):
+                with self.assertRaises(FilterSyntaxError):
+                    self.buscar(filtro)
+
+
+class PresupuestoReportQueryCountTests(TestCase):
+    """Los totales por período salen de las partidas precargadas: sin N+1."""
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        self.departamento = Departamento.objects.create(empresa=self.empresa, nombre='Finanzas')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+
+    def crear_periodos(self, cantidad, desde=0):
+        for n in range(desde, desde + cantidad):
+            periodo = PeriodoPresupuestario.objects.create(
+                empresa=self.empresa, nombre=f'Gestión {2000 + n}',
+                fecha_inicio=datetime.date(2000 + n, 1, 1), fecha_fin=datetime.date(2000 + n, 12, 31),
+            )
+            for m in range(2):
+                PartidaPresupuestaria.objects.create(
+                    periodo=periodo, departamento=self.departamento, nombre=f'Partida {m}',
+                    monto_asignado=Decimal('1000.00'), monto_gastado=Decimal('250.00'),
+                )
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_consultas_constantes_por_numero_de_periodos(self):
+        for url_name in ('reporte-presupuesto-list', 'periodo-presupuestario-list'):
+            with self.subTest(url_name=url_name):
+                PeriodoPresupuestario.objects.all().delete()
+                url = reverse(url_name)
+                self.crear_periodos(1)
+                con_uno, _ = self.contar_consultas(url)
+                self.crear_periodos(5, desde=1)
+                con_seis, response = self.contar_consultas(url)
+                self.assertEqual(con_uno, con_seis)
+
+                periodo = response.data['results'][0]
+                self.assertEqual(Decimal(periodo['total_gastado_periodo']), Decimal('500.00'))
+                self.assertEqual(Decimal(periodo['ahorro_o_sobregasto']), Decimal('1500.00'))
+
+
+class DepreciacionLoteTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        estado = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+        self.activos = [
+            ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=f'Laptop {n}', codigo_interno=f'AF-{n}',
+                fecha_adquisicion=datetime.date(2025, 1, 1), valor_actual=Decimal('1200.00'), vida_util=1,
+                categoria=categoria, estado=estado, ubicacion=ubicacion,
+            )
+            for n in range(5)
+        ]
+        obtener_snapshot(self.empresa.id)
+
+    def test_lote_idempotente_por_periodo(self):
+        # Enero de un activo de 12 meses de vida: 1200 / 12 = 100 por activo
+        resumen = ejecutar_depreciacion_lote(self.empresa.id, '2025-01', 'STRAIGHT_LINE', chunk_size=2)
+        self.assertEqual((resumen['depreciados'], resumen['monto_total']), (5, Decimal('500.00')))
+        repetido = ejecutar_depreciacion_lote(self.empresa.id, '2025-01', 'STRAIGHT_LINE', chunk_size=2)
+        self.assertEqual((repetido['depreciados'], repetido['omitidos_ya_depreciados']), (0, 5))
+
+        self.assertEqual(DepreciacionActivo.objects.filter(periodo='2025-01').count(), 5)
+        self.assertEqual(ActivoFijo.objects.get(pk=self.activos[0].pk).valor_actual, Decimal('1100.00'))
+        self.assertEqual(obtener_snapshot(self.empresa.id).valor_total_activos, Decimal('5500.00'))
+
+    def test_individual_y_lote_no_duplican_el_mes(self):
+        cache.clear()
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Contador')
+        rol.permisos.add(Permisos.objects.create(nombre='manage_depreciacion', descripcion='Depreciar'))
+        Empleado.objects.get(usuario=self.user).roles.add(rol)
+        client = APIClient()
+        client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        url = reverse('depreciacion-ejecutar')
+        datos = {'activo_id': str(self.activos[0].pk), 'monto': '50', 'periodo': '2025-01'}
+
+        self.assertEqual(client.post(url, datos, format='json').status_code, 201)
+        self.assertEqual(client.post(url, datos, format='json').status_code, 409)
+        # El lote del mismo mes omite el activo ya depreciado a mano
+        resumen = ejecutar_depreciacion_lote(self.empresa.id, '2025-01', 'STRAIGHT_LINE')
+        self.assertEqual((resumen['depreciados'], resumen['omitidos_ya_depreciados']), (4, 1))
+        self.assertEqual(DepreciacionActivo.objects.filter(activo=self.activos[0]).count(), 1)
+
+    def test_saldo_decreciente_requiere_tasa(self):
+        with self.assertRaises(ValueError):
+            ejecutar_depreciacion_lote(self.empresa.id, '2025-01', 'DECLINING_BALANCE')
+        resumen = ejecutar_depreciacion_lote(self.empresa.id, '2025-01', 'DECLINING_BALANCE', tasa=Decimal('0.24'))
+        # 1200 * 0.24 / 12 = 24 por activo
+        self.assertEqual(resumen['monto_total'], Decimal('120.00'))
+
+
+class RevalorizacionLoteTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        self.categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        muebles = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Muebles')
+        estado = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+        valores = [(self.categoria, '1000.00'), (self.categoria, '333.33'), (self.categoria, '0.00'), (muebles, '500.00')]
+        self.activos = [
+            ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=f'Activo {n}', codigo_interno=f'AF-{n}',
+                fecha_adquisicion=datetime.date(2025, 1, 1), valor_actual=Decimal(valor), vida_util=5,
+                categoria=categoria, estado=estado, ubicacion=ubicacion,
+            )
+            for n, (categoria, valor) in enumerate(valores)
+        ]
+        obtener_snapshot(self.empresa.id)
+
+    def test_dry_run_no_escribe(self):
+        resumen = revalorizar_lote(self.empresa.id, 'porcentual', '10', categoria_id=self.categoria.id, dry_run=True)
+        # El activo con valor cero no se puede revalorizar por porcentaje
+        self.assertEqual((resumen['activos'], resumen['omitidos_valor_cero']), (2, 1))
+        self.assertEqual(resumen['valor_nuevo_total'], Decimal('1466.66'))
+        self.assertFalse(RevalorizacionActivo.objects.exists())
+        self.assertEqual(ActivoFijo.objects.get(pk=self.activos[0].pk).valor_actual, Decimal('1000.00'))
+
+    def test_lote_actualiza_valores_e_historial(self):
+        simulado = revalorizar_lote(self.empresa.id, 'porcentual', '10', categoria_id=self.categoria.id, dry_run=True)
+        resumen = revalorizar_lote(self.empresa.id, 'porcentual', '10', categoria_id=self.categoria.id, chunk_size=1)
+        self.assertEqual(
+            (resumen['activos'], resumen['valor_anterior_total'], resumen['valor_nuevo_total']),
+            (simulado['activos'], simulado['valor_anterior_total'], simulado['valor_nuevo_total']),
+        )
+        self.assertEqual(RevalorizacionActivo.objects.count(), 2)
+        self.assertEqual(ActivoFijo.objects.get(pk=self.activos[1].pk).valor_actual, Decimal('366.66'))
+        self.assertEqual(ActivoFijo.objects.get(pk=self.activos[3].pk).valor_actual, Decimal('500.00'))
+        self.assertEqual(obtener_snapshot(self.empresa.id).valor_total_activos, Decimal('1966.66'))
+
+
+class ProyeccionDepreciacionTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        ActivoFijo.objects.create(
+            empresa=self.empresa, nombre='Laptop', codigo_interno='AF-1',
+            fecha_adquisicion=datetime.date(2025, 1, 1), valor_actual=Decimal('1200.00'), vida_util=3,
+            categoria=CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos'),
+            estado=Estado.objects.create(empresa=self.empresa, nombre='En Uso'),
+            ubicacion=Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        self.url = reverse('depreciacion-proyeccion')
+
+    def test_cronograma_linea_recta_json(self):
+        response = self.client.get(self.url, {'desde': '2025-07'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join(response.streaming_content))
+        cronograma = data['activos'][0]['cronograma']
+        # 30 meses restantes a 40/mes: 6 meses de 2025, 2026 completo, 2027 completo
+        self.assertEqual(
+            [(año['anio'], Decimal(año['depreciacion']), Decimal(año['valor_final'])) for año in cronograma],
+            [(2025, Decimal('240.00'), Decimal('960.00')), (2026, Decimal('480.00'), Decimal('480.00')),
+             (2027, Decimal('480.00'), Decimal('0.00'))],
+        )
+
+    def test_excel_y_validacion(self):
+        response = self.client.get(self.url, {'formato': 'excel', 'depreciation_type': 'declining_balance',
+                                              'tasa_depreciacion': '0.4'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+        response = self.client.get(self.url, {'depreciation_type': 'DECLINING_BALANCE'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CierreMensualTests(TestCase):
+
+    def setUp(self):
+        self.empresa, _, _ = crear_empresa_con_empleado()
+        ActivoFijo.objects.create(
+            empresa=self.empresa, nombre='Laptop', codigo_interno='AF-1',
+            fecha_adquisicion=datetime.date(2025, 1, 1), valor_actual=Decimal('1200.00'), vida_util=1,
+            categoria=CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos'),
+            estado=Estado.objects.create(empresa=self.empresa, nombre='En Uso'),
+            ubicacion=Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina'),
+        )
+        self.periodo = PeriodoPresupuestario.objects.create(
+            empresa=self.empresa, nombre='Enero', estado='ACTIVO',
+            fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31),
+        )
+
+    def test_cierre_y_checkpoint(self):
+        checkpoint = cerrar_mes_empresa(self.empresa.id, '2025-01')
+        self.assertEqual(checkpoint.estado, 'COMPLETADO')
+        self.assertEqual((checkpoint.activos_depreciados, checkpoint.periodos_cerrados), (1, 1))
+        self.assertEqual(checkpoint.monto_depreciado, Decimal('100.00'))
+        self.periodo.refresh_from_db()
+        self.assertEqual(self.periodo.estado, 'CERRADO')
+        self.assertEqual(obtener_snapshot(self.empresa.id).valor_total_activos, Decimal('1100.00'))
+        # Una nueva corrida salta las empresas ya cerradas
+        self.assertEqual(empresas_pendientes([self.empresa.id], '2025-01'), [])
+        self.assertEqual(empresas_pendientes([self.empresa.id], '2025-02'), [self.empresa.id])
+
+    def test_comando_valida_tasa_antes_de_empezar(self):
+        for tasa in (None, 'abc', '0', '1.5'):
+            argumentos = ['--periodo', '2025-01', '--depreciation-type', 'DECLINING_BALANCE']
+            if tasa is not None:
+                argumentos += ['--tasa', tasa]
+            with self.assertRaises(CommandError):
+                call_command('month_end_close', *argumentos, stdout=io.StringIO())
+        # No se llegó a cerrar ninguna empresa
+        self.assertEqual(empresas_pendientes([self.empresa.id], '2025-01'), [self.empresa.id])
+
+
+class ValorAFechaTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        self.categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Equipos')
+        estado = Estado.objects.create(empresa=self.empresa, nombre='En Uso')
+        ubicacion = Ubicacion.objects.create(empresa=self.empresa, nombre='Oficina')
+
+        def activo(codigo, adquisicion, valor):
+            return ActivoFijo.objects.create(
+                empresa=self.empresa, nombre=codigo, codigo_interno=codigo, fecha_adquisicion=adquisicion,
+                valor_actual=Decimal(valor), vida_util=5, categoria=self.categoria, estado=estado, ubicacion=ubicacion,
+            )
+
+        def en_fecha(registro, fecha):
+            # `fecha` es auto_now_add: se fija después de crear (una depreciación sin
+            # período rige desde que se registra)
+            campos = {'fecha': timezone.make_aware(fecha)}
+            if isinstance(registro, DepreciacionActivo):
+                campos['fecha_efectiva'] = campos['fecha']
+            type(registro).objects.filter(pk=registro.pk).update(**campos)
+
+        # Depreciado en junio 2025 (1200 -> 1100) y revalorizado en febrero 2026 (1100 -> 1210)
+        self.laptop = activo('AF-1', datetime.date(2025, 1, 1), '1210.00')
+        en_fecha(DepreciacionActivo.objects.create(
+            empresa=self.empresa, activo=self.laptop, valor_anterior=Decimal('1200.00'),
+            valor_nuevo=Decimal('1100.00'), monto_depreciado=Decimal('100.00'),
+        ), datetime.datetime(2025, 6, 15, 10))
+        en_fecha(RevalorizacionActivo.objects.create(
+            empresa=self.empresa, activo=self.laptop, valor_anterior=Decimal('1100.00'),
+            valor_nuevo=Decimal('1210.00'), factor_aplicado=Decimal('1.1'),
+        ), datetime.datetime(2026, 2, 10, 10))
+        # Dado de baja en enero 2026 con 500 en libros
+        self.silla = activo('AF-2', datetime.date(2025, 1, 1), '0.00')
+        DisposicionActivo.objects.create(
+            empresa=self.empresa, activo=self.silla, tipo_disposicion='BAJA',
+            fecha_disposicion=datetime.date(2026, 1, 15), valor_en_libros=Decimal('500.00'),
+        )
+        # Adquirido en febrero 2026
+        activo('AF-3', datetime.date(2026, 2, 1), '300.00')
+        self.activos = ActivoFijo.objects.filter(empresa=self.empresa)
+
+    def valores(self, fecha):
+        return dict(valorizar_a_fecha(self.activos, fecha).values_list('codigo_interno', 'valor_a_fecha'))
+
+    def test_valor_por_activo_a_fecha(self):
+        self.assertEqual(self.valores(datetime.date(2025, 3, 31)), {'AF-1': Decimal('1200.00'), 'AF-2': Decimal('500.00')})
+        self.assertEqual(self.valores(datetime.date(2025, 12, 31)), {'AF-1': Decimal('1100.00'), 'AF-2': Decimal('500.00')})
+        self.assertEqual(
+            self.valores(datetime.date(2026, 3, 1)),
+            {'AF-1': Decimal('1210.00'), 'AF-2': Decimal('0.00'), 'AF-3': Decimal('300.00')},
+        )
+
+    def test_totales_en_una_consulta(self):
+        with CaptureQueriesContext(connection) as queries:
+            totales = totales_a_fecha(self.activos, datetime.date(2026, 3, 1))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(totales, {'activos': 2, 'dados_de_baja': 1, 'valor_en_libros': Decimal('1510.00')})
+        grupos = totales_a_fecha(self.activos, datetime.date(2025, 12, 31), agrupar_por='categoria')
+        self.assertEqual(grupos, [{'grupo': 'Equipos', 'activos': 2, 'dados_de_baja': 0, 'valor_en_libros': Decimal('1600.00')}])
+
+    def test_migracion_rellena_bajas_anteriores(self):
+        rellenar = import_module('api.migrations.0031_backfill_disposicion_valor_en_libros').rellenar_valor_en_libros
+        # Baja registrada antes de valor_en_libros: se toma el último movimiento hasta la baja
+        DisposicionActivo.objects.filter(activo=self.silla).update(valor_en_libros=None)
+        depreciacion = DepreciacionActivo.objects.create(
+            empresa=self.empresa, activo=self.silla, valor_anterior=Decimal('600.00'),
+            valor_nuevo=Decimal('550.00'), monto_depreciado=Decimal('50.00'),
+        )
+        registrada = timezone.make_aware(datetime.datetime(2025, 12, 31, 10))
+        DepreciacionActivo.objects.filter(pk=depreciacion.pk).update(fecha=registrada, fecha_efectiva=registrada)
+        rellenar(django_apps, None)
+        self.assertEqual(DisposicionActivo.objects.get(activo=self.silla).valor_en_libros, Decimal('550.00'))
+        self.assertEqual(self.valores(datetime.date(2025, 12, 31))['AF-2'], Decimal('550.00'))
+
+    def test_depreciacion_del_periodo_registrada_despues(self):
+        categoria = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Vehículos')
+        camioneta = ActivoFijo.objects.create(
+            empresa=self.empresa, nombre='Camioneta', codigo_interno='AF-4', fecha_adquisicion=datetime.date(2025, 12, 1),
+            valor_actual=Decimal('1200.00'), vida_util=1, categoria=categoria,
+            estado=self.laptop.estado, ubicacion=self.laptop.ubicacion,
+        )
+        # La depreciación de diciembre se corre (y se registra) en enero
+        enero = timezone.make_aware(datetime.datetime(2026, 1, 3, 9))
+        with mock.patch('django.utils.timezone.now', return_value=enero):
+            ejecutar_depreciacion_lote(self.empresa.id, '2025-12', 'STRAIGHT_LINE', categoria_id=categoria.id)
+        self.assertEqual(DepreciacionActivo.objects.get(activo=camioneta).fecha, enero)
+        qs = ActivoFijo.objects.filter(pk=camioneta.pk)
+        self.assertEqual(totales_a_fecha(qs, datetime.date(2025, 12, 31))['valor_en_libros'], Decimal('1100.00'))
+        self.assertEqual(totales_a_fecha(qs, datetime.date(2025, 12, 15))['valor_en_libros'], Decimal('1200.00'))
+
+    def test_endpoint_respeta_el_plan(self):
+        cache.clear()
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Contador')
+        rol.permisos.add(Permisos.objects.create(nombre='view_custom_reports', descripcion='Reportes'))
+        Empleado.objects.get(usuario=self.user).roles.add(rol)
+        suscripcion = Suscripcion.objects.create(empresa=self.empresa, fecha_inicio='2025-01-01', fecha_fin='2027-01-01')
+        client = APIClient()
+        client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        url = reverse('reporte_valor_a_fecha')
+
+        # Plan básico: sin reportes personalizables, como el reporte dinámico
+        response = client.post(url, {'fecha': '2025-12-31'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        suscripcion.plan = 'profesional'
+        suscripcion.save()
+        response = client.post(url, {'fecha': '2025-12-31'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totales']['valor_en_libros'], Decimal('1600.00'))
+
+
+class PushOutboxTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+
+    def test_push_se_escribe_en_la_transaccion(self):
+        class Rollback(Exception):
+            pass
+
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                encolar_push(self.user, 'token-1', 'Titulo', 'Cuerpo', {'id': 1})
+                raise Rollback
+        self.assertFalse(PushOutbox.objects.exists())
+
+        encolar_push(self.user, 'token-1', 'Titulo', 'Cuerpo', {'id': 1})
+        self.assertIsNone(encolar_push(self.user, None, 'Titulo', 'Sin token'))
+        mensaje = PushOutbox.objects.get()
+        self.assertEqual((mensaje.estado, mensaje.data), ('PENDIENTE', {'id': '1'}))
+
+
+class PushBatchDispatchTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, self.empleado = crear_empresa_con_empleado()
+        self.empleado.fcm_token = 'token-muerto'
+        self.empleado.save(update_fields=['fcm_token'])
+        self.otro_user = User.objects.create_user(username='otro', password='test123')
+        Empleado.objects.create(usuario=self.otro_user, empresa=self.empresa, ci='2', apellido_p='Rojas',
+                                fcm_token='token-vivo')
+
+    def test_lote_unico_y_poda_de_tokens(self):
+        for n in range(3):
+            encolar_push(self.otro_user, 'token-vivo', 'Titulo', f'Mensaje {n}')
+        encolar_push(self.user, 'token-muerto', 'Titulo', 'Mensaje')
+        transport = FakeTransport(invalid_tokens={'token-muerto'})
+
+        self.assertEqual(despachar_pendientes(transport=transport), (3, 1))
+        self.assertEqual(transport.batches, 1)
+        self.assertEqual(PushOutbox.objects.filter(estado='ENVIADO').count(), 3)
+        self.empleado.refresh_from_db()
+        self.assertIsNone(self.empleado.fcm_token)
+        self.assertEqual(despachar_pendientes(transport=transport), (0, 0))
+
+
+class PushRetryTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, _ = crear_empresa_con_empleado()
+        self.transport = FakeTransport(failing_tokens={'token-1'})
+
+    def test_backoff_y_dead_letter(self):
+        encolar_push(self.user, 'token-1', 'Titulo', 'Cuerpo')
+        self.assertEqual(despachar_pendientes(transport=self.transport), (0, 1))
+        mensaje = PushOutbox.objects.get()
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('PENDIENTE', 1))
+        self.assertGreater(mensaje.proximo_intento, timezone.now())
+        # Aún no vence el próximo intento: nada que enviar
+        self.assertEqual(despachar_pendientes(transport=self.transport), (0, 0))
+
+        PushOutbox.objects.update(proximo_intento=timezone.now(), intentos=7)
+        self.assertEqual(despachar_pendientes(transport=self.transport), (0, 1))
+        mensaje.refresh_from_db()
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('FALLIDO', 8))
+
+    def test_reintento_exitoso(self):
+        encolar_push(self.user, 'token-1', 'Titulo', 'Cuerpo')
+        despachar_pendientes(transport=self.transport)
+        self.transport.failing_tokens.clear()
+        PushOutbox.objects.update(proximo_intento=timezone.now())
+        self.assertEqual(despachar_pendientes(transport=self.transport), (1, 0))
+        self.assertEqual(PushOutbox.objects.get().estado, 'ENVIADO')
+
+
+class NotificacionFanOutTests(TestCase):
+
+    def setUp(self):
+        self.empresa, self.user, self.empleado = crear_empresa_con_empleado()
+        admin = Roles.objects.create(empresa=self.empresa, nombre='Admin')
+        self.empleado.roles.add(admin)
+        self.admins = [self.user]
+        for n in range(20):
+            user = User.objects.create_user(username=f'emp{n}', password='test123')
+            empleado = Empleado.objects.create(usuario=user, empresa=self.empresa, ci=f'E{n}', apellido_p='Rojas',
+                                               fcm_token=f'token-{n}' if n % 2 else None)
+            if n < 3:
+                empleado.roles.add(admin)
+                self.admins.append(user)
+        self.externo = User.objects.create_user(username='externo', password='test123')
+
+    def test_anuncio_a_toda_la_empresa_en_pocas_consultas(self):
+        with self.assertNumQueries(3):
+            notificaciones = notificar('Inventario anual el lunes', 'Anuncio', empresa_id=self.empresa.id, todos=True)
+        self.assertEqual(len(notificaciones), 21)
+        self.assertEqual(PushOutbox.objects.count(), 10)
+        push = PushOutbox.objects.first()
+        self.assertEqual(push.data['id'], str(Notificacion.objects.get(destinatario=push.destinatario).id))
+
+    def test_roles_excluir_y_usuarios_sin_empleado(self):
+        notificaciones = notificar('Nueva solicitud', 'Solicitud', empresa_id=self.empresa.id, roles=['Admin'],
+                                   usuarios=[self.externo.id], excluir=[self.user.id])
+        self.assertEqual(
+            {n.destinatario_id for n in notificaciones},
+            {u.id for u in self.admins[1:]} | {self.externo.id},
+        )
+
+    def test_endpoint_valida_destinatarios(self):
+        cache.clear()
+        Roles.objects.get(nombre='Admin').permisos.add(
+            Permisos.objects.create(nombre='view_dashboard', descripcion='Ver dashboard'),
+            Permisos.objects.create(nombre='manage_empleado', descripcion='Gestionar empleados'),
+        )
+        otra_empresa, _, _ = crear_empresa_con_empleado('Otra', '200', 'otro')
+        ajeno = Departamento.objects.create(empresa=otra_empresa, nombre='Finanzas')
+        client = APIClient()
+        client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        url = reverse('notificacion-anunciar')
+
+        for destinatarios in ({'roles': 'Admin'}, {'departamentos': ['Finanzas']}, {'departamentos': [str(ajeno.id)]},
+                              {'roles': ['Gerencia']}, {'usuarios': [self.externo.id]}):
+            with self.subTest(destinatarios=destinatarios):
+                response = client.post(url, {'mensaje': 'Hola', **destinatarios}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Notificacion.objects.exists())
+
+        response = client.post(url, {'mensaje': 'Hola', 'roles': ['Admin']}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['notificaciones'], 4)
+
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.empresa, self.user, empleado = crear_empresa_con_empleado()
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Usuario')
+        rol.permisos.add(Permisos.objects.create(nombre='view_dashboard', descripcion='Ver dashboard'))
+        empleado.roles.add(rol)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user, token={'empresa_id': str(self.empresa.id)})
+        self.url = reverse('notificacion-unread-count')
+
+    def unread(self):
+        return self.client.get(self.url).data['unread_count']
+
+    def test_contador_en_cache(self):
+        self.assertEqual(self.unread(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            notificar('Hola', 'Aviso', usuarios=[self.user.id, self.user.id])
+            notificacion = Notificacion.objects.create(destinatario=self.user, mensaje='Otra')
+        # Lectura de caché: sin COUNT sobre la tabla
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_no_leidas(self.user.id), 2)
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notificacion-marcar-leido', args=[notificacion.id]))
+        self.assertEqual(self.unread(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notificacion-marcar-todo-leido'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread(), 0)
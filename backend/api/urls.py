@@ -12,9 +12,10 @@ from .views import (
     RolesViewSet, LogViewSet, EstadoViewSet, UbicacionViewSet, ProveedorViewSet, PermisosViewSet,
     RegisterEmpresaView, MyTokenObtainPairView, UserPermissionsView, MantenimientoViewSet, SuscripcionViewSet, NotificacionViewSet,
     MyThemePreferencesView, ReporteQueryView, ReporteQueryExportView, RevalorizacionActivoViewSet, DepreciacionActivoViewSet,
+    ReporteValorAFechaView,
     DashboardDataView, FCMTokenView, # <--- AÑADIDO
     SolicitudCompraViewSet, OrdenCompraViewSet, PeriodoPresupuestarioViewSet, PartidaPresupuestariaViewSet, MovimientoPresupuestarioViewSet, ReportePresupuestosViewSet,
-    DisposicionActivoViewSet
+    DisposicionActivoViewSet, ReporteExportJobViewSet
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -43,6 +44,7 @@ router.register(r'depreciaciones', DepreciacionActivoViewSet, basename='deprecia
 router.register(r'disposiciones', DisposicionActivoViewSet, basename='disposicion') # NEW
 router.register(r'solicitudes-compra', SolicitudCompraViewSet, basename='solicitud-compra')
 router.register(r'ordenes-compra', OrdenCompraViewSet, basename='orden-compra')
+router.register(r'reportes/exportaciones', ReporteExportJobViewSet, basename='reporte-export-job')
 
 urlpatterns = [
     path('dashboard/', DashboardDataView.as_view(), name='dashboard_data'),
@@ -51,6 +53,7 @@ urlpatterns = [
     ##path('reportes/activos-export/', ReporteActivosExport.as_view(), name='reporte_activos_export'),       
     path('reportes/query/', ReporteQueryView.as_view(), name='reporte_query_preview'),
     path('reportes/query/export/', ReporteQueryExportView.as_view(), name='reporte_query_export'),
+    path('reportes/valor-a-fecha/', ReporteValorAFechaView.as_view(), name='reporte_valor_a_fecha'),
     path('register/', RegisterEmpresaView.as_view(), name='register_empresa'),
     path('', include(router.urls)),
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -0,0 +1,78 @@
+# api/usage_utils.py
+import logging
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import ActivoFijo, Empleado, Suscripcion
+
+logger = logging.getLogger(__name__)
+
+# Campo de límite del plan -> contador de uso que lo acompaña en Suscripcion
+USAGE_FIELD_FOR_LIMIT = {
+    'max_usuarios': 'usuarios_usados',
+    'max_activos': 'activos_usados',
+}
+
+# Modelo contado -> contador de uso
+USAGE_FIELD_FOR_MODEL = {
+    Empleado: 'usuarios_usados',
+    ActivoFijo: 'activos_usados',
+}
+
+def ajustar_uso(empresa_id, campo, delta):
+    """
+    Suma `delta` al contador `campo` de la suscripción de la empresa con un UPDATE
+    atómico (F-expression), sin leer la fila. Nunca baja de 0.
+    """
+    if not delta:
+        return
+    if delta > 0:
+        expresion = F(campo) + delta
+    else:
+        expresion = Greatest(F(campo) + delta, Value(0))
+    Suscripcion.objects.filter(empresa_id=empresa_id).update(**{campo: expresion})
+
+def _conteo_real(model):
+    conteo = (
+        model.objects.filter(empresa_id=OuterRef('empresa_id'))
+        .order_by()
+        .values('empresa_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(conteo, output_field=IntegerField()), Value(0))
+
+def recalcular_uso(empresa_id):
+    """Fija los contadores de la empresa a partir de los conteos reales (un solo UPDATE)."""
+    Suscripcion.objects.filter(empresa_id=empresa_id).update(
+        usuarios_usados=_conteo_real(Empleado),
+        activos_usados=_conteo_real(ActivoFijo),
+    )
+
+def reconciliar_uso(empresa_ids=None):
+    """
+    Recalcula los contadores de uso contra las tablas reales y corrige las
+    suscripciones que se hayan desviado. Devuelve la lista de correcciones:
+    [(empresa_id, campo, valor_anterior, valor_real), ...]
+    """
+    qs = Suscripcion.objects.all()
+    if empresa_ids is not None:
+        qs = qs.filter(empresa_id__in=empresa_ids)
+
+    desviadas = qs.annotate(
+        real_usuarios=_conteo_real(Empleado),
+        real_activos=_conteo_real(ActivoFijo),
+    ).filter(
+        ~Q(usuarios_usados=F('real_usuarios')) | ~Q(activos_usados=F('real_activos'))
+    ).values('pk', 'empresa_id', 'usuarios_usados', 'activos_usados', 'real_usuarios', 'real_activos')
+
+    correcciones = []
+    for fila in desviadas:
+        recalcular_uso(fila['empresa_id'])
+        if fila['usuarios_usados'] != fila['real_usuarios']:
+            correcciones.append((fila['empresa_id'], 'usuarios_usados', fila['usuarios_usados'], fila['real_usuarios']))
+        if fila['activos_usados'] != fila['real_activos']:
+            correcciones.append((fila['empresa_id'], 'activos_usados', fila['activos_usados'], fila['real_activos']))
+
+    for empresa_id, campo, antes, despues in correcciones:
+        logger.warning(f"Contador de uso corregido: empresa={empresa_id} {campo} {antes} -> {despues}")
+    return correcciones
@@ -0,0 +1,102 @@
+# api/valuation_utils.py
+import datetime
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import DepreciacionActivo, DisposicionActivo, RevalorizacionActivo
+
+# --- Valor en libros a una fecha ("valor as of") ---
+#
+# Cada depreciación y revalorización guarda el valor anterior y el nuevo del activo.
+# El valor al cierre del día D es entonces el `valor_anterior` del primer cambio
+# que rige después de D; si no hubo cambios posteriores, el valor en libros de
+# una baja posterior a D (la baja deja valor_actual en cero) o el `valor_actual`.
+# Una depreciación rige desde el cierre de su período (`fecha_efectiva`), no desde
+# que se registró: la de diciembre, corrida en enero, ya cuenta al 31/12.
+# No hay que recorrer el historial: por activo basta leer una fila de cada tabla,
+# la primera que rige desde D+1, por los índices (activo, fecha) — una subconsulta
+# correlacionada que PostgreSQL resuelve como un lateral con LIMIT 1.
+#
+# Los activos adquiridos después de D no existen a esa fecha; los dados de baja
+# hasta D valen cero. Un cambio de valor_actual hecho editando el activo (sin
+# historial) no se puede situar en el tiempo y se refleja en todas las fechas
+# posteriores al último movimiento registrado.
+
+VALOR_FIELD = DecimalField(max_digits=12, decimal_places=2)
+AGRUPACIONES = ('categoria', 'departamento', 'ubicacion')
+
+# Tablas de historial: (alias de la anotación, modelo, campo con la fecha desde la que rige)
+HISTORIAL_VALOR = (
+    ('deprec', DepreciacionActivo, 'fecha_efectiva'),
+    ('reval', RevalorizacionActivo, 'fecha'),
+)
+
+def inicio_dia_siguiente(fecha):
+    """Corte de `fecha` (inclusive) para los DateTimeField: 00:00 del día siguiente, hora local."""
+    return timezone.make_aware(datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min))
+
+def parse_fecha(valor):
+    """'AAAA-MM-DD' -> date. Lanza ValueError con un mensaje para el usuario."""
+    if isinstance(valor, datetime.date):
+        return valor
+    try:
+        return datetime.date.fromisoformat(str(valor))
+    except (TypeError, ValueError):
+        raise ValueError("La fecha debe tener el formato AAAA-MM-DD.")
+
+def valorizar_a_fecha(queryset, fecha):
+    """
+    Anota cada activo de `queryset` con `valor_a_fecha` y `dado_de_baja` al cierre de
+    `fecha`, excluyendo los adquiridos después. Es una sola consulta: se puede
+    paginar, filtrar o agregar como cualquier queryset de ActivoFijo.
+    """
+    corte = inicio_dia_siguiente(fecha)
+    anotaciones = {}
+    for alias, modelo, campo_fecha in HISTORIAL_VALOR:
+        siguiente = modelo.objects.filter(activo_id=OuterRef('pk'), **{f'{campo_fecha}__gte': corte}).order_by(campo_fecha)
+        anotaciones[f'_{alias}_fecha'] = Subquery(siguiente.values(campo_fecha)[:1])
+        anotaciones[f'_{alias}_valor'] = Subquery(siguiente.values('valor_anterior')[:1], output_field=VALOR_FIELD)
+    anotaciones['dado_de_baja'] = Exists(
+        DisposicionActivo.objects.filter(activo_id=OuterRef('pk'), fecha_disposicion__lte=fecha)
+    )
+    baja_posterior = DisposicionActivo.objects.filter(activo_id=OuterRef('pk'), fecha_disposicion__gt=fecha)
+    anotaciones['_baja_valor'] = Subquery(baja_posterior.values('valor_en_libros')[:1], output_field=VALOR_FIELD)
+
+    # El primer cambio posterior de cualquiera de las dos tablas
+    valor_libros = Case(
+        When(Q(_deprec_fecha__isnull=False) & (Q(_reval_fecha__isnull=True) | Q(_deprec_fecha__lte=F('_reval_fecha'))),
+             then='_deprec_valor'),
+        When(_reval_fecha__isnull=False, then='_reval_valor'),
+        default=Coalesce('_baja_valor', 'valor_actual', output_field=VALOR_FIELD),
+        output_field=VALOR_FIELD,
+    )
+    return queryset.filter(fecha_adquisicion__lte=fecha).annotate(**anotaciones).annotate(
+        valor_a_fecha=Case(
+            When(dado_de_baja=True, then=Value(Decimal('0.00'), output_field=VALOR_FIELD)),
+            default=valor_libros,
+            output_field=VALOR_FIELD,
+        )
+    )
+
+def totales_a_fecha(queryset, fecha, agrupar_por=None):
+    """
+    Totales de la cartera al cierre de `fecha` en una consulta: activos vigentes,
+    dados de baja y valor en libros. Con `agrupar_por` ('categoria', 'departamento'
+    o 'ubicacion') devuelve una lista con los totales de cada grupo.
+    """
+    if agrupar_por is not None and agrupar_por not in AGRUPACIONES:
+        raise ValueError(f"agrupar_por debe ser uno de: {', '.join(AGRUPACIONES)}.")
+    valorizados = valorizar_a_fecha(queryset, fecha).order_by()
+    metricas = {
+        'activos': Count('pk', filter=Q(dado_de_baja=False)),
+        'dados_de_baja': Count('pk', filter=Q(dado_de_baja=True)),
+        'valor_en_libros': Coalesce(Sum('valor_a_fecha'), Value(Decimal('0.00')), output_field=VALOR_FIELD),
+    }
+    if agrupar_por is None:
+        return valorizados.aggregate(**metricas)
+    campo = f'{agrupar_por}__nombre'
+    return [
+        {'grupo': fila[campo], **{k: fila[k] for k in metricas}}
+        for fila in valorizados.values(campo).annotate(**metricas).order_by(campo)
+    ]
@@ -2,10 +2,10 @@
 from rest_framework import viewsets, status, serializers
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from .permissions import HasPermission, check_permission
+from .permissions import HasPermission, check_permission, get_user_permissions
 import io
 import qrcode
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, FileResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action # <-- Importar action
@@ -23,8 +23,26 @@ import logging
 from django.db.models import Q, Sum, Count
 import re
 from datetime import datetime
-from .report_utils import create_excel_report, create_pdf_report
-from .fcm_utils import send_fcm_notification # <--- NUEVO
+from .report_utils import (
+    create_excel_report, create_pdf_report, create_export_response, export_format_available, EXPORT_FORMATS,
+    EXCEL_CONTENT_TYPE,
+)
+from .report_query import FilterSyntaxError, parse_and_build_query, report_base_queryset
+from .notification_utils import notificar # <--- NUEVO
+from .notification_counters import contar_no_leidas, reiniciar_no_leidas
+from .tenant import get_tenant_context
+from .log_utils import log_debug
+from .usage_utils import USAGE_FIELD_FOR_LIMIT
+from .dashboard_utils import obtener_snapshot, snapshot_a_respuesta
+from .pagination import KeysetPagination
+from .depreciation_utils import (
+    BATCH_DEPRECIATION_TYPES, activos_depreciables, ejecutar_depreciacion_lote, filas_proyeccion, iter_proyeccion,
+    iter_proyeccion_excel, iter_proyeccion_json, periodo_actual, rango_periodo, validar_parametros_proyeccion,
+    cierre_periodo,
+)
+from .report_cache import cached_report_result, filter_report_queryset, report_scope
+from .revaluation_utils import revalorizar_lote
+from .valuation_utils import AGRUPACIONES as VALUATION_GROUPS, parse_fecha, totales_a_fecha, valorizar_a_fecha
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 import boto3
@@ -122,7 +140,7 @@ class MyThemePreferencesView(APIView):
         except serializers.ValidationError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-             print(f"ERROR en MyThemePreferencesView.patch: {e}")
+             logger.error(f"Error en MyThemePreferencesView.patch: {e}", exc_info=True)
              return Response({"detail": "Error interno."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)        
         
 # --- VISTA DE LOGIN PERSONALIZADA ---
@@ -154,24 +172,22 @@ class BaseTenantViewSet(viewsets.ModelViewSet):
         """
         # 1. Si el usuario es staff (Superusuario), saltar el filtro de tenant
         if self.request.user.is_staff:
-            print(f"DEBUG: get_queryset for SUPERUSER: {self.request.user}. Returning all objects.")
+            log_debug(logger, 'tenant_queryset.superuser', view=type(self).__name__, user_id=self.request.user.pk)
             return self.queryset.all() # <-- Devuelve todo
 
         # 2. Si es un usuario normal, aplicar el filtro de tenant
+        # (sin COUNT ni prints: este método corre en cada list/retrieve/update/delete)
         try:
-            print(f"DEBUG: get_queryset called by user: {self.request.user}")
-            empleado = self.request.user.empleado
-            print(f"DEBUG: Found empleado: {empleado}, for empresa: {empleado.empresa}")
-            
-            queryset = self.queryset.filter(empresa=empleado.empresa)
-            print(f"DEBUG: Filtered queryset count: {queryset.count()}")
-            return queryset
-        except Empleado.DoesNotExist:
-            print(f"DEBUG: Empleado.DoesNotExist for user: {self.request.user}")
-            return self.queryset.none()
+            # Contexto del tenant resuelto una vez por petición (claim del JWT o una sola consulta)
+            empresa_id = get_tenant_context(self.request).empresa_id
+            if empresa_id is None:
+                log_debug(logger, 'tenant_queryset.sin_empleado', view=type(self).__name__, user_id=self.request.user.pk)
+                return self.queryset.none()
+            log_debug(logger, 'tenant_queryset', view=type(self).__name__, user_id=self.request.user.pk, empresa_id=empresa_id)
+            return self.queryset.filter(empresa_id=empresa_id)
         except Exception as e:
-             print(f"ERROR in get_queryset: {e}")
-             return self.queryset.none()       
+             logger.error(f"Error in get_queryset ({type(self).__name__}): {e}", exc_info=True)
+             return self.queryset.none()
 
     def check_permissions(self, request):
         super().check_permissions(request) 
@@ -191,12 +207,24 @@ class BaseTenantLimitViewSet(BaseTenantViewSet):
     model_limit_field = None  # Ej: 'max_usuarios'
 
     def create(self, request, *args, **kwargs):
-        empleado = request.user.empleado
-        empresa = empleado.empresa
+        tenant = get_tenant_context(request)
+        empresa = tenant.empresa
+        if empresa is None:
+            return Response(
+                {'detail': 'El usuario no está asociado a una empresa.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not (self.model_to_count and self.model_limit_field):
+            # No hay límites definidos, procede con la creación normal
+            return super().create(request, *args, **kwargs)
 
-        if self.model_to_count and self.model_limit_field:
+        with transaction.atomic():
             try:
-                suscripcion = empresa.suscripcion
+                # Lectura de UNA fila: los contadores de uso viven en la suscripción.
+                # select_for_update serializa las altas concurrentes del mismo tenant
+                # para que no puedan superar el límite entre la comprobación y el INSERT.
+                suscripcion = Suscripcion.objects.select_for_update().get(empresa_id=empresa.id)
                 
                 # 1. Comprobar si la suscripción está activa
                 if suscripcion.estado != 'activa':
@@ -206,7 +234,7 @@ class BaseTenantLimitViewSet(BaseTenantViewSet):
                     )
 
                 # 2. Comprobar límite
-                current_count = self.model_to_count.objects.filter(empresa=empresa).count()
+                current_count = getattr(suscripcion, USAGE_FIELD_FOR_LIMIT[self.model_limit_field])
                 limit = getattr(suscripcion, self.model_limit_field)
 
                 if current_count >= limit:
@@ -248,8 +276,9 @@ class BaseTenantLimitViewSet(BaseTenantViewSet):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-        # Si todo está bien (o no hay límites definidos), procede con la creación normal
-        return super().create(request, *args, **kwargs)
+            # Si todo está bien, procede con la creación normal (el contador
+            # se incrementa por señal dentro de esta misma transacción)
+            return super().create(request, *args, **kwargs)
     
 
 # --- VIEWSETS DE LA APLICACIÓN ---
@@ -421,12 +450,11 @@ class PartidaPresupuestariaViewSet(BaseTenantViewSet):
             qs = PartidaPresupuestaria.objects.all()
         else:
             # For regular users, correctly filter by their company via the related Periodo.
-            try:
-                empleado = self.request.user.empleado
-                qs = PartidaPresupuestaria.objects.filter(periodo__empresa=empleado.empresa)
-            except Empleado.DoesNotExist:
+            empresa_id = get_tenant_context(self.request).empresa_id
+            if empresa_id is None:
                 # If the user is not linked to an employee, they can't see any partidas.
                 return PartidaPresupuestaria.objects.none()
+            qs = PartidaPresupuestaria.objects.filter(periodo__empresa_id=empresa_id)
 
         # Now, apply the period_id filter from the frontend if it exists.
         periodo_id = self.request.query_params.get('periodo_id')
@@ -473,50 +501,19 @@ class SolicitudCompraViewSet(BaseTenantViewSet):
         Sobrescrito para guardar la solicitud y luego notificar a los administradores.
         """
         # Guardar la solicitud de compra, asignando la empresa del usuario actual.
-        solicitud = serializer.save(empresa=self.request.user.empleado.empresa)
+        solicitud = serializer.save(empresa=get_tenant_context(self.request).empresa)
         solicitante_nombre = solicitud.solicitante.get_full_name() or solicitud.solicitante.username
 
         # --- Lógica para Notificar a los Administradores ---
         try:
-            # 1. Encontrar a todos los empleados con el rol 'Admin' en la misma empresa.
-            admins = Empleado.objects.filter(empresa=solicitud.empresa, roles__nombre='Admin').select_related('usuario')
-
-            if not admins.exists():
-                logger.warning(f"No se encontraron administradores en la empresa {solicitud.empresa.nombre} para notificar sobre la solicitud {solicitud.id}.")
-                return
-
-            # 2. Preparar el contenido de la notificación.
             mensaje = f"{solicitante_nombre} ha creado una nueva solicitud de compra: '{solicitud.descripcion[:35]}...'."
-            title_fcm = "Nueva Solicitud de Compra"
-            url_destino = '/app/solicitudes-compra'
-            
-            # 3. Iterar sobre los admins y enviarles las notificaciones.
-            for admin_empleado in admins:
-                # Evitar notificar al usuario que creó la solicitud si también es admin.
-                if admin_empleado.usuario == solicitud.solicitante:
-                    continue
-
-                # Crear la notificación web (para la campanita)
-                notif_obj = Notificacion.objects.create(
-                    destinatario=admin_empleado.usuario,
-                    mensaje=mensaje,
-                    tipo='INFO',
-                    url_destino=url_destino
-                )
-
-                # Si el admin tiene un token FCM, enviar notificación push.
-                if admin_empleado.fcm_token:
-                    fcm_data = {
-                        "id": str(notif_obj.id),
-                        "url_destino": url_destino,
-                        "tipo": notif_obj.tipo,
-                    }
-                    send_fcm_notification(
-                        fcm_token=admin_empleado.fcm_token,
-                        title=title_fcm,
-                        body=mensaje,
-                        data=fcm_data
-                    )
+            # Todos los empleados con rol 'Admin' de la empresa (salvo el solicitante), de una vez
+            notificaciones = notificar(
+                mensaje, "Nueva Solicitud de Compra", url_destino='/app/solicitudes-compra',
+                empresa_id=solicitud.empresa_id, roles=['Admin'], excluir=[solicitud.solicitante_id],
+            )
+            if not notificaciones:
+                logger.warning(f"No se encontraron administradores en la empresa {solicitud.empresa.nombre} para notificar sobre la solicitud {solicitud.id}.")
         except Exception as e:
             # Es importante que la creación de la solicitud no falle si las notificaciones fallan.
             logger.error(f"Error al intentar notificar a los administradores sobre la nueva solicitud {solicitud.id}: {e}")
@@ -559,30 +556,12 @@ class SolicitudCompraViewSet(BaseTenantViewSet):
                 mensaje = f"Tu solicitud de compra para '{solicitud.descripcion}' fue RECHAZADA."
                 title_fcm = "Solicitud Rechazada"
 
-            notif_obj = Notificacion.objects.create(
-                destinatario=solicitud.solicitante,
-                tipo=tipo_notif,
-                mensaje=mensaje,
-                url_destino='/app/solicitudes-compra' # URL a la que irá el usuario al hacer clic
+            notificar(
+                mensaje, title_fcm, tipo=tipo_notif,
+                url_destino='/app/solicitudes-compra', # URL a la que irá el usuario al hacer clic
+                usuarios=[solicitud.solicitante_id],
             )
 
-            # --- [NUEVO] Enviar FCM Push Notification ---
-            empleado_destinatario = Empleado.objects.filter(usuario=solicitud.solicitante).first()
-            if empleado_destinatario and empleado_destinatario.fcm_token:
-                fcm_data = {
-                    "id": str(notif_obj.id),
-                    "url_destino": notif_obj.url_destino,
-                    "tipo": notif_obj.tipo,
-                }
-                success, response_fcm = send_fcm_notification(
-                    fcm_token=empleado_destinatario.fcm_token,
-                    title=title_fcm,
-                    body=mensaje,
-                    data=fcm_data
-                )
-                if not success:
-                    logger.error(f"Error al enviar FCM para solicitud {solicitud.id}: {response_fcm}")
-
         except Exception as e:
             # Si la creación de la notificación o FCM falla, no debe detener el proceso principal.
             logger.error(f"Error al crear la notificación o enviar FCM para la solicitud {solicitud.id}: {e}")
@@ -603,7 +582,7 @@ class OrdenCompraViewSet(BaseTenantViewSet):
         """
         # Guardar la orden de compra, asignando la empresa del usuario actual
         orden = serializer.save(
-            empresa=self.request.user.empleado.empresa,
+            empresa=get_tenant_context(self.request).empresa,
             creado_por=self.request.user
         )
 
@@ -620,30 +599,11 @@ class OrdenCompraViewSet(BaseTenantViewSet):
             title_fcm = "Orden de Compra Generada"
             url_destino = f'/app/ordenes-compra' # O una URL más específica si existe
 
-            # Crear la notificación web (para la campanita)
-            notif_obj = Notificacion.objects.create(
-                destinatario=destinatario,
-                mensaje=mensaje,
-                tipo='INFO',
-                url_destino=url_destino
+            # Notificación web (campanita) y push
+            notificar(
+                mensaje, title_fcm, url_destino=url_destino, usuarios=[destinatario.id],
+                data={"screen": "PurchaseOrderDetail", "orden_id": orden.id}, # Dato para deep linking en móvil
             )
-
-            # Enviar notificación push si el solicitante tiene un token FCM
-            empleado_destinatario = Empleado.objects.filter(usuario=destinatario).first()
-            if empleado_destinatario and empleado_destinatario.fcm_token:
-                fcm_data = {
-                    "id": str(notif_obj.id),
-                    "url_destino": url_destino,
-                    "tipo": notif_obj.tipo,
-                    "screen": "PurchaseOrderDetail", # Dato para deep linking en móvil
-                    "orden_id": str(orden.id)
-                }
-                send_fcm_notification(
-                    fcm_token=empleado_destinatario.fcm_token,
-                    title=title_fcm,
-                    body=mensaje,
-                    data=fcm_data
-                )
         except Exception as e:
             # La creación de la orden no debe fallar si las notificaciones fallan.
             logger.error(f"Error al intentar notificar al solicitante sobre la nueva orden de compra {orden.id}: {e}")
@@ -753,28 +713,11 @@ class OrdenCompraViewSet(BaseTenantViewSet):
                     title_fcm = "Activo Recibido"
                     url_destino = f'/app/activos-fijos/{nuevo_activo.id}'
 
-                    notif_obj = Notificacion.objects.create(
-                        destinatario=destinatario,
-                        mensaje=mensaje,
-                        tipo='INFO',
-                        url_destino=url_destino
+                    # Sin I/O de red con la partida bloqueada: el push sale tras el commit
+                    notificar(
+                        mensaje, title_fcm, url_destino=url_destino, usuarios=[destinatario.id],
+                        data={"screen": "ActivoDetail", "activo_id": nuevo_activo.id},
                     )
-
-                    empleado_destinatario = Empleado.objects.filter(usuario=destinatario).first()
-                    if empleado_destinatario and empleado_destinatario.fcm_token:
-                        fcm_data = {
-                            "id": str(notif_obj.id),
-                            "url_destino": url_destino,
-                            "tipo": notif_obj.tipo,
-                            "screen": "ActivoDetail",
-                            "activo_id": str(nuevo_activo.id)
-                        }
-                        send_fcm_notification(
-                            fcm_token=empleado_destinatario.fcm_token,
-                            title=title_fcm,
-                            body=mensaje,
-                            data=fcm_data
-                        )
             except Exception as e:
                 logger.error(f"Error al notificar la recepción de la orden {orden.id}: {e}")
             # --- [FIN] ---
@@ -842,7 +785,7 @@ class LogViewSet(viewsets.ModelViewSet):
                 self._upload_to_s3(serializer.validated_data, request)
                 return Response({"status": "Archivado en S3"}, status=status.HTTP_201_CREATED)
             except Exception as e:
-                print(f"Error subiendo a S3: {e}")
+                logger.error(f"Error subiendo a S3: {e}")
                 # Si falla S3, guardamos en BD como respaldo
                 self.perform_create(serializer)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -932,42 +875,21 @@ class DashboardDataView(APIView):
                 # Si es superusuario, podría tener una lógica diferente,
                 # como seleccionar una empresa o ver datos agregados de todas.
                 # Por ahora, tomaremos la primera empresa como ejemplo si es necesario.
-                empresa = Empresa.objects.first()
-                if not empresa:
+                empresa_id = Empresa.objects.values_list('id', flat=True).first()
+                if not empresa_id:
                     return Response({"detail": "No hay empresas en el sistema."}, status=status.HTTP_404_NOT_FOUND)
             else:
-                empresa = request.user.empleado.empresa
+                empresa_id = get_tenant_context(request).empresa_id
+                if empresa_id is None:
+                    raise Empleado.DoesNotExist
         except Empleado.DoesNotExist:
             return Response({"detail": "El usuario no está asociado a una empresa."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Métricas de Activos y Usuarios
-        activos_qs = ActivoFijo.objects.filter(empresa=empresa)
-        total_activos = activos_qs.count()
-        total_usuarios = Empleado.objects.filter(empresa=empresa).count()
-        valor_total_activos = activos_qs.aggregate(total=Sum('valor_actual'))['total'] or 0
-
-        # 2. Activos por Estado
-        activos_por_estado = list(activos_qs.values('estado__nombre').annotate(count=Count('id')))
-
-        # 3. Activos por Categoría
-        activos_por_categoria = list(activos_qs.values('categoria__nombre').annotate(count=Count('id')))
-
-        # 4. Solicitudes de Compra Pendientes
-        solicitudes_pendientes = SolicitudCompra.objects.filter(empresa=empresa, estado='PENDIENTE').count()
-
-        # 5. Mantenimientos en Proceso
-        mantenimientos_en_proceso = Mantenimiento.objects.filter(empresa=empresa, estado='EN_PROCESO').count()
-
-        # Consolidar todos los datos en una sola respuesta
-        data = {
-            'total_activos': total_activos,
-            'total_usuarios': total_usuarios,
-            'valor_total_activos': valor_total_activos,
-            'activos_por_estado': activos_por_estado,
-            'activos_por_categoria': activos_por_categoria,
-            'solicitudes_pendientes': solicitudes_pendientes,
-            'mantenimientos_en_proceso': mantenimientos_en_proceso,
-        }
+        # Las métricas (activos, usuarios, valor total, activos por estado/categoría,
+        # solicitudes pendientes y mantenimientos en proceso) se mantienen
+        # incrementalmente en DashboardSnapshot: una lectura por clave primaria.
+        snapshot = obtener_snapshot(empresa_id)
+        data = snapshot_a_respuesta(snapshot)
 
         return Response(data)
 
@@ -976,23 +898,21 @@ class UserPermissionsView(APIView):
     def get(self, request, *args, **kwargs):
         permissions_set = set()
         try:
-            empleado = request.user.empleado
-            # 1. Obtener permisos basados en roles
-            permissions_set.update(
-                empleado.roles.values_list('permisos__nombre', flat=True).distinct()
-            )
+            tenant = get_tenant_context(request)
+            if tenant.empleado is None:
+                raise Empleado.DoesNotExist
+            # 1. Obtener permisos basados en roles (resolver cacheado)
+            permissions_set.update(get_user_permissions(request))
             
             # 2. Añadir permisos basados en la suscripción
-            try:
-                suscripcion = empleado.empresa.suscripcion
+            # (si no hay suscripción, no se añaden permisos extra)
+            suscripcion = tenant.suscripcion
+            if suscripcion is not None:
                 if suscripcion.plan in ['profesional', 'empresarial']:
                     permissions_set.add('view_custom_reports')
                 if suscripcion.plan == 'empresarial':
                     permissions_set.add('view_advanced_reports')
                     permissions_set.add('has_api_access')
-            except Suscripcion.DoesNotExist:
-                # Si no hay suscripción, no se añaden permisos extra
-                pass
 
             # 3. Añadir permiso de superusuario si aplica
             if request.user.is_staff:
@@ -1003,7 +923,7 @@ class UserPermissionsView(APIView):
                  permissions_set.add('is_superuser')
             pass 
         except Exception as e:
-            print(f"Error fetching user permissions: {e}")
+            logger.error(f"Error fetching user permissions: {e}", exc_info=True)
             
         return Response(list(permissions_set))
 
@@ -1014,8 +934,10 @@ class ReporteActivosPreview(APIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self, request):
-        empleado = request.user.empleado
-        queryset = ActivoFijo.objects.filter(empresa=empleado.empresa).select_related(
+        empresa_id = get_tenant_context(request).empresa_id
+        if empresa_id is None:
+            raise Empleado.DoesNotExist
+        queryset = ActivoFijo.objects.filter(empresa_id=empresa_id).select_related(
             'categoria', 'estado', 'ubicacion', 'departamento' # Asegurar todos los relateds
         )
         ubicacion_id = request.query_params.get('ubicacion_id') 
@@ -1035,12 +957,20 @@ class ReporteActivosPreview(APIView):
     def get(self, request, *args, **kwargs):
         try:
             queryset = self.get_queryset(request)
-            # Devolver los campos que el frontend necesita para la tabla
-            data = queryset.values(
-                'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
-                'ubicacion__nombre', 'categoria__nombre', 'departamento__nombre'
+            # Devolver los campos que el frontend necesita para la tabla, página a página.
+            # Las páginas se cachean por empresa y parámetros (drill-downs repetidos).
+            params = {k: v for k, v in request.query_params.items() if v}
+            data = cached_report_result(
+                get_tenant_context(request).empresa_id,
+                [f'{k}={v}' for k, v in params.items()], 'activos-preview',
+                lambda: KeysetPagination().paginate(queryset, params, (
+                    'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
+                    'ubicacion__nombre', 'categoria__nombre', 'departamento__nombre'
+                ))
             )
-            return Response(list(data))
+            return Response(data)
+        except serializers.ValidationError as e:
+             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Empleado.DoesNotExist:
              return Response({"detail": "Usuario no asociado a un empleado."}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -1063,7 +993,6 @@ class ReporteActivosExport(APIView):
             qs = ReporteActivosPreview().get_queryset(request).select_related(
                'ubicacion', 'estado', 'categoria', 'departamento'
             )
-            logger.info(f"Report Export: Queryset count = {qs.count()}")
             return qs
         except Exception as e:
             logger.error(f"Report Export: Error in get_queryset: {e}", exc_info=True)
@@ -1098,96 +1027,6 @@ class ReporteActivosExport(APIView):
              return Response({"detail": f"Error interno al generar el reporte: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# --- FUNCIÓN HELPER PARA REPORTE DINÁMICO ---
-def parse_and_build_query(filters_list, base_queryset):
-    """
-    Toma una lista de strings de filtro (ej: ["depto:TI", "laptop", "valor>500"])
-    y la convierte en un queryset de Django filtrado.
-    """
-    query = base_queryset
-    
-    # Mapeo de claves a campos base del modelo ActivoFijo
-    field_mapping = {
-        'depto': 'departamento__nombre',
-        'categoria': 'categoria__nombre',
-        'ubicacion': 'ubicacion__nombre',
-        'estado': 'estado__nombre',
-        'proveedor': 'proveedor__nombre',
-        'nombre': 'nombre',
-        'codigo': 'codigo_interno',
-        'valor': 'valor_actual',
-        'fecha_adq': 'fecha_adquisicion',
-    }
-
-    # Mapeo de operadores de texto/numéricos a suffixes de Django ORM
-    operator_mapping = {
-        ':': '__icontains', # Búsqueda de texto flexible (contiene, sin mayúsculas)
-        '>': '__gt',        # Mayor que
-        '<': '__lt',        # Menor que
-        '=': '__exact',     # Coincidencia exacta
-    }
-
-    q_objects = Q() # Inicializa un objeto Q vacío (para combinar filtros con AND)
-
-    for f in filters_list:
-        try:
-            f = f.strip()
-            if not f: continue # Ignorar filtros vacíos
-
-            # --- NUEVA LÓGICA DE PARSEO ---
-            # Intenta encontrar un patrón como "clave:valor", "clave>valor", "clave < valor"
-            # Regex: (clave) (espacios) (operador) (espacios) (valor)
-            match = re.match(r'([\w_]+)\s*([:<>])\s*(.+)', f)
-            
-            if match:
-                # --- Filtro Estructurado (ej: "depto: TI", "valor > 1000") ---
-                key, operator, value = match.groups()
-                key = key.lower().strip()
-                operator = operator.strip()
-                value = value.strip()
-                
-                # Verificar si la clave y el operador son válidos
-                if key in field_mapping and operator in operator_mapping:
-                    # Construir el nombre completo del campo ORM (ej: 'valor_actual__gt')
-                    orm_field = field_mapping[key] + operator_mapping[operator]
-                    
-                    # Convertir valor si es numérico o fecha
-                    if operator in ['>', '<', '='] and key in ['valor', 'fecha_adq']:
-                        try:
-                            if key == 'valor':
-                                value = float(value) # Convertir a número
-                            elif key == 'fecha_adq':
-                                # Asumir formato YYYY-MM-DD
-                                value = datetime.strptime(value, '%Y-%m-%d').date()
-                        except ValueError:
-                            logger.warn(f"Filtro ignorado: Valor para '{key}{operator}' no es válido: '{value}'")
-                            continue # Saltar este filtro
-                    
-                    # Añadir al query (ej: Q(valor_actual__gt=1000))
-                    q_objects &= Q(**{orm_field: value})
-                else:
-                    logger.warn(f"Filtro ignorado: Clave '{key}' u operador '{operator}' no reconocidos.")
-
-            # --- Filtro de Texto Simple (ej: "laptop", "finanzas") ---
-            else:
-                # Si no es un filtro estructurado, buscar el texto en MÚLTIPLES campos
-                q_objects &= (
-                    Q(nombre__icontains=f) | 
-                    Q(codigo_interno__icontains=f) |
-                    Q(departamento__nombre__icontains=f) |
-                    Q(categoria__nombre__icontains=f) |
-                    Q(ubicacion__nombre__icontains=f) |
-                    Q(estado__nombre__icontains=f) |
-                    Q(proveedor__nombre__icontains=f)
-                )
-        except Exception as e:
-            # Ignorar filtros malformados (ej: "valor>abc")
-            logger.warn(f"Report Query: Ignorando filtro malformado: '{f}'. Error: {e}")
-            pass
-            
-    # Aplicar todos los filtros combinados (Q objects) al queryset
-    return query.filter(q_objects).distinct()
-
 # --- VISTA DE REPORTE DINÁMICO (PREVIEW) ---
 class ReporteQueryView(APIView):
     """
@@ -1198,18 +1037,8 @@ class ReporteQueryView(APIView):
 
     def get_base_queryset(self, request):
         # Filtrar por tenant (empresa)
-        try:
-            empleado = request.user.empleado
-            # Precargar todos los campos relacionados que podamos necesitar
-            return ActivoFijo.objects.filter(empresa=empleado.empresa).select_related(
-                'departamento', 'ubicacion', 'categoria', 'estado', 'proveedor'
-            )
-        except Empleado.DoesNotExist:
-            if request.user.is_staff:
-                 return ActivoFijo.objects.all().select_related(
-                    'departamento', 'ubicacion', 'categoria', 'estado', 'proveedor'
-                 )
-            return ActivoFijo.objects.none()
+        empresa_id = get_tenant_context(request).empresa_id
+        return report_base_queryset(empresa_id, is_staff=request.user.is_staff)
 
     def post(self, request, *args, **kwargs):
         # --- Comprobación de Suscripción y Permiso --- # <--- MODIFICADO
@@ -1223,7 +1052,10 @@ class ReporteQueryView(APIView):
                     )
                 
                 # Comprobación de suscripción (existente)
-                plan = request.user.empleado.empresa.suscripcion.plan
+                suscripcion = get_tenant_context(request).suscripcion
+                if suscripcion is None:
+                    raise Suscripcion.DoesNotExist
+                plan = suscripcion.plan
                 if plan == 'basico':
                     return Response(
                         {'detail': 'Los reportes personalizables no están incluidos en tu plan Básico.'},
@@ -1243,21 +1075,109 @@ class ReporteQueryView(APIView):
         logger.info(f"Report Query Preview POST. Filters = {filters}")
         try:
             base_qs = self.get_base_queryset(request)
-            queryset = parse_and_build_query(filters, base_qs)
-            
-            # Devolver los datos que el frontend espera en la tabla
-            data = queryset.values(
-                'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
-                'departamento__nombre',
-                'ubicacion__nombre'
+            scope = report_scope(get_tenant_context(request).empresa_id, request.user.is_staff)
+            # Los ids que cumplen los filtros se cachean: la exportación posterior los reutiliza
+            queryset = filter_report_queryset(scope, filters, base_qs, parse_and_build_query)
+
+            # Devolver los datos que el frontend espera en la tabla, página a página
+            # (cursor, page_size y count=exact llegan en el cuerpo junto a los filtros)
+            paginator = KeysetPagination()
+            page_params = {k: request.data.get(k) for k in ('cursor', 'page_size', 'count') if request.data.get(k)}
+            data = cached_report_result(
+                scope, filters, ['preview', page_params],
+                lambda: paginator.paginate(queryset, page_params, (
+                    'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
+                    'departamento__nombre',
+                    'ubicacion__nombre'
+                ))
             )
-            return Response(list(data), status=status.HTTP_200_OK)
-        
+            return Response(data, status=status.HTTP_200_OK)
+
+        except FilterSyntaxError as e:
+            return Response({"detail": f"Filtro no válido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Report Query Error: {e}", exc_info=True)
             return Response({"detail": f"Error al procesar la consulta: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# --- [NUEVO] REPORTE DE VALOR EN LIBROS A UNA FECHA ---
+class ReporteValorAFechaView(ReporteQueryView): # Hereda get_base_queryset
+    """
+    Valor en libros de la cartera al cierre de `fecha` (AAAA-MM-DD), reconstruido
+    desde el historial de depreciaciones, revalorizaciones y bajas (ver valuation_utils.py).
+    Acepta los mismos `filters` que el reporte dinámico, `agrupar_por` opcional
+    (categoria, departamento, ubicacion) y la paginación por cursor del detalle.
+    Endpoint: /api/reportes/valor-a-fecha/
+    """
+
+    def post(self, request, *args, **kwargs):
+        # --- Comprobación de Suscripción y Permiso (igual que el reporte dinámico) ---
+        try:
+            if not request.user.is_staff:
+                if not check_permission(request, self, 'view_custom_reports'):
+                    return Response(
+                        {'detail': 'Permiso "view_custom_reports" requerido para acceder a reportes personalizados.'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+
+                suscripcion = get_tenant_context(request).suscripcion
+                if suscripcion is None:
+                    raise Suscripcion.DoesNotExist
+                if suscripcion.plan == 'basico':
+                    return Response(
+                        {'detail': 'Los reportes personalizables no están incluidos en tu plan Básico.'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+        except (Empleado.DoesNotExist, Suscripcion.DoesNotExist):
+            return Response(
+                {'detail': 'No se pudo verificar tu plan de suscripción o perfil de empleado.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        # --- Fin de la Comprobación ---
+
+        filters = request.data.get('filters', [])
+        if not isinstance(filters, list):
+            return Response({"detail": "El campo 'filters' debe ser una lista."}, status=status.HTTP_400_BAD_REQUEST)
+        agrupar_por = request.data.get('agrupar_por') or None
+        try:
+            fecha = parse_fecha(request.data.get('fecha') or timezone.localdate())
+            if agrupar_por is not None and agrupar_por not in VALUATION_GROUPS:
+                raise ValueError(f"agrupar_por debe ser uno de: {', '.join(VALUATION_GROUPS)}.")
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            base_qs = self.get_base_queryset(request)
+            scope = report_scope(get_tenant_context(request).empresa_id, request.user.is_staff)
+            queryset = filter_report_queryset(scope, filters, base_qs, parse_and_build_query)
+            page_params = {k: request.data.get(k) for k in ('cursor', 'page_size', 'count') if request.data.get(k)}
+
+            def compute():
+                data = {
+                    'fecha': fecha,
+                    'totales': totales_a_fecha(queryset, fecha),
+                    'grupos': totales_a_fecha(queryset, fecha, agrupar_por) if agrupar_por else None,
+                }
+                data.update(KeysetPagination().paginate(valorizar_a_fecha(queryset, fecha), page_params, (
+                    'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
+                    'valor_a_fecha', 'dado_de_baja', 'categoria__nombre', 'departamento__nombre',
+                )))
+                return data
+
+            data = cached_report_result(scope, filters, ['valor-a-fecha', fecha, agrupar_por, page_params], compute)
+            return Response(data, status=status.HTTP_200_OK)
+
+        except FilterSyntaxError as e:
+            return Response({"detail": f"Filtro no válido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"ReporteValorAFechaView Error: {e}", exc_info=True)
+            return Response({"detail": f"Error al procesar la consulta: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # --- VISTA DE REPORTE DINÁMICO (EXPORT) ---
 class ReporteQueryExportView(ReporteQueryView): # Hereda get_base_queryset
     """
@@ -1277,7 +1197,10 @@ class ReporteQueryExportView(ReporteQueryView): # Hereda get_base_queryset
                     )
 
                 # Comprobación de suscripción (existente)
-                plan = request.user.empleado.empresa.suscripcion.plan
+                suscripcion = get_tenant_context(request).suscripcion
+                if suscripcion is None:
+                    raise Suscripcion.DoesNotExist
+                plan = suscripcion.plan
                 if plan == 'basico':
                     return Response(
                         {'detail': 'La exportación de reportes personalizables no está incluida en tu plan Básico.'},
@@ -1295,35 +1218,103 @@ class ReporteQueryExportView(ReporteQueryView): # Hereda get_base_queryset
         
         if not isinstance(filters, list):
              return Response({"detail": "Filters debe ser lista."}, status=status.HTTP_400_BAD_REQUEST)
+        if export_format not in EXPORT_FORMATS:
+             return Response(
+                 {"detail": f"Formato no soportado. Use uno de: {', '.join(EXPORT_FORMATS)}."},
+                 status=status.HTTP_400_BAD_REQUEST
+             )
+        if not export_format_available(export_format):
+             return Response(
+                 {"detail": f"El formato '{export_format}' no está disponible en este servidor."},
+                 status=status.HTTP_400_BAD_REQUEST
+             )
 
         logger.info(f"Report Query Export POST. Format = {export_format}, Filters = {filters}")
         try:
             # Obtener queryset base (ya tiene select_related)
             base_qs = self.get_base_queryset(request)
-            # Aplicar filtros
-            queryset = parse_and_build_query(filters, base_qs)
+            # Aplicar filtros (reutiliza los ids de la vista previa si siguen vigentes)
+            scope = report_scope(get_tenant_context(request).empresa_id, request.user.is_staff)
+            queryset = filter_report_queryset(scope, filters, base_qs, parse_and_build_query)
 
             if not queryset.exists():
                 logger.warning("Report Query Export: Queryset is empty.")
                 return Response({"detail": "No hay datos para exportar."}, status=status.HTTP_404_NOT_FOUND)
 
-            # --- Llamar a funciones de utils ---
-            if export_format == 'excel':
-                logger.info("Report Query Export: Calling create_excel_report util...")
-                return create_excel_report(queryset) # <-- LLAMADA A UTIL
-            else:
-                logger.info("Report Query Export: Calling create_pdf_report util...")
-                return create_pdf_report(queryset) # <-- LLAMADA A UTIL
+            # --- Llamar a funciones de utils (pdf, excel, csv, ndjson, parquet) ---
+            logger.info(f"Report Query Export: Streaming {export_format} export...")
+            return create_export_response(queryset, export_format) # <-- LLAMADA A UTIL
 
         except Http404 as e:
             logger.warning(f"Report Query Export: Http404 - {e}")
             return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except FilterSyntaxError as e:
+            return Response({"detail": f"Filtro no válido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Report Query Export Error: {e}", exc_info=True)
             return Response({"detail": f"Error al exportar: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# --- [NUEVO] EXPORTACIONES EN SEGUNDO PLANO ---
+class ReporteExportJobViewSet(BaseTenantViewSet):
+    """
+    Exportaciones de reportes dinámicos fuera del ciclo de la petición.
+    - POST   /api/reportes/exportaciones/                -> encola (202) y devuelve el job
+    - GET    /api/reportes/exportaciones/<id>/           -> estado y progreso
+    - GET    /api/reportes/exportaciones/<id>/descargar/ -> archivo generado
+    El archivo lo genera el worker `manage.py process_export_jobs`.
+    """
+    queryset = ReporteExportJob.objects.all()
+    serializer_class = ReporteExportJobSerializer
+    required_manage_permission = 'view_custom_reports'
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.user.is_staff:
+            return qs
+        # Cada usuario ve solo sus propias exportaciones
+        return qs.filter(solicitado_por=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        tenant = get_tenant_context(request)
+        if not request.user.is_staff:
+            # Misma comprobación de plan que ReporteQueryExportView
+            suscripcion = tenant.suscripcion
+            if suscripcion is None:
+                return Response(
+                    {'detail': 'No se pudo verificar tu plan de suscripción o perfil de empleado.'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            if suscripcion.plan == 'basico':
+                return Response(
+                    {'detail': 'La exportación de reportes personalizables no está incluida en tu plan Básico.'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(empresa=tenant.empresa, solicitado_por=request.user)
+        logger.info(f"Export job {job.id} encolado. Format = {job.formato}, Filters = {job.filtros}")
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'], url_path='descargar')
+    def descargar(self, request, pk=None):
+        job = self.get_object()
+        if job.estado != 'COMPLETADO' or not job.archivo:
+            return Response(
+                {'detail': f'La exportación aún no está lista (estado: {job.get_estado_display()}).'},
+                status=status.HTTP_409_CONFLICT
+            )
+        extension = job.archivo.name.rsplit('.', 1)[-1]
+        return FileResponse(
+            job.archivo.open('rb'),
+            as_attachment=True,
+            filename=f'reporte_activos.{extension}'
+        )
                 
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db import transaction
+from django.db import IntegrityError, transaction
 
 class MantenimientoViewSet(BaseTenantViewSet):
     queryset = Mantenimiento.objects.all().select_related('activo', 'empleado_asignado__usuario', 'creado_por').prefetch_related('fotos') # Optimizar query
@@ -1339,7 +1330,9 @@ class MantenimientoViewSet(BaseTenantViewSet):
         """
         try:
             mantenimiento = self.get_object()
-            empleado_actual = request.user.empleado
+            empleado_actual = get_tenant_context(request).empleado
+            if empleado_actual is None:
+                raise Empleado.DoesNotExist
             estado_anterior = mantenimiento.estado
             
             # 1. Verificar si el usuario es el empleado asignado o un admin
@@ -1375,65 +1368,31 @@ class MantenimientoViewSet(BaseTenantViewSet):
                 )
             
             # --- [NUEVO] Lógica de Notificación al creador ---
-            print("--- DEBUG NOTIFICACIÓN ---")
-            print(f"Mantenimiento ID: {mantenimiento.id}")
-            print(f"Creador de la tarea: {mantenimiento.creado_por}")
-            print(f"Usuario actualizando: {request.user}")
-            print(f"Estado anterior: {estado_anterior}")
-            print(f"Nuevo estado: {nuevo_estado}")
-
-            if not mantenimiento.creado_por:
-                print("DEBUG: Condición falló - La tarea no tiene creador (creado_por es Nulo).")
-            if mantenimiento.creado_por == request.user:
-                print("DEBUG: Condición falló - El usuario está actualizando su propia tarea.")
-            if not nuevo_estado:
-                print("DEBUG: Condición falló - No se proporcionó un nuevo estado.")
-            if nuevo_estado == estado_anterior:
-                print("DEBUG: Condición falló - El estado no ha cambiado.")
+            log_debug(
+                logger, 'mantenimiento.actualizar_estado', mantenimiento_id=mantenimiento.id,
+                creado_por_id=mantenimiento.creado_por_id, user_id=request.user.pk,
+                estado_anterior=estado_anterior, nuevo_estado=nuevo_estado
+            )
 
             if (mantenimiento.creado_por and 
                 mantenimiento.creado_por != request.user and 
                 nuevo_estado and 
                 nuevo_estado != estado_anterior):
                 
-                print("DEBUG: Todas las condiciones cumplidas. Intentando crear notificación...")
                 try:
                     mensaje = (f"El estado del mantenimiento para '{mantenimiento.activo.nombre}' "
                                f"fue actualizado a '{mantenimiento.get_estado_display()}' por "
                                f"{empleado_actual.usuario.get_full_name() or empleado_actual.usuario.username}.")
                     title_fcm = "Actualización de Mantenimiento"
                     
-                    notif_obj = Notificacion.objects.create(
-                        destinatario=mantenimiento.creado_por,
-                        mensaje=mensaje,
-                        tipo='INFO',
-                        url_destino=f'/app/mantenimientos' # URL al módulo general
+                    notificar(
+                        mensaje, title_fcm,
+                        url_destino=f'/app/mantenimientos', # URL al módulo general
+                        usuarios=[mantenimiento.creado_por_id],
                     )
-                    print(f"DEBUG: Notificación de BD creada para {mantenimiento.creado_por}.")
-
-                    # Enviar también una notificación Push a través de FCM
-                    empleado_creador = Empleado.objects.filter(usuario=mantenimiento.creado_por).first()
-                    if empleado_creador and empleado_creador.fcm_token:
-                        print(f"DEBUG: Encontrado fcm_token para el creador. Enviando push notification.")
-                        fcm_data = {
-                            "id": str(notif_obj.id),
-                            "url_destino": notif_obj.url_destino,
-                            "tipo": notif_obj.tipo,
-                        }
-                        send_fcm_notification(
-                            fcm_token=empleado_creador.fcm_token,
-                            title=title_fcm,
-                            body=mensaje,
-                            data=fcm_data
-                        )
-                    else:
-                        print("DEBUG: El creador no tiene un fcm_token registrado. No se envía push notification.")
 
                 except Exception as e:
                     logger.error(f"Error al crear notificación de actualización de estado: {e}")
-            else:
-                print("DEBUG: No se cumplieron todas las condiciones para enviar la notificación.")
-            print("--- FIN DEBUG ---")
             # --- [FIN DE NUEVA LÓGICA] ---
 
             serializer = self.get_serializer(mantenimiento)
@@ -1449,17 +1408,17 @@ class MantenimientoViewSet(BaseTenantViewSet):
         
     # --- [NUEVA FUNCIÓN HELPER] ---
     def _crear_notificacion_asignacion(self, mantenimiento_instance):
-        print("\n--- DEBUG: Invocando _crear_notificacion_asignacion ---")
         empleado_asignado = mantenimiento_instance.empleado_asignado
         
         if empleado_asignado and hasattr(empleado_asignado, 'usuario'):
             destinatario_user = empleado_asignado.usuario
-            print(f"DEBUG: Tarea asignada a: {destinatario_user.username} (ID: {destinatario_user.id})")
-            print(f"DEBUG: Petición hecha por: {self.request.user.username} (ID: {self.request.user.id})")
+            log_debug(
+                logger, 'mantenimiento.asignacion', mantenimiento_id=mantenimiento_instance.id,
+                destinatario_id=destinatario_user.id, user_id=self.request.user.id
+            )
             
             # No enviar notificación si se está auto-asignando la tarea
             if self.request.user == destinatario_user:
-                print("DEBUG: Auto-asignación detectada. No se enviará notificación.")
                 return
 
             try:
@@ -1467,46 +1426,18 @@ class MantenimientoViewSet(BaseTenantViewSet):
                            f"para el activo '{mantenimiento_instance.activo.nombre}'.")
                 title_fcm = "Nueva Asignación de Mantenimiento"
 
-                notif_obj = Notificacion.objects.create(
-                    destinatario=destinatario_user,
-                    mensaje=mensaje,
-                    tipo='INFO',
-                    url_destino=f'/app/mantenimientos'
+                notificar(
+                    mensaje, title_fcm, url_destino=f'/app/mantenimientos', usuarios=[destinatario_user.id],
                 )
-                print(f"DEBUG: Notificación de BD creada para {destinatario_user.username}.")
-
-                # Enviar FCM Push Notification
-                if empleado_asignado.fcm_token:
-                    print(f"DEBUG: fcm_token encontrado para {destinatario_user.username}: '{empleado_asignado.fcm_token[:20]}...'")
-                    fcm_data = {
-                        "id": str(notif_obj.id),
-                        "url_destino": notif_obj.url_destino,
-                        "tipo": notif_obj.tipo,
-                    }
-                    success, response_fcm = send_fcm_notification(
-                        fcm_token=empleado_asignado.fcm_token,
-                        title=title_fcm,
-                        body=mensaje,
-                        data=fcm_data
-                    )
-                    if success:
-                        print(f"DEBUG: Notificación Push enviada exitosamente a {destinatario_user.username}.")
-                    else:
-                        logger.error(f"Error al enviar FCM para mantenimiento {mantenimiento_instance.id}: {response_fcm}")
-                else:
-                    print(f"DEBUG: No se encontró fcm_token para {destinatario_user.username}. No se envía Push.")
 
             except Exception as e:
-                print(f"ERROR: No se pudo crear notificación para mant. {mantenimiento_instance.id}. Error: {e}")
-        else:
-            print("DEBUG: No hay empleado asignado a esta tarea. No se envía notificación de asignación.")
-        print("--- FIN DEBUG ---\n")
+                logger.error(f"No se pudo crear notificación para mant. {mantenimiento_instance.id}: {e}")
 
     # --- [ MÉTODO EDITADO ] ---
     def perform_create(self, serializer):
         # Asigna el usuario actual como creador y la empresa
         mantenimiento = serializer.save(
-            empresa=self.request.user.empleado.empresa,
+            empresa=get_tenant_context(self.request).empresa,
             creado_por=self.request.user 
         )
         # Luego, intenta crear la notificación para el asignado (si existe)
@@ -1556,7 +1487,7 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
         try:
             with transaction.atomic():
                 # Determinar la empresa del usuario
-                empresa_obj = Empresa.objects.first() if request.user.is_staff else request.user.empleado.empresa
+                empresa_obj = Empresa.objects.first() if request.user.is_staff else get_tenant_context(request).empresa
                 if not empresa_obj:
                     return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1612,6 +1543,52 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
             logger.error(f"Error en RevalorizacionActivoViewSet.ejecutar: {e}", exc_info=True)
             return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='ejecutar-lote')
+    def ejecutar_lote(self, request, *args, **kwargs):
+        """
+        Revalorización masiva: aplica la misma regla (reval_type + value) a todos los
+        activos de `categoria_id`, `ubicacion_id` y/o `departamento_id` (o a toda la
+        empresa con `todos: true`). Con `dry_run: true` solo devuelve los totales.
+        """
+        if not check_permission(request, self, self.required_manage_permission):
+            self.permission_denied(request, message=f'Permiso "{self.required_manage_permission}" requerido.')
+
+        empresa_id = get_tenant_context(request).empresa_id
+        if empresa_id is None and request.user.is_staff:
+            empresa_id = request.data.get('empresa_id')
+        if not empresa_id:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        reval_type = request.data.get('reval_type')
+        value_str = request.data.get('value')
+        if not reval_type or value_str in (None, ''):
+            return Response({'detail': 'Se requieren reval_type y value.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        filtros = {
+            'categoria_id': request.data.get('categoria_id'),
+            'ubicacion_id': request.data.get('ubicacion_id'),
+            'departamento_id': request.data.get('departamento_id'),
+        }
+        todos = str(request.data.get('todos', '')).lower() in ('true', '1')
+        if not any(filtros.values()) and not todos:
+            return Response(
+                {'detail': 'Indique categoria_id, ubicacion_id o departamento_id (o todos: true para toda la empresa).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('true', '1')
+
+        try:
+            resumen = revalorizar_lote(
+                empresa_id, reval_type, str(value_str), dry_run=dry_run,
+                usuario=request.user, notas=request.data.get('notas'), **filtros
+            )
+        except (ValueError, InvalidOperation) as e:
+            return Response({'detail': str(e) or 'El valor proporcionado no es un número válido.'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en RevalorizacionActivoViewSet.ejecutar_lote: {e}", exc_info=True)
+            return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(resumen, status=status.HTTP_200_OK)
+
 
 class DepreciacionActivoViewSet(BaseTenantViewSet):
     queryset = DepreciacionActivo.objects.all()
@@ -1640,9 +1617,17 @@ class DepreciacionActivoViewSet(BaseTenantViewSet):
         if depreciation_type not in [choice[0] for choice in DepreciacionActivo.DEPRECIATION_TYPE_CHOICES]:
             return Response({'detail': 'Tipo de depreciación inválido.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Mes contable de la depreciación (por defecto el actual): el mismo que usan
+        # la corrida por lote y el cierre mensual, así un activo no se deprecia dos veces
+        periodo = request.data.get('periodo') or periodo_actual()
+        try:
+            rango_periodo(periodo)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             with transaction.atomic():
-                empresa_obj = Empresa.objects.first() if request.user.is_staff else request.user.empleado.empresa
+                empresa_obj = Empresa.objects.first() if request.user.is_staff else get_tenant_context(request).empresa
                 if not empresa_obj:
                     return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1650,6 +1635,11 @@ class DepreciacionActivoViewSet(BaseTenantViewSet):
                     id=activo_id, 
                     empresa=empresa_obj
                 )
+                if DepreciacionActivo.objects.filter(activo=activo, periodo=periodo).exists():
+                    return Response(
+                        {'detail': f'El activo ya fue depreciado en el período {periodo}.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
 
                 valor_anterior = activo.valor_actual
                 monto_depreciado = Decimal(0)
@@ -1742,6 +1732,8 @@ class DepreciacionActivoViewSet(BaseTenantViewSet):
                     valor_nuevo=valor_nuevo,
                     monto_depreciado=monto_depreciado,
                     depreciation_type=depreciation_type, # Guardar el tipo de depreciación
+                    periodo=periodo,
+                    fecha_efectiva=cierre_periodo(periodo),
                     notas=notas,
                     realizado_por=request.user
                 )
@@ -1754,12 +1746,117 @@ class DepreciacionActivoViewSet(BaseTenantViewSet):
 
         except ActivoFijo.DoesNotExist:
             return Response({'detail': 'El activo no existe o no pertenece a tu empresa.'}, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError:
+            # Una corrida por lote registró el mismo período entre la comprobación y el INSERT
+            return Response(
+                {'detail': f'El activo ya fue depreciado en el período {periodo}.'},
+                status=status.HTTP_409_CONFLICT
+            )
         except Empleado.DoesNotExist:
             return Response({'detail': 'El perfil de empleado para este usuario no existe.'}, status=status.HTTP_403_FORBIDDEN)
         except Exception as e:
             logger.error(f"Error en DepreciacionActivoViewSet.ejecutar: {e}", exc_info=True)
             return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='ejecutar-lote')
+    def ejecutar_lote(self, request, *args, **kwargs):
+        """
+        Cierre de período: deprecia de una vez todos los activos de la empresa
+        (o los de `categoria_id` / `departamento_id`) para `periodo` ('AAAA-MM',
+        por defecto el mes actual). Repetirlo para el mismo período no duplica.
+        """
+        if not check_permission(request, self, self.required_manage_permission):
+            self.permission_denied(request, message=f'Permiso "{self.required_manage_permission}" requerido.')
+
+        empresa_id = get_tenant_context(request).empresa_id
+        if empresa_id is None and request.user.is_staff:
+            empresa_id = request.data.get('empresa_id')
+        if not empresa_id:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        depreciation_type = str(request.data.get('depreciation_type', 'STRAIGHT_LINE')).upper()
+        if depreciation_type not in BATCH_DEPRECIATION_TYPES:
+            return Response(
+                {'detail': f"Método no válido para un lote. Use uno de: {', '.join(BATCH_DEPRECIATION_TYPES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        tasa = request.data.get('tasa_depreciacion')
+        try:
+            tasa = Decimal(str(tasa)) if tasa not in (None, '') else None
+        except InvalidOperation:
+            return Response({'detail': 'La tasa de depreciación no es un número válido.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resumen = ejecutar_depreciacion_lote(
+                empresa_id,
+                request.data.get('periodo') or periodo_actual(),
+                depreciation_type,
+                tasa=tasa,
+                categoria_id=request.data.get('categoria_id'),
+                departamento_id=request.data.get('departamento_id'),
+                usuario=request.user,
+                notas=request.data.get('notas'),
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en DepreciacionActivoViewSet.ejecutar_lote: {e}", exc_info=True)
+            return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(resumen, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='proyeccion')
+    def proyeccion(self, request, *args, **kwargs):
+        """
+        Cronograma proyectado año por año de los activos de la empresa hasta el fin
+        de su vida útil, como JSON o Excel (`formato=excel`), generado por streaming.
+        Parámetros: depreciation_type, desde (AAAA-MM), categoria_id, departamento_id,
+        activo_id y los datos del método (tasa_depreciacion, unidades_por_anio,
+        total_unidades_estimadas, monto_anual).
+        """
+        empresa_id = get_tenant_context(request).empresa_id
+        if empresa_id is None and request.user.is_staff:
+            empresa_id = request.query_params.get('empresa_id')
+        if not empresa_id:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = request.query_params
+        depreciation_type = params.get('depreciation_type', 'STRAIGHT_LINE').upper()
+        formato = params.get('formato', 'json').lower()
+        if formato not in ('json', 'excel'):
+            return Response({'detail': "Formato no soportado. Use 'json' o 'excel'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            parametros = {
+                campo: Decimal(params[param])
+                for campo, param in (
+                    ('tasa', 'tasa_depreciacion'), ('unidades_por_anio', 'unidades_por_anio'),
+                    ('total_unidades_estimadas', 'total_unidades_estimadas'), ('monto_anual', 'monto_anual'),
+                )
+                if params.get(param)
+            }
+            validar_parametros_proyeccion(depreciation_type, **parametros)
+            desde = params.get('desde') or periodo_actual()
+            inicio, fin = rango_periodo(desde)
+        except InvalidOperation:
+            return Response({'detail': 'Los parámetros numéricos no son válidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = activos_depreciables(
+            empresa_id, fin, params.get('categoria_id'), params.get('departamento_id')
+        )
+        if params.get('activo_id'):
+            queryset = queryset.filter(pk=params.get('activo_id'))
+        activos = iter_proyeccion(queryset, depreciation_type, inicio, **parametros)
+
+        if formato == 'excel':
+            response = StreamingHttpResponse(
+                iter_proyeccion_excel(filas_proyeccion(activos)), content_type=EXCEL_CONTENT_TYPE
+            )
+            response['Content-Disposition'] = f'attachment; filename="proyeccion_depreciacion_{desde}.xlsx"'
+            return response
+        encabezado = {'depreciation_type': depreciation_type, 'desde': desde}
+        return StreamingHttpResponse(iter_proyeccion_json(activos, encabezado), content_type='application/json')
+
 class DisposicionActivoViewSet(BaseTenantViewSet):
     queryset = DisposicionActivo.objects.all().select_related('activo', 'realizado_por')
     serializer_class = DisposicionActivoSerializer
@@ -1793,6 +1890,9 @@ class DisposicionActivoViewSet(BaseTenantViewSet):
             
             # Set the asset's status to DADO_DE_BAJA
             activo.estado = estado_disposicion
+            # Keep the book value being written off (point-in-time valuation needs it).
+            disposicion.valor_en_libros = activo.valor_actual
+            disposicion.save(update_fields=['valor_en_libros'])
             # Upon disposal, the asset's book value becomes zero.
             activo.valor_actual = Decimal('0.00')
             
@@ -1810,8 +1910,10 @@ class SuscripcionViewSet(BaseTenantViewSet):
 
     def get_queryset(self):
         # Sobrescribimos para que solo devuelva LA suscripción de la empresa
-        empleado = self.request.user.empleado
-        return self.queryset.filter(empresa=empleado.empresa)
+        empresa_id = get_tenant_context(self.request).empresa_id
+        if empresa_id is None:
+            return self.queryset.none()
+        return self.queryset.filter(empresa_id=empresa_id)
 
     @action(detail=True, methods=['post'], url_path='upgrade-plan')
     def upgrade_plan(self, request, pk=None):
@@ -1916,8 +2018,10 @@ class NotificacionViewSet(BaseTenantViewSet):
             if notificacion.destinatario != request.user:
                 return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
 
-            notificacion.leido = True
-            notificacion.save()
+            if not notificacion.leido:
+                # La señal post_save descuenta el contador de no leídas
+                notificacion.leido = True
+                notificacion.save(update_fields=['leido'])
             return Response({'status': 'Notificación marcada como leída'}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -1927,15 +2031,75 @@ class NotificacionViewSet(BaseTenantViewSet):
         """Marcar todas las del usuario como leídas."""
         try:
             # --- [CAMBIO] Filtrar por destinatario ---
-            count, _ = Notificacion.objects.filter(destinatario=request.user, leido=False).update(leido=True)
+            # update() devuelve solo el número de filas
+            count = Notificacion.objects.filter(destinatario=request.user, leido=False).update(leido=True)
+            reiniciar_no_leidas(request.user.id)
             return Response({'status': f'{count} notificaciones marcadas como leídas'}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='anunciar')
+    def anunciar(self, request):
+        """
+        Anuncio a muchos empleados de la empresa: por `roles` (nombres), `departamentos`
+        (ids), `usuarios` (ids) o `todos: true`. Campanita y push en pocas consultas.
+        """
+        if not check_permission(request, self, 'manage_empleado'):
+            self.permission_denied(request, message='Permiso "manage_empleado" requerido.')
+        empresa_id = get_tenant_context(request).empresa_id
+        if empresa_id is None:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        mensaje = request.data.get('mensaje')
+        tipo = request.data.get('tipo', 'INFO')
+        if not mensaje:
+            return Response({'detail': 'Se requiere el mensaje.'}, status=status.HTTP_400_BAD_REQUEST)
+        if tipo not in dict(Notificacion.TIPO_CHOICES):
+            return Response({'detail': 'Tipo de notificación inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        destinatarios = {}
+        for campo in ('roles', 'departamentos', 'usuarios'):
+            valor = request.data.get(campo) or []
+            if not isinstance(valor, list):
+                return Response({'detail': f"El campo '{campo}' debe ser una lista."}, status=status.HTTP_400_BAD_REQUEST)
+            destinatarios[campo] = valor
+        roles, departamentos, usuarios = destinatarios['roles'], destinatarios['departamentos'], destinatarios['usuarios']
+        todos = str(request.data.get('todos', '')).lower() in ('true', '1')
+        if not (roles or departamentos or usuarios or todos):
+            return Response(
+                {'detail': 'Indique roles, departamentos, usuarios o todos: true.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Cada destinatario debe existir en la propia empresa: un error de tipeo no puede
+        # terminar en un anuncio que no le llega a nadie
+        try:
+            departamentos = {uuid.UUID(str(departamento_id)) for departamento_id in departamentos}
+            usuarios = {int(usuario_id) for usuario_id in usuarios}
+        except (TypeError, ValueError):
+            return Response(
+                {'detail': 'Los departamentos deben ser ids (UUID) y los usuarios ids numéricos.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(rol, str) for rol in roles):
+            return Response({'detail': 'Los roles deben ser nombres.'}, status=status.HTTP_400_BAD_REQUEST)
+        roles = set(roles)
+        if roles and Roles.objects.filter(empresa_id=empresa_id, nombre__in=roles).count() != len(roles):
+            return Response({'detail': 'Algún rol no existe en tu empresa.'}, status=status.HTTP_400_BAD_REQUEST)
+        if departamentos and Departamento.objects.filter(empresa_id=empresa_id, pk__in=departamentos).count() != len(departamentos):
+            return Response({'detail': 'Algún departamento no existe en tu empresa.'}, status=status.HTTP_400_BAD_REQUEST)
+        if usuarios and Empleado.objects.filter(empresa_id=empresa_id, usuario_id__in=usuarios).count() != len(usuarios):
+            return Response({'detail': 'Algún usuario no pertenece a tu empresa.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        notificaciones = notificar(
+            mensaje, request.data.get('titulo') or 'Anuncio', tipo=tipo, url_destino=request.data.get('url_destino'),
+            empresa_id=empresa_id, usuarios=usuarios, roles=roles, departamentos=departamentos, todos=todos,
+        )
+        return Response({'notificaciones': len(notificaciones)}, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'], url_path='unread-count')
     def unread_count(self, request):
-        """Devuelve el número de notificaciones no leídas para el usuario."""
-        count = self.get_queryset().filter(leido=False).count()
+        """Devuelve el número de notificaciones no leídas para el usuario (desde la caché)."""
+        count = contar_no_leidas(request.user.id)
         return Response({'unread_count': count}, status=status.HTTP_200_OK)
 
 class FCMTokenView(APIView):
@@ -0,0 +1,179 @@
+# api/xlsx_utils.py
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+from openpyxl.utils import get_column_letter
+
+# Caracteres de control que XML 1.0 no admite (openpyxl los rechaza con IllegalCharacterError)
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+# Índices de cellXfs en STYLES_XML
+STYLE_BOLD, STYLE_DATE, STYLE_DATETIME = 1, 2, 3
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="styles.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>'
+)
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd h:mm:ss"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+class ChunkBuffer:
+    """
+    Archivo de solo escritura (sin seek) que acumula lo que escribe un writer
+    (el zip del XLSX, ParquetWriter) hasta que el generador lo recoge con `read()`.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def read(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+def _excel_serial(value):
+    if isinstance(value, datetime.datetime):
+        delta = value.replace(tzinfo=None) - EXCEL_EPOCH
+        return delta.days + delta.seconds / 86400 + delta.microseconds / 86400e6
+    return (value - EXCEL_EPOCH.date()).days
+
+def _cell(ref, value, style=0):
+    estilo = f' s="{style}"' if style else ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"{estilo}><v>{int(value)}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c r="{ref}"{estilo}><v>{value:f}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{estilo}><v>{value!r}</v></c>'
+    if isinstance(value, datetime.datetime):
+        return f'<c r="{ref}" s="{STYLE_DATETIME}"><v>{_excel_serial(value)!r}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c r="{ref}" s="{STYLE_DATE}"><v>{_excel_serial(value)}</v></c>'
+    texto = ILLEGAL_XML_CHARS.sub('', str(value))
+    espacios = ' xml:space="preserve"' if texto != texto.strip() else ''
+    return f'<c r="{ref}" t="inlineStr"{estilo}><is><t{espacios}>{escape(texto)}</t></is></c>'
+
+class StreamingXLSXWriter:
+    """
+    Libro XLSX de una hoja escrito fila a fila directamente en el zip.
+
+    openpyxl (incluso en modo write-only) arma el archivo en `save()`, después de
+    la última fila. Aquí el zip se escribe en modo streaming (sin seek, con data
+    descriptors): cada fila se comprime al añadirse y los bytes listos se recogen con
+    `read()`, así el cliente recibe el archivo mientras se genera. Las celdas de texto
+    son inline (sin tabla de cadenas compartidas), por eso la memoria no crece con
+    el número de filas.
+    """
+
+    def __init__(self, sheet_title, column_widths=()):
+        self._pending = ChunkBuffer()
+        self._zip = zipfile.ZipFile(self._pending, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        self._zip.writestr('_rels/.rels', ROOT_RELS_XML)
+        self._zip.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name={quoteattr(sheet_title[:31])} sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+        self._zip.writestr('xl/styles.xml', STYLES_XML)
+
+        self._sheet = self._zip.open('xl/worksheets/sheet1.xml', 'w')
+        cols = ''.join(
+            f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>'
+            for i, width in enumerate(column_widths, start=1)
+        )
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            + (f'<cols>{cols}</cols>' if cols else '') + '<sheetData>'
+        )
+        self._row = 0
+        self._letters = []
+
+    def _write(self, text):
+        self._sheet.write(text.encode('utf-8'))
+
+    @property
+    def pending_size(self):
+        """Bytes comprimidos listos para enviar."""
+        return self._pending.size
+
+    def append(self, values, bold=False):
+        self._row += 1
+        values = list(values)
+        while len(self._letters) < len(values):
+            self._letters.append(get_column_letter(len(self._letters) + 1))
+        style = STYLE_BOLD if bold else 0
+        self._write(f'<row r="{self._row}">' + ''.join(
+            _cell(f'{self._letters[i]}{self._row}', value, style)
+            for i, value in enumerate(values) if value is not None
+        ) + '</row>')
+
+    def read(self):
+        """Devuelve (y descarta) los bytes generados desde la última llamada."""
+        return self._pending.read()
+
+    def close(self):
+        self._write('</sheetData></worksheet>')
+        self._sheet.close()
+        self._zip.close()
@@ -413,6 +413,7 @@ export const actualizarEstadoMantenimiento = async (id, data, fotosSolucion) =>
 export const getNotificaciones = () => apiClient.get('/notificaciones/');
 export const markNotificacionLeida = (id) => apiClient.post(`/notificaciones/${id}/marcar-leido/`);
 export const markAllNotificacionesLeidas = () => apiClient.post('/notificaciones/marcar-todo-leido/');
+export const anunciarNotificacion = (anuncio) => apiClient.post('/notificaciones/anunciar/', anuncio); // { mensaje, titulo, tipo, roles, departamentos, usuarios, todos }
 
 // --- Suscripción (para una página de perfil/plan) ---
 export const getSuscripcion = () => apiClient.get('/suscripcion/');*/
@@ -905,6 +906,27 @@ export const ejecutarDepreciacion = async (data) => {
     return response.data;
 };
 
+export const getProyeccionDepreciacion = async (params) => {
+    // params: { depreciation_type, desde: 'AAAA-MM', categoria_id, departamento_id, activo_id, tasa_depreciacion, ... }
+    const response = await apiClient.get('/depreciaciones/proyeccion/', { params });
+    return response.data; // { depreciation_type, desde, activos: [{ id, codigo_interno, nombre, cronograma: [...] }] }
+};
+
+export const downloadProyeccionDepreciacion = async (params) => {
+    const response = await apiClient.get('/depreciaciones/proyeccion/', {
+        params: { ...params, formato: 'excel' }, responseType: 'blob'
+    });
+    const url = window.URL.createObjectURL(new Blob([response.data], { type: response.headers['content-type'] }));
+    const link = document.createElement('a');
+    link.href = url;
+    link.setAttribute('download', `proyeccion_depreciacion_${params.desde || 'actual'}.xlsx`);
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    window.URL.revokeObjectURL(url);
+    await logAction('EXPORT: Proyeccion Depreciacion', params);
+};
+
 // --- [NUEVO] Funciones para Disposición de Activos ---
 export const getDisposiciones = async () => {
     const response = await apiClient.get('/disposiciones/');
@@ -988,7 +1010,8 @@ export const getReportePorQuery = async (query) => {
     try {
         // Usamos POST para enviar el array de filtros en el body
         const response = await apiClient.post(urlPath, query); 
-        return response.data; // Devuelve la lista de resultados
+        // Página de resultados: { results, next_cursor, has_more, page_size, approximate_total }
+        return response.data;
     } catch (error) {
         console.error("Error fetching query report preview:", error.response?.data || error.message);
         throw error;
@@ -1028,6 +1051,22 @@ export const downloadReportePorQuery = async (query) => {
     }
 };
 
+/**
+ * [NUEVO] Valor en libros de la cartera a una fecha.
+ * @param {object} query - { fecha: 'AAAA-MM-DD', filters: [...], agrupar_por?, cursor?, page_size? }
+ */
+export const getReporteValorAFecha = async (query) => {
+    const urlPath = 'reportes/valor-a-fecha/';
+    try {
+        // { fecha, totales, grupos, results, next_cursor, has_more, ... }
+        const response = await apiClient.post(urlPath, query);
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching point-in-time valuation:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
 export const getDashboardData = async () => {
     const response = await apiClient.get('/dashboard/');
     return response.data;
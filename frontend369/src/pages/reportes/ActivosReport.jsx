@@ -27,6 +27,9 @@ export default function ActivosReport() {
     const [isListening, setIsListening] = useState(false);
 
     const [resultados, setResultados] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [totalAproximado, setTotalAproximado] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const { showNotification } = useNotification();
     const recognitionRef = useRef(null);
 
@@ -50,10 +53,14 @@ export default function ActivosReport() {
         }
         setLoadingPreview(true);
         setResultados(null);
+        setNextCursor(null);
         try {
             const data = await getReportePorQuery({ filters });
-            setResultados(data || []);
-            if (!data || data.length === 0) {
+            const filas = data?.results || [];
+            setResultados(filas);
+            setNextCursor(data?.next_cursor || null);
+            setTotalAproximado(data?.approximate_total ?? null);
+            if (filas.length === 0) {
                 showNotification('No se encontraron resultados con esos filtros');
             }
         } catch (error) {
@@ -65,6 +72,22 @@ export default function ActivosReport() {
         }
     };
 
+    // Siguiente página de la vista previa (paginación por cursor)
+    const handleCargarMas = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const data = await getReportePorQuery({ filters, cursor: nextCursor });
+            setResultados(prev => [...(prev || []), ...(data?.results || [])]);
+            setNextCursor(data?.next_cursor || null);
+        } catch (error) {
+            console.error("Error al cargar más resultados:", error.response?.data || error.message);
+            showNotification(error.response?.data?.detail || 'Error al cargar más resultados', 'error');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleExportar = async (format) => {
         if (!resultados || resultados.length === 0) {
             showNotification('Primero genera una vista previa con resultados.', 'error');
@@ -176,7 +199,7 @@ export default function ActivosReport() {
                         type="text"
                         value={queryInput}
                         onChange={(e) => setQueryInput(e.target.value)}
-                        placeholder='Escribe un filtro y presiona Enter (ej: "laptop", "depto: TI", "valor>500")'
+                        placeholder='Escribe un filtro y presiona Enter (ej: "laptop OR tablet", "depto: TI", "valor:500..1000", "fecha_adq:este_anio")'
                         className="w-full p-3 bg-tertiary rounded-lg text-primary focus:outline-none focus:ring-2 focus:ring-accent"
                         data-tour="filtro-input"
                     />
@@ -231,7 +254,9 @@ export default function ActivosReport() {
             {resultados !== null && (
                 <div className="bg-secondary border border-theme rounded-xl p-6 animate-in fade-in">
                     <div className="flex flex-col sm:flex-row justify-between items-start sm:items-center mb-4 gap-4">
-                        <h2 className="text-xl font-semibold text-primary">Resultados ({resultados.length})</h2>
+                        <h2 className="text-xl font-semibold text-primary">
+                            Resultados ({nextCursor && totalAproximado ? `${resultados.length} de ~${totalAproximado}` : resultados.length})
+                        </h2>
                         {resultados.length > 0 && (
                             <div className="flex gap-3" data-tour="exportar-reporte-btn">
                                 <button onClick={() => handleExportar('pdf')} disabled={loadingExport} className="flex items-center gap-2 text-sm bg-tertiary text-primary px-4 py-2 rounded-lg hover:bg-opacity-80 disabled:opacity-50">
@@ -266,6 +291,13 @@ export default function ActivosReport() {
                                     ))}
                                 </tbody>
                             </table>
+                            {nextCursor && (
+                                <div className="flex justify-center mt-4">
+                                    <button onClick={handleCargarMas} disabled={loadingMore} className="flex items-center gap-2 text-sm bg-tertiary text-primary px-4 py-2 rounded-lg hover:bg-opacity-80 disabled:opacity-50">
+                                        {loadingMore && <Loader className="animate-spin w-4 h-4" />} Cargar más
+                                    </button>
+                                </div>
+                            )}
                         </div>
                      ) : (
                          <p className="text-center text-tertiary py-8">No se encontraron activos con los filtros seleccionados.</p>
@@ -724,8 +724,8 @@ class ApiService {
   Future<List<ReporteActivo>> getDynamicReport(List<String> filters) async {
     try {
       final response = await _dio.post('/reportes/query/', data: {'filters': filters});
-      // The backend returns a list of maps, which needs to be converted to ReporteActivo objects.
-      final List<dynamic> dataList = response.data;
+      // The backend returns a keyset-paginated page: {results: [...], next_cursor, has_more, ...}.
+      final List<dynamic> dataList = response.data['results'];
       return dataList.map((json) => ReporteActivo.fromJson(json)).toList();
     } on DioException catch (e) {
       debugPrint("API Service Error fetching dynamic report: ${e.response?.data ?? e.message}");